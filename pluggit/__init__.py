@@ -18,16 +18,22 @@
 #  along with SmartHome.py.  If not, see <http://www.gnu.org/licenses/>.
 #########################################################################
 
+import logging
+import os
 import threading
 import time
+from collections import deque
 
 import lib.plugin
 
 # pymodbus library from https://code.google.com/p/pymodbus/
 
-from pluggit.sync import ModbusTcpClient
+from pluggit.pool import ModbusConnectionPool
 from pluggit.constants import Endian
+from pluggit.pdu import ExceptionResponse
 from pluggit.payload import BinaryPayloadDecoder
+from pluggit.planner import ModbusReadPlanner
+from pluggit.identification import ModbusDeviceIdentifier, ModbusIdentityStore
 
 
 class PluggitException(Exception):
@@ -72,6 +78,20 @@ class Pluggit(lib.plugin.Plugin):
         'prmFilterRemainingTime': 554
     }
 
+    # register maps by the product code the device identifies itself with,
+    # each with the unit the temperatures are read from (None for the unit
+    # the device identified itself on); devices that do not identify
+    # themselves get the AP310 map
+    _registerMaps = {
+        'AP310': (_modbusRegisterDic, 22),
+    }
+
+    # the temperatures are 32 bit floats read from the temperature unit
+    _temperatureKeys = ('prmRamIdxT1', 'prmRamIdxT2', 'prmRamIdxT3', 'prmRamIdxT4')
+
+    # how often a pluggit_send write is tried before it is given up
+    _writeAttempts = 3
+
     # Initialize connection
     def __init__(self, core, conf):
         lib.plugin.Plugin.__init__(self, core, conf)
@@ -79,53 +99,127 @@ class Pluggit(lib.plugin.Plugin):
         self._host = conf.get('host')
         self._port = conf.get('port')
         self._cycle = conf.get('cycle')
-        self._lock = threading.Lock()
+        self._timeout = float(conf.get('timeout', 3))
+        # the unit the device is identified on and the registers are read
+        # from, the register map of the device names the temperature unit
+        self._unit = int(conf.get('unit', 0))
+        self._temperatureUnit = self._registerMaps['AP310'][1]
+        self._lock = threading.RLock()
         self._is_connected = False
         self._items = {}
-        self.connect()
-        self.disconnect()
+        self._planners = {}
+        # the queue has its own lock, update_item must never wait for a poll
+        self._commands = deque()
+        self._commandLock = threading.Lock()
+        # the time the first queued command is due and the timer sending it
+        self._commandDue = None
+        self._commandTimer = None
+        # the client is leased from the process wide pool, so other plugins
+        # and logics talking to the same gateway share its connection
+        self._pool = ModbusConnectionPool.default()
+        self._lease = None
+        # what the device is and supports is probed once and remembered
+        # across restarts in the identity cache, kept with the other caches
+        # of smarthome.py (or next to the plugin if there are none)
+        cache = conf.get('cache')
+        if cache is None:
+            directory = os.path.join(getattr(core, 'base_dir', ''), 'var', 'cache')
+            if not os.path.isdir(directory):
+                directory = os.path.dirname(os.path.abspath(__file__))
+            cache = os.path.join(directory, 'pluggit_identity.json')
+        self._identifier = ModbusDeviceIdentifier(ModbusIdentityStore(cache))
+        # the device is identified on the first refresh, not on startup
+        self._identity = None
         # pydevd.settrace("192.168.0.125")
 
     def connect(self):
         start_time = time.time()
         if self._is_connected:
             return True
-        self._lock.acquire()
         try:
             self.logger.info("Pluggit: connecting to {0}:{1}".format(
                 self._host, self._port))
-            self._Pluggit = ModbusTcpClient(self._host, self._port)
+            # never wait forever for a gateway another plugin holds on to
+            self._lease = self._pool.lease(self._host, self._port,
+                                           timeout=self._timeout)
+            self._Pluggit = self._lease.client
         except Exception as e:
             self.logger.error("Pluggit: could not connect to {0}:{1}: {2}".format(
                 self._host, self._port, e))
-            return
-        finally:
-            self._lock.release()
+            return False
         self.logger.info("Pluggit: connected to {0}:{1}".format(
             self._host, self._port))
         self._is_connected = True
         end_time = time.time()
         self.logger.info("Pluggit: connection took {0} seconds".format(
             end_time - start_time))
+        return True
 
     def disconnect(self):
         start_time = time.time()
         if self._is_connected:
-            try:
-                self._Pluggit.close()
-            except:
-                pass
+            self._learn()
+            # hand the client back to the pool, which keeps the connection
+            # open for the next cycle and closes it once it stays unused
+            self._lease.release()
+            self._lease = None
         self._is_connected = False
         end_time = time.time()
         self.logger.info("Pluggit: disconnect took {0} seconds".format(
             end_time - start_time))
 
+    @classmethod
+    def _selectRegisterMap(cls, product):
+        # the (registers, temperature unit) of the longest product code found
+        # in the product name, None if the device is unknown
+        for code in sorted(cls._registerMaps, key=len, reverse=True):
+            if code in (product or ''):
+                return cls._registerMaps[code]
+        return None
+
+    def _identify(self):
+        # the identifier only asks the device if it is unknown, or if it did
+        # not answer and the retry time has passed, so this is cheap to call
+        # on every refresh
+        if self._identity is not None and self._identity.get('identified'):
+            return
+        try:
+            identity = self._identifier.identify(self._Pluggit, unit=self._unit)
+        except Exception as e:
+            self.logger.warning("Pluggit: identification failed: {0}".format(e))
+            return
+        if identity == self._identity:
+            return
+        self._identity = identity
+        product = identity.get('product')
+        registerMap = self._selectRegisterMap(product)
+        if registerMap is None:
+            self.logger.info("Pluggit: unknown device {0}, using the AP310 registers".format(
+                product or 'without identification'))
+            registerMap = self._registerMaps['AP310']
+        self._modbusRegisterDic, temperatureUnit = registerMap
+        self._temperatureUnit = self._unit if temperatureUnit is None else temperatureUnit
+        if identity.get('identified'):
+            self.logger.info("Pluggit: device {0} {1} revision {2} on unit {3}".format(
+                identity.get('vendor'), product, identity.get('revision'), self._unit))
+        # restore what earlier runs learned about the units
+        for unit in set((self._unit, self._temperatureUnit)):
+            self._identifier.apply(self._Pluggit, unit,
+                self._planners.setdefault(unit, ModbusReadPlanner()))
+
+    def _learn(self):
+        for unit, planner in self._planners.items():
+            self._identifier.learn(self._Pluggit, unit, planner)
+
     def start(self):
         self.alive = True
         self._cd.scheduler.add('Pluggit', self._refresh, cycle=self._cycle)
 
     def stop(self):
         self.alive = False
+        with self._commandLock:
+            if self._commandTimer is not None:
+                self._commandTimer.cancel()
 
     # parse items in pluggit.conf
     def pre_stage(self):
@@ -159,202 +253,249 @@ class Pluggit(lib.plugin.Plugin):
                         self._activatePowerBoost()
                     else:
                         self._activateWeekProgram()
+                    # a running refresh sends the queued commands ahead of
+                    # its own reads, so only send them if the device is idle
+                    self._processCommands(blocking=False)
 
     def _activatePowerBoost(self):
-
-        active_unit_mode_value = 4, 0
-        fan_speed_level_value = 4, 0
-
-        # Change Unit Mode to manual
-        # self.logger.debug("Pluggit: Start => Change Unit mode to manual: {0}".format(active_unit_mode_value))
-        self._Pluggit.write_registers(
-            self._modbusRegisterDic['prmRamIdxUnitMode'],
-            active_unit_mode_value)
-        # self.logger.debug("Pluggit: Finished => Change Unit mode to manual: {0}".format(active_unit_mode_value))
-
-        # wait 100ms before changing fan speed
-        # self.logger.debug("Pluggit: Wait 100ms before changing fan speed")
-        time.sleep(0.1)
-
-        # Change Fan Speed to highest speed
-        # self.logger.debug("Pluggit: Start => Change Fan Speed to Level 4")
-        self._Pluggit.write_registers(
-            self._modbusRegisterDic['prmRomIdxSpeedLevel'],
-            fan_speed_level_value)
-        # self.logger.debug("Pluggit: Finished => Change Fan Speed to Level 4")
-
-        # self._refresh()
-        # check new active unit mode
-        active_unit_mode = self._Pluggit.read_holding_registers(
-            self._modbusRegisterDic['prmRamIdxUnitMode'], read_qty=1).getRegister(0)
-
-        if active_unit_mode == 8:
-            self.logger.debug("Pluggit: Active Unit Mode: Week program")
-        elif active_unit_mode == 4:
-            self.logger.debug("Pluggit: Active Unit Mode: Manual")
-
-        # check new fan speed
-        fan_speed_level = self._Pluggit.read_holding_registers(
-            self._modbusRegisterDic['prmRomIdxSpeedLevel'], read_qty=1).getRegister(0)
-        self.logger.debug("Pluggit: Fan Speed: {0}".format(fan_speed_level))
+        # Change Unit Mode to manual, then wait 100ms before changing the
+        # fan speed to the highest speed
+        self._queueWrite(self._modbusRegisterDic['prmRamIdxUnitMode'], [4, 0])
+        self._queueWrite(
+            self._modbusRegisterDic['prmRomIdxSpeedLevel'], [4, 0], delay=0.1)
 
     def _activateWeekProgram(self):
+        # Change Unit Mode to "Week Program", the week program selects the
+        # fan speed itself so check it 100ms later
+        self._queueWrite(self._modbusRegisterDic['prmRamIdxUnitMode'], [8, 0])
+        self._queueRead(
+            self._modbusRegisterDic['prmRomIdxSpeedLevel'], 1, delay=0.1)
+
+    # =======================================================================#
+    # command queue: the writes of the pluggit_send items are sent before
+    # any pending poll read, adjacent writes are merged into one request
+    # and the written values are confirmed by reading them back with the
+    # same request (FC23) where the device supports it
+    # =======================================================================#
+
+    def _queueWrite(self, address, values, delay=0):
+        values = list(values)
+        with self._commandLock:
+            if self._commands and not delay:
+                kind, first, pending, pending_delay, attempt = self._commands[-1]
+                offset = address - first
+                if kind == 'write' and 0 <= offset <= len(pending):
+                    pending[offset:offset + len(values)] = values
+                    return
+            self._commands.append(('write', address, values, delay, 0))
+
+    def _queueRead(self, address, count, delay=0):
+        # only registers of configured items are worth reading back
+        if not any(self._modbusRegisterDic[key] == address
+                   for key in self._myTempReadDict):
+            return
+        with self._commandLock:
+            self._commands.append(('read', address, count, delay, 0))
+
+    def _commandsDue(self):
+        # true if the first queued command may be sent now, a command that
+        # has to wait is sent by the timer armed for it
+        with self._commandLock:
+            return bool(self._commands) and (self._commandDue is None
+                or self._commandDue <= time.time())
+
+    def _scheduleCommands(self, due):
+        # called with the command lock held: sends the queued commands once
+        # the first one is due, without blocking a refresh until then
+        if self._commandTimer is not None:
+            self._commandTimer.cancel()
+        self._commandDue = due
+        self._commandTimer = threading.Timer(
+            max(due - time.time(), 0), self._processCommands)
+        self._commandTimer.daemon = True
+        self._commandTimer.start()
+
+    def _processCommands(self, blocking=True):
+        if not self._lock.acquire(blocking):
+            return
+        try:
+            if not self._commandsDue():
+                return
+            if not self.connect():
+                self.logger.warning("Pluggit: commands are sent with the next refresh")
+                return
+            try:
+                self._flushCommands()
+            finally:
+                self.disconnect()
+        finally:
+            self._lock.release()
 
-        active_unit_mode_value = 8, 0
-
-        # Change Unit Mode to "Week Program"
-        # self.logger.debug("Pluggit: Start => Change Unit mode to 'Week Program': {0}".format(active_unit_mode_value))
-        self._Pluggit.write_registers(
-            self._modbusRegisterDic['prmRamIdxUnitMode'],
-            active_unit_mode_value)
-        # self.logger.debug("Pluggit: Finished => Change Unit mode to 'Week Program': {0}".format(active_unit_mode_value))
-
-        # self._refresh()
-
-        # check new active unit mode
-        active_unit_mode = self._Pluggit.read_holding_registers(
-            self._modbusRegisterDic['prmRamIdxUnitMode'], read_qty=1).getRegister(0)
-
-        if active_unit_mode == 8:
-            self.logger.debug("Pluggit: Active Unit Mode: Week program")
-        elif active_unit_mode == 4:
-            self.logger.debug("Pluggit: Active Unit Mode: Manual")
-
-        # wait 100ms before checking fan speed
-        time.sleep(0.1)
-
-        # check new fan speed
-        fan_speed_level = self._Pluggit.read_holding_registers(
-            self._modbusRegisterDic['prmRomIdxSpeedLevel'], read_qty=1).getRegister(0)
-        self.logger.debug("Pluggit: Fan Speed: {0}".format(fan_speed_level))
+    def _flushCommands(self, reads=True):
+        # the reads are collected and done with one planned block read after
+        # the writes, a refresh passes reads=False as its poll reads them.
+        # A command with a delay is due that long after the one before it
+        # was sent; until then it stays queued and a timer sends it, so the
+        # commands keep their order and nobody sleeps holding the lock
+        pending = set()
+        while True:
+            with self._commandLock:
+                if not self._commands:
+                    break
+                kind, address, data, delay, attempt = self._commands[0]
+                if delay and self._commandDue is None:
+                    self._scheduleCommands(time.time() + delay)
+                if self._commandDue is not None and self._commandDue > time.time():
+                    break
+                self._commandDue = None
+                self._commands.popleft()
+            if kind == 'read':
+                pending.add((address, data))
+                continue
+            try:
+                response = self._Pluggit.write_verify_registers(
+                    address, data, unit=self._unit)
+            except Exception as e:
+                response = e
+            if response is None or isinstance(response, (Exception, ExceptionResponse)):
+                self._failedWrite(address, data, attempt, response)
+                if attempt + 1 < self._writeAttempts:
+                    break
+                continue
+            if response.registers != data:
+                self.logger.warning("Pluggit: wrote {0} to register {1} but read back {2}".format(
+                    data, address, response.registers))
+            self._updateItems({self._unit: dict(((address + offset, 1), [value])
+                                       for offset, value in enumerate(response.registers))})
+        if reads and pending:
+            planner = self._planners.setdefault(self._unit, ModbusReadPlanner())
+            try:
+                registers = planner.read(self._Pluggit, pending, unit=self._unit)
+            except Exception as e:
+                self.logger.error("Pluggit: reading back registers {0} failed: {1}".format(
+                    sorted(pending), e))
+                return
+            self._updateItems({self._unit: registers})
+
+    def _failedWrite(self, address, data, attempt, response):
+        # a failed write is retried ahead of the commands queued after it
+        # once the timeout has passed; when the last attempt failed as well
+        # the register is read back so its items show the device's value
+        attempt += 1
+        if attempt < self._writeAttempts:
+            self.logger.warning("Pluggit: writing {0} to register {1} failed, retrying: {2}".format(
+                data, address, response))
+            with self._commandLock:
+                self._commands.appendleft(('write', address, data, 0, attempt))
+                self._scheduleCommands(time.time() + self._timeout)
+            return
+        self.logger.error("Pluggit: writing {0} to register {1} failed: {2}".format(
+            data, address, response))
+        for offset in range(len(data)):
+            self._queueRead(address + offset, 1)
+
+    def _readRegisters(self):
+        # collect the reads of all items per unit and let the planner fetch
+        # them with as few block requests as possible; the planners are kept
+        # so they remember which register ranges the unit refuses to read
+        reads = {}
+        for pluggit_key in self._myTempReadDict:
+            address = self._modbusRegisterDic[pluggit_key]
+            if pluggit_key in self._temperatureKeys:
+                reads.setdefault(self._temperatureUnit, set()).add((address, 2))
+            else:
+                reads.setdefault(self._unit, set()).add((address, 1))
+        registers = {}
+        for unit, unit_reads in reads.items():
+            # commands queued meanwhile go out ahead of the next block read
+            self._flushCommands(reads=False)
+            planner = self._planners.setdefault(unit, ModbusReadPlanner())
+            registers[unit] = planner.read(self._Pluggit, unit_reads, unit=unit)
+        return registers
 
     def _refresh(self, value=None, trigger=None):
-        self.disconnect()
-        time.sleep(1)
-        self.connect()
+        with self._lock:
+            if not self.connect():
+                return
+            try:
+                self._identify()
+                self._flushCommands(reads=False)
+                self._poll()
+            finally:
+                self.disconnect()
+                # close the connections the cycles no longer use
+                self._pool.evict()
+        # commands queued while the lock was held were skipped by update_item
+        if self._commandsDue():
+            self._processCommands()
+
+    def _poll(self):
         start_time = time.time()
         try:
-            # myCounter = 1
-            for pluggit_key in self._myTempReadDict:
-                # self.logger.debug("Pluggit: ---------------------------------> Wir sind in der Refresh Schleife")
-                values = self._modbusRegisterDic[pluggit_key]
-                # self.logger.debug("Pluggit: Refresh Schleife: Inhalt von values ist {0}".format(values))
-                # 2015-01-07 23:53:08,296 DEBUG    Pluggit      Pluggit:
-                # Refresh Schleife: Inhalt von values ist 168 --
-                # __init__.py:_refresh:158
-                item = self._myTempReadDict[pluggit_key]
-                # self.logger.debug("Pluggit: Refresh Schleife: Inhalt von item ist {0}".format(item))
-                # 2015-01-07 23:53:08,316 DEBUG    Pluggit      Pluggit:
-                # Refresh Schleife: Inhalt von item ist pluggit.unitMode --
-                # __init__.py:_refresh:160
-
-                # =======================================================#
-                # read values from pluggit via modbus client registers
-                # =======================================================#
-
-                # self.logger.debug("Pluggit: ------------------------------------------> Wir sind vor dem Auslesen der Werte")
-                registerValue = None
-                registerValue = self._Pluggit.read_holding_registers(
-                    values, read_qty=1).getRegister(0)
-                # self.logger.debug("Pluggit: Read parameter '{0}' with register '{1}': Value is '{2}'".format(pluggit_key, values, registerValue))
-
-                # week program: possible values 0-10
-                if values == self._modbusRegisterDic['prmNumOfWeekProgram']:
-                    registerValue += 1
-                    item(registerValue, trigger=self.get_trigger())
-                    # 2015-01-07 23:53:08,435 DEBUG    Pluggit      Item pluggit.unitMode = 8 via Pluggit None None -- item.py:__update:363
-                    # self.logger.debug("Pluggit: Week Program Number: {0}".format(registerValue))
-                    # 2015-01-07 23:53:08,422 DEBUG    Pluggit      Pluggit:
-                    # Active Unit Mode: Week program --
-                    # __init__.py:_refresh:177
-
-                # active unit mode
-                if values == self._modbusRegisterDic[
-                        'prmRamIdxUnitMode'] and registerValue == 8:
-                    # self.logger.debug("Pluggit: Active Unit Mode: Week program")
-                    item('Woche', trigger=self.get_trigger())
-                if values == self._modbusRegisterDic[
-                        'prmRamIdxUnitMode'] and registerValue == 4:
-                    # self.logger.debug("Pluggit: Active Unit Mode: Manual")
-                    item('Manuell', trigger=self.get_trigger())
-
-                # fan speed
-                if values == self._modbusRegisterDic['prmRomIdxSpeedLevel']:
-                    # self.logger.debug("Pluggit: Fan Speed: {0}".format(registerValue))
-                    item(registerValue, trigger=self.get_trigger())
-
-                # remaining filter lifetime
-                if values == self._modbusRegisterDic['prmFilterRemainingTime']:
-                    # self.logger.debug("Pluggit: Remaining filter lifetime: {0}".format(registerValue))
-                    item(registerValue, trigger=self.get_trigger())
-
-                # bypass state
-                if values == self._modbusRegisterDic[
-                        'prmRamIdxBypassActualState'] and registerValue == 255:
-                    # self.logger.debug("Pluggit: Bypass state: opened")
-                    item('geöffnet', trigger=self.get_trigger())
-                if values == self._modbusRegisterDic[
-                        'prmRamIdxBypassActualState'] and registerValue == 0:
-                    # self.logger.debug("Pluggit: Bypass state: closed")
-                    item('geschlossen', trigger=self.get_trigger())
-
-                # Temperatures
-                # Frischluft außen
-                if values == self._modbusRegisterDic['prmRamIdxT1']:
-                    t1 = self._Pluggit.read_holding_registers(
-                        values, 2, unit=22)
-                    decodert1 = BinaryPayloadDecoder.fromRegisters(
-                        t1.registers, endian=Endian.Big)
-                    t1 = decodert1.decode_32bit_float()
-                    t1 = round(t1, 2)
-                    # self.logger.debug("Pluggit: Frischluft außen: {0:4.1f}".format(t1))
-                    # self.logger.debug("Pluggit: Frischluft außen: {0}".format(t1))
-                    item(t1, trigger=self.get_trigger())
-
-                # Zuluft innen
-                if values == self._modbusRegisterDic['prmRamIdxT2']:
-                    t2 = self._Pluggit.read_holding_registers(
-                        values, 2, unit=22)
-                    decodert2 = BinaryPayloadDecoder.fromRegisters(
-                        t2.registers, endian=Endian.Big)
-                    t2 = decodert2.decode_32bit_float()
-                    t2 = round(t2, 2)
-                    # self.logger.debug("Pluggit: Zuluft innen: {0:4.1f}".format(t2))
-                    # self.logger.debug("Pluggit: Zuluft innen: {0}".format(t2))
-                    item(t2, trigger=self.get_trigger())
-
-                # Abluft innen
-                if values == self._modbusRegisterDic['prmRamIdxT3']:
-                    t3 = self._Pluggit.read_holding_registers(
-                        values, 2, unit=22)
-                    decodert3 = BinaryPayloadDecoder.fromRegisters(
-                        t3.registers, endian=Endian.Big)
-                    t3 = decodert3.decode_32bit_float()
-                    t3 = round(t3, 2)
-                    # self.logger.debug("Pluggit: Abluft innen: {0:4.1f}".format(t3))
-                    # self.logger.debug("Pluggit: Abluft innen: {0}".format(t3))
-                    item(t3, trigger=self.get_trigger())
-
-                # Fortluft außen
-                if values == self._modbusRegisterDic['prmRamIdxT4']:
-                    t4 = self._Pluggit.read_holding_registers(
-                        values, 2, unit=22)
-                    decodert4 = BinaryPayloadDecoder.fromRegisters(
-                        t4.registers, endian=Endian.Big)
-                    t4 = decodert4.decode_32bit_float()
-                    t4 = round(t4, 2)
-                    # self.logger.debug("Pluggit: Fortluft außen: {0:4.1f}".format(t4))
-                    # self.logger.debug("Pluggit: Fortluft außen: {0}".format(t4))
-                    item(t4, trigger=self.get_trigger())
-
-                # self.logger.debug("Pluggit: ------------------------------------------> Ende der Schleife vor sleep, Durchlauf Nr. {0}".format(myCounter))
-                time.sleep(0.1)
-                # myCounter += 1
-
+            self._updateItems(self._readRegisters())
         except Exception as e:
             self.logger.error(
                 "Pluggit: something went wrong in the refresh function: {0}".format(e))
             return
         end_time = time.time()
         cycletime = end_time - start_time
-        self.logger.debug("Pluggit: cycle took {0} seconds".format(cycletime))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Pluggit: cycle took %s seconds", cycletime)
+            self.logger.debug("Pluggit: modbus metrics %s",
+                self._Pluggit.metrics.summary()['counters'])
+
+    def _updateItems(self, registers):
+        # registers maps a unit to the values of its (address, count) reads
+        for pluggit_key in self._myTempReadDict:
+            values = self._modbusRegisterDic[pluggit_key]
+            item = self._myTempReadDict[pluggit_key]
+
+            # skip the registers that were not read (or could not be read)
+            if pluggit_key in self._temperatureKeys:
+                registerValues = registers.get(self._temperatureUnit, {}).get((values, 2))
+            else:
+                registerValues = registers.get(self._unit, {}).get((values, 1))
+            if registerValues is None:
+                continue
+            registerValue = registerValues[0]
+
+            # week program: possible values 0-10
+            if values == self._modbusRegisterDic['prmNumOfWeekProgram']:
+                registerValue += 1
+                item(registerValue, trigger=self.get_trigger())
+
+            # active unit mode
+            if values == self._modbusRegisterDic[
+                    'prmRamIdxUnitMode'] and registerValue == 8:
+                item('Woche', trigger=self.get_trigger())
+            if values == self._modbusRegisterDic[
+                    'prmRamIdxUnitMode'] and registerValue == 4:
+                item('Manuell', trigger=self.get_trigger())
+
+            # fan speed
+            if values == self._modbusRegisterDic['prmRomIdxSpeedLevel']:
+                item(registerValue, trigger=self.get_trigger())
+
+            # remaining filter lifetime
+            if values == self._modbusRegisterDic['prmFilterRemainingTime']:
+                item(registerValue, trigger=self.get_trigger())
+
+            # bypass state
+            if values == self._modbusRegisterDic[
+                    'prmRamIdxBypassActualState'] and registerValue == 255:
+                item('geöffnet', trigger=self.get_trigger())
+            if values == self._modbusRegisterDic[
+                    'prmRamIdxBypassActualState'] and registerValue == 0:
+                item('geschlossen', trigger=self.get_trigger())
+
+            # temperatures: T1 Frischluft außen, T2 Zuluft innen,
+            # T3 Abluft innen, T4 Fortluft außen
+            if pluggit_key in self._temperatureKeys:
+                item(self._decodeTemperature(registerValues),
+                     trigger=self.get_trigger())
+
+    def _decodeTemperature(self, registerValues):
+        # the temperatures are 32 bit big endian floats in two registers
+        decoder = BinaryPayloadDecoder.fromRegisters(
+            registerValues, endian=Endian.Big)
+        return round(decoder.decode_32bit_float(), 2)
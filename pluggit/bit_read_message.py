@@ -7,12 +7,13 @@ import struct
 from pluggit.pdu import ModbusRequest
 from pluggit.pdu import ModbusResponse
 from pluggit.pdu import ModbusExceptions as merror
-from pluggit.utilities import pack_bitstring, unpack_bitstring
+from pluggit.utilities import pack_bitstring, unpack_bitstring, Bitset
 from pluggit.compat import byte2int
 
 
 class ReadBitsRequestBase(ModbusRequest):
     ''' Base class for Messages Requesting bit values '''
+    __slots__ = ('address', 'count')
 
     _rtu_frame_size = 8
 
@@ -49,7 +50,17 @@ class ReadBitsRequestBase(ModbusRequest):
 
 
 class ReadBitsResponseBase(ModbusResponse):
-    ''' Base class for Messages responding to bit-reading values '''
+    ''' Base class for Messages responding to bit-reading values
+
+    .. attribute:: compact_bits
+
+       If set, the decoded bits are kept packed in a `Bitset` instead of
+       being expanded to a list of booleans, which is a lot cheaper for
+       large reads that only look at a few bits with `getBit`. A client
+       decoder created with `compact_bits=True` sets it on the responses
+       it decodes.
+    '''
+    __slots__ = ('bits', 'byte_count', 'compact_bits')
 
     _rtu_byte_count_pos = 2
 
@@ -57,9 +68,11 @@ class ReadBitsResponseBase(ModbusResponse):
         ''' Initializes a new instance
 
         :param values: The requested values to be returned
+        :param compact_bits: True to decode the bits into a Bitset
         '''
         ModbusResponse.__init__(self, **kwargs)
         self.bits = values or []
+        self.compact_bits = kwargs.get('compact_bits', False)
 
     def encode(self):
         ''' Encodes response pdu
@@ -76,7 +89,10 @@ class ReadBitsResponseBase(ModbusResponse):
         :param data: The packet data to decode
         '''
         self.byte_count = byte2int(data[0])
-        self.bits = unpack_bitstring(data[1:])
+        if self.compact_bits:
+            self.bits = Bitset(data[1:])
+        else:
+            self.bits = unpack_bitstring(data[1:])
 
     def setBit(self, address, value=1):
         ''' Helper function to set the specified bit
@@ -117,6 +133,7 @@ class ReadCoilsRequest(ReadBitsRequestBase):
     coils. In the PDU Coils are addressed starting at zero. Therefore coils
     numbered 1-16 are addressed as 0-15.
     '''
+    __slots__ = ()
     function_code = 1
 
     def __init__(self, address=None, count=None, **kwargs):
@@ -158,6 +175,7 @@ class ReadCoilsResponse(ReadBitsResponseBase):
     (toward the high order end of the byte). The Byte Count field specifies
     the quantity of complete bytes of data.
     '''
+    __slots__ = ()
     function_code = 1
 
     def __init__(self, values=None, **kwargs):
@@ -176,6 +194,7 @@ class ReadDiscreteInputsRequest(ReadBitsRequestBase):
     number of inputs. In the PDU Discrete Inputs are addressed starting at
     zero. Therefore Discrete inputs numbered 1-16 are addressed as 0-15.
     '''
+    __slots__ = ()
     function_code = 2
 
     def __init__(self, address=None, count=None, **kwargs):
@@ -217,6 +236,7 @@ class ReadDiscreteInputsResponse(ReadBitsResponseBase):
     (toward the high order end of the byte). The Byte Count field specifies
     the quantity of complete bytes of data.
     '''
+    __slots__ = ()
     function_code = 2
 
     def __init__(self, values=None, **kwargs):
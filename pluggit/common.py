@@ -6,6 +6,7 @@ This is a common client mixin that can be used by
 both the synchronous and asynchronous clients to
 simplify the interface.
 '''
+import time
 from pluggit.bit_read_message import *
 from pluggit.bit_write_message import *
 from pluggit.register_read_message import *
@@ -13,6 +14,12 @@ from pluggit.register_write_message import *
 from pluggit.diag_message import *
 from pluggit.file_message import *
 from pluggit.other_message import *
+from pluggit.mei_message import *
+from pluggit.constants import Defaults, MoreData
+from pluggit.exceptions import ModbusIOException
+from pluggit.compat import iteritems
+from pluggit.pdu import ExceptionResponse
+from pluggit.pdu import ModbusExceptions as merror
 
 
 class ModbusClientMixin(object):
@@ -132,6 +139,138 @@ class ModbusClientMixin(object):
         request = ReadWriteMultipleRegistersRequest(*args, **kwargs)
         return self.execute(request)
 
+    def read_device_information(self, read_code=None, object_id=0x00, **kwargs):
+        '''
+
+        :param read_code: The device information read code (default basic)
+        :param object_id: The object to start reading from
+        :param unit: The slave unit this request is targeting
+        :returns: A deferred response handle
+        '''
+        request = ReadDeviceInformationRequest(read_code, object_id, **kwargs)
+        return self.execute(request)
+
+    def read_device_information_objects(self, read_code=None, object_id=0x00, **kwargs):
+        ''' Streams the device information objects of a device
+
+        A device returns as many objects as fit into one response, the
+        remaining ones are requested as the objects are consumed.
+
+        :param read_code: The device information read code (default basic)
+        :param object_id: The object to start reading from
+        :param unit: The slave unit this request is targeting
+        :returns: A generator of (object id, value) pairs
+        :raises ModbusIOException: If one of the requests failed
+        '''
+        seen = set()
+        while True:
+            response = self.read_device_information(read_code, object_id, **kwargs)
+            if response is None or isinstance(response, ExceptionResponse):
+                raise ModbusIOException("Reading object %d failed: %s" % (object_id, response))
+            for item in iteritems(response.information):
+                seen.add(item[0])
+                yield item
+            if response.more_follows != MoreData.KeepReading \
+                    or not response.information \
+                    or response.next_object_id in seen:
+                return
+            object_id = response.next_object_id
+
+    def read_fifo_queue(self, address=0x0000, **kwargs):
+        '''
+
+        :param address: The fifo pointer address
+        :param unit: The slave unit this request is targeting
+        :returns: A deferred response handle
+        '''
+        request = ReadFifoQueueRequest(address, **kwargs)
+        return self.execute(request)
+
+    def drain_fifo_queue(self, address=0x0000, follow=False,
+                         interval=Defaults.FifoInterval, **kwargs):
+        ''' Streams the entries of a fifo queue until it is empty
+
+        This is meant for devices that remove the entries they return. A
+        full response (31 entries) is followed by the next read right
+        away, a partial one means the queue is empty. With follow the
+        queue is polled on: after a partial response the wait is the part
+        of interval the queue was empty, while the queue stays empty the
+        wait doubles up to interval. The queue is only read when the
+        consumer asks for more entries, so whatever it is not ready for is
+        left queued on the device.
+
+        :param address: The fifo pointer address
+        :param follow: True to keep polling once the queue is empty
+        :param interval: The longest wait between two polls in seconds
+        :param unit: The slave unit this request is targeting
+        :returns: A generator of the queued register values
+        :raises ModbusIOException: If one of the requests failed
+        '''
+        capacity, delay = 31, 0
+        while True:
+            response = self.read_fifo_queue(address, **kwargs)
+            if response is None or isinstance(response, ExceptionResponse):
+                raise ModbusIOException("Reading fifo %d failed: %s" % (address, response))
+            for value in response.values:
+                yield value
+            fill = len(response.values)
+            if fill >= capacity:
+                delay = 0
+                continue
+            if not follow:
+                return
+            # the fuller the queue was the sooner it is read again, while
+            # it stays empty the wait doubles up to the interval
+            if fill: delay = interval * (capacity - fill) / capacity
+            else: delay = min(max(2 * delay, interval / 32.0), interval)
+            time.sleep(delay)
+
+    def write_verify_registers(self, address, values, read_address=None,
+                               read_count=None, **kwargs):
+        ''' Writes registers and reads back the result in as few round
+        trips as the device allows
+
+        The first call per unit tries a single read/write multiple registers
+        request (0x17). If the device rejects it with IllegalFunction that is
+        remembered (in the readwrite_support dictionary every client sets up)
+        and from then on the unit is served by a write multiple registers
+        request followed by a read holding registers request.
+
+        :param address: The starting address to write to
+        :param values: The values to write to the specified address
+        :param read_address: The address to read back (default address)
+        :param read_count: The registers to read back (default len(values))
+        :param unit: The slave unit this request is targeting
+        :returns: A ReadWriteMultipleRegistersResponse with the read back
+                  registers, or the response of the failing request
+        '''
+        values = list(values)
+        if read_address is None: read_address = address
+        if read_count is None: read_count = len(values)
+        supported = self.readwrite_support
+        unit = kwargs.get('unit', Defaults.UnitId)
+
+        if supported.get(unit, True):
+            response = self.readwrite_registers(read_address=read_address,
+                read_count=read_count, write_address=address,
+                write_registers=values, **kwargs)
+            if not isinstance(response, ExceptionResponse) \
+                    or response.exception_code != merror.IllegalFunction:
+                if response is not None: supported[unit] = True
+                return response
+            supported[unit] = False
+
+        response = self.write_registers(address, values, **kwargs)
+        if response is None or isinstance(response, ExceptionResponse):
+            return response
+        response = self.read_holding_registers(read_address, read_count, **kwargs)
+        if response is None or isinstance(response, ExceptionResponse):
+            return response
+        result = ReadWriteMultipleRegistersResponse(response.registers)
+        result.transaction_id = response.transaction_id
+        result.unit_id = response.unit_id
+        return result
+
 #---------------------------------------------------------------------------#
 # Exported symbols
 #---------------------------------------------------------------------------#
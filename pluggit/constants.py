@@ -25,6 +25,79 @@ class Defaults(Singleton):
        The default amount of time a client should wait for a request
        to be processed (3 seconds)
 
+    .. attribute:: Backoff
+
+       The initial delay a client should wait before retrying a failed
+       request. It is doubled on every further retry (0.1 seconds)
+
+    .. attribute:: BackoffMax
+
+       The upper bound for the delay between two retries (2 seconds)
+
+    .. attribute:: MinTimeout
+
+       The lower bound for a timeout derived from the observed round
+       trip times of a device (0.2 seconds)
+
+    .. attribute:: CircuitThreshold
+
+       The number of consecutive failed requests after which a client
+       considers a device offline and fails fast (3)
+
+    .. attribute:: CircuitReset
+
+       The amount of time a client fails fast before it tries to reach
+       an offline device again (30 seconds)
+
+    .. attribute:: FreeListSize
+
+       The number of released response objects per message type that
+       are kept around for reuse by a decoder (16)
+
+    .. attribute:: TraceSize
+
+       The number of packets kept by a packet trace (256)
+
+    .. attribute:: MaxReadCount
+
+       The largest number of registers a single read request may ask
+       for, which keeps the response within the maximum pdu size (125)
+
+    .. attribute:: PlannerRtt
+
+       The round trip time a read planner assumes for every additional
+       request (0.05 seconds)
+
+    .. attribute:: PlannerByteTime
+
+       The time a read planner assumes for transferring one more byte,
+       ten bits at the default baudrate (~0.5 milliseconds)
+
+    .. attribute:: PoolMaxConnections
+
+       The number of connections a connection pool opens at most to a
+       single endpoint, as many gateways accept only one (1)
+
+    .. attribute:: PoolIdleTimeout
+
+       The time after which a connection pool closes an unused
+       connection (60 seconds)
+
+    .. attribute:: MaxInFlight
+
+       The number of requests a udp client keeps in flight at once when
+       it executes several of them (8)
+
+    .. attribute:: FifoInterval
+
+       The longest time a fifo queue is left unpolled while it stays
+       empty, polling speeds up again as entries arrive (1 second)
+
+    .. attribute:: IdentifyRetry
+
+       The time after which a device that did not answer the
+       identification is asked again (3600 seconds)
+
     .. attribute:: Reconnects
 
        The default number of times a client should attempt to reconnect
@@ -74,6 +147,21 @@ class Defaults(Singleton):
     Port          = 502
     Retries       = 3
     Timeout       = 3
+    Backoff       = 0.1
+    BackoffMax    = 2
+    MinTimeout    = 0.2
+    CircuitThreshold = 3
+    CircuitReset  = 30
+    FreeListSize  = 16
+    TraceSize     = 256
+    MaxReadCount  = 125
+    PlannerRtt    = 0.05
+    PlannerByteTime = 10.0 / 19200
+    PoolMaxConnections = 1
+    PoolIdleTimeout = 60
+    MaxInFlight   = 8
+    FifoInterval  = 1.0
+    IdentifyRetry = 3600
     Reconnects    = 0
     TransactionId = 0
     ProtocolId    = 0
@@ -6,6 +6,8 @@ These are the device management handlers.  They should be
 maintained in the server context and the various methods
 should be inserted in the correct locations.
 """
+import threading
+from collections import deque
 from pluggit.constants import DeviceInformation
 from pluggit.interfaces import Singleton
 from pluggit.utilities import dict_property
@@ -219,7 +221,7 @@ class ModbusDeviceIdentification(object):
         '''
         if isinstance(info, dict):
             for key in info:
-                if (0x06 >= key >= 0x00) or (0x80 > key > 0x08):
+                if (0x06 >= key >= 0x00) or (0xff >= key >= 0x80):
                     self.__data[key] = info[key]
 
     def __iter__(self):
@@ -288,7 +290,8 @@ class DeviceInformationFactory(Singleton):
     __lookup = {
         DeviceInformation.Basic:    lambda c,r,i: c.__gets(r, list(range(0x00, 0x03))),
         DeviceInformation.Regular:  lambda c,r,i: c.__gets(r, list(range(0x00, 0x08))),
-        DeviceInformation.Extended: lambda c,r,i: c.__gets(r, list(range(0x80, i))),
+        DeviceInformation.Extended: lambda c,r,i: c.__gets(r, list(range(0x00, 0x08))
+                                        + sorted(k for k, _ in r if k >= 0x80)),
         DeviceInformation.Specific: lambda c,r,i: c.__get(r, i),
     }
 
@@ -396,26 +399,108 @@ class ModbusCountersHandler(object):
              than they can.
 
     .. note:: I threw the event counter in here for convinience
+
+    The counters are sharded per thread: every thread increments its own
+    shard without taking a lock, reading a counter adds up the shards
+    under a lock (folding the shards of ended threads into one).
     '''
-    __data = dict([(i, 0x0000) for i in range(9)])
     __names   = [
         'BusMessage',
         'BusCommunicationError',
-        'SlaveExceptionError',
+        'BusExceptionError',
         'SlaveMessage',
         'SlaveNoResponse',
         'SlaveNAK',
         'SlaveBusy',
-        'BusCharacterOverrun'
-        'Event '
+        'BusCharacterOverrun',
+        'Event',
     ]
+    __index = dict((name, i) for i, name in enumerate(__names))
+
+    def __init__(self):
+        ''' Initializes a new set of counters
+        '''
+        self.__lock    = threading.Lock()
+        self.__local   = threading.local()
+        self.__shards  = []                       # (thread, shard) pairs
+        self.__retired = [0] * len(self.__names)  # shards of ended threads
+        self.__base    = [0] * len(self.__names)  # the totals at the last reset
 
     def __iter__(self):
         ''' Iterater over the device counters
 
         :returns: An iterator of the device counters
         '''
-        return izip(self.__names, itervalues(self.__data))
+        return izip(self.__names, self.__totals())
+
+    def __shard(self):
+        ''' Returns the shard of the calling thread, creating it on the
+        first increment of the thread
+
+        :returns: The list of counts of the calling thread
+        '''
+        shard = getattr(self.__local, 'shard', None)
+        if shard is None:
+            shard = self.__local.shard = [0] * len(self.__names)
+            with self.__lock:
+                self.__fold()
+                self.__shards.append((threading.current_thread(), shard))
+        return shard
+
+    def __fold(self):
+        ''' Adds the shards of ended threads to the retired counts and
+        drops them, as nothing writes to them anymore. The lock must be
+        held.
+        '''
+        alive = []
+        for thread, shard in self.__shards:
+            if thread.is_alive(): alive.append((thread, shard))
+            else: self.__retired = [a + b for a, b in izip(self.__retired, shard)]
+        self.__shards = alive
+
+    def __collect(self):
+        ''' Adds up the shards. The lock must be held.
+
+        :returns: The list of the current counter values
+        '''
+        self.__fold()
+        totals = list(self.__retired)
+        for _, shard in self.__shards:
+            totals = [a + b for a, b in izip(totals, shard)]
+        return [a - b for a, b in izip(totals, self.__base)]
+
+    def __totals(self):
+        ''' Adds up the shards
+
+        :returns: The list of the current counter values
+        '''
+        with self.__lock:
+            return self.__collect()
+
+    def __get(self, index):
+        ''' Returns the value of a counter
+
+        :param index: The index of the counter
+        :returns: The current counter value
+        '''
+        return self.__totals()[index]
+
+    def __set(self, index, value):
+        ''' Sets the value of a counter
+
+        :param index: The index of the counter
+        :param value: The new counter value
+        '''
+        with self.__lock:
+            self.__base[index] += self.__collect()[index] - value
+
+    def increment(self, name, value=1):
+        ''' Increments a counter in the shard of the calling thread
+
+        :param name: The name of the counter (e.g. 'BusMessage')
+        :param value: The amount to add
+        '''
+        self.__shard()[self.__index[name]] += value
 
     def update(self, values):
         ''' Update the values of this identity
@@ -424,13 +509,14 @@ class ModbusCountersHandler(object):
         :param values: The value to copy values from
         '''
         for k, v in iteritems(values):
-            v += self.__getattribute__(k)
-            self.__setattr__(k, v)
+            self.increment(k, v)
 
     def reset(self):
         ''' This clears all of the system counters
         '''
-        self.__data = dict([(i, 0x0000) for i in range(9)])
+        with self.__lock:
+            totals = self.__collect()
+            self.__base = [a + b for a, b in izip(self.__base, totals)]
 
     def summary(self):
         ''' Returns a summary of the counters current status
@@ -438,7 +524,7 @@ class ModbusCountersHandler(object):
         :returns: A byte with each bit representing each counter
         '''
         count, result = 0x01, 0x00
-        for i in itervalues(self.__data):
+        for i in self.__totals():
             if i != 0x00: result |= count
             count <<= 1
         return result
@@ -446,15 +532,15 @@ class ModbusCountersHandler(object):
     #-------------------------------------------------------------------------#
     # Properties
     #-------------------------------------------------------------------------#
-    BusMessage            = dict_property(lambda s: s.__data, 0)
-    BusCommunicationError = dict_property(lambda s: s.__data, 1)
-    BusExceptionError     = dict_property(lambda s: s.__data, 2)
-    SlaveMessage          = dict_property(lambda s: s.__data, 3)
-    SlaveNoResponse       = dict_property(lambda s: s.__data, 4)
-    SlaveNAK              = dict_property(lambda s: s.__data, 5)
-    SlaveBusy             = dict_property(lambda s: s.__data, 6)
-    BusCharacterOverrun   = dict_property(lambda s: s.__data, 7)
-    Event                 = dict_property(lambda s: s.__data, 8)
+    BusMessage            = property(lambda s: s.__get(0), lambda s, v: s.__set(0, v))
+    BusCommunicationError = property(lambda s: s.__get(1), lambda s, v: s.__set(1, v))
+    BusExceptionError     = property(lambda s: s.__get(2), lambda s, v: s.__set(2, v))
+    SlaveMessage          = property(lambda s: s.__get(3), lambda s, v: s.__set(3, v))
+    SlaveNoResponse       = property(lambda s: s.__get(4), lambda s, v: s.__set(4, v))
+    SlaveNAK              = property(lambda s: s.__get(5), lambda s, v: s.__set(5, v))
+    SlaveBusy             = property(lambda s: s.__get(6), lambda s, v: s.__set(6, v))
+    BusCharacterOverrun   = property(lambda s: s.__get(7), lambda s, v: s.__set(7, v))
+    Event                 = property(lambda s: s.__get(8), lambda s, v: s.__set(8, v))
 
 
 #---------------------------------------------------------------------------#
@@ -476,7 +562,9 @@ class ModbusControlBlock(Singleton):
     __counters = ModbusCountersHandler()
     __identity = ModbusDeviceIdentification()
     __plus     = ModbusPlusStatistics()
-    __events   = []
+    __events   = deque(maxlen=64)
+    __encoded  = b''
+    __lock     = threading.Lock()
 
     #-------------------------------------------------------------------------#
     # Magic
@@ -501,24 +589,33 @@ class ModbusControlBlock(Singleton):
     def addEvent(self, event):
         ''' Adds a new event to the event log
 
+        The log keeps the newest 64 events, the encoded log is kept up
+        to date alongside so reading it does not encode every event.
+
         :param event: A new event to add to the log
         '''
-        self.__events.insert(0, event)
-        self.__events = self.__events[0:64]  # chomp to 64 entries
-        self.Counter.Event += 1
+        with self.__lock:
+            encoded = self.__encoded
+            if len(self.__events) == self.__events.maxlen:
+                dropped = len(self.__events[-1].encode())
+                encoded = encoded[:len(encoded) - dropped]
+            self.__events.appendleft(event)
+            self.__encoded = event.encode() + encoded
+        self.Counter.increment('Event')
 
     def getEvents(self):
         ''' Returns an encoded collection of the event log.
 
         :returns: The encoded events packet
         '''
-        events = [event.encode() for event in self.__events]
-        return b''.join(events)
+        return self.__encoded
 
     def clearEvents(self):
         ''' Clears the current list of events
         '''
-        self.__events = []
+        with self.__lock:
+            self.__events.clear()
+            self.__encoded = b''
 
     #-------------------------------------------------------------------------#
     # Other Properties
@@ -532,7 +629,7 @@ class ModbusControlBlock(Singleton):
         ''' This clears all of the system counters and the
             diagnostic register
         '''
-        self.__events = []
+        self.clearEvents()
         self.__counters.reset()
         self.__diagnostic = [False] * 16
 
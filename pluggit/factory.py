@@ -8,8 +8,12 @@ add them to the respective function lookup table (order doesn't matter, but
 it does help keep things organized).
 
 Regardless of how many functions are added to the lookup, O(1) behavior is
-kept as a result of a pre-computed lookup dictionary.
+kept as a result of a pre-computed dispatch table: a list of 256 message
+constructors that is indexed directly by the function code of a frame.
+Unknown codes and the exception range (> 0x80) are resolved when the table
+is built, as is the table of sub-function classes of each function code.
 """
+from functools import partial
 
 from pluggit.pdu import IllegalFunctionRequest
 from pluggit.pdu import ExceptionResponse
@@ -89,12 +93,18 @@ class ServerDecoder(IModbusDecoder):
     ]
 
     def __init__(self, **kwargs):
-        ''' Initializes the client lookup tables
+        ''' Initializes the server dispatch tables
         '''
-        functions = set(f.function_code for f in self.__function_table)
-        self.__lookup = dict([(f.function_code, f) for f in self.__function_table])
-        self.__sub_lookup = dict((f, {}) for f in functions)
+        self.__lookup = [ExceptionResponse] * 256
+        self.__dispatch = [partial(IllegalFunctionRequest, code)
+                           for code in range(256)]
+        self.__sub_lookup = [None] * 256
+        for f in self.__function_table:
+            self.__lookup[f.function_code] = f
+            self.__dispatch[f.function_code] = f
         for f in self.__sub_function_table:
+            if self.__sub_lookup[f.function_code] is None:
+                self.__sub_lookup[f.function_code] = {}
             self.__sub_lookup[f.function_code][f.sub_function_code] = f
 
     def decode(self, message):
@@ -106,7 +116,7 @@ class ServerDecoder(IModbusDecoder):
         try:
             return self._helper(message)
         except ModbusException as er:
-            _logger.warn("Unable to decode request %s" % er)
+            _logger.warning("Unable to decode request %s", er)
         return None
 
     def lookupPduClass(self, function_code):
@@ -115,7 +125,7 @@ class ServerDecoder(IModbusDecoder):
         :param function_code: The function code specified in a frame.
         :returns: The class of the PDU that has a matching `function_code`.
         '''
-        return self.__lookup.get(function_code, ExceptionResponse)
+        return self.__lookup[function_code]
 
     def _helper(self, data):
         '''
@@ -127,14 +137,13 @@ class ServerDecoder(IModbusDecoder):
         :returns: The decoded request or illegal function request object
         '''
         function_code = byte2int(data[0])
-        _logger.debug("Factory Request[%d]" % function_code)
-        request = self.__lookup.get(function_code, lambda: None)()
-        if not request:
-            request = IllegalFunctionRequest(function_code)
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug("Factory Request[%d]", function_code)
+        request = self.__dispatch[function_code]()
         request.decode(data[1:])
 
-        if hasattr(request, 'sub_function_code'):
-            lookup = self.__sub_lookup.get(request.function_code, {})
+        lookup = self.__sub_lookup[function_code]
+        if lookup is not None:
             subtype = lookup.get(request.sub_function_code, None)
             if subtype: request.__class__ = subtype
 
@@ -196,13 +205,27 @@ class ClientDecoder(IModbusDecoder):
             ReadDeviceInformationResponse,
     ]
 
-    def __init__(self):
+    def __init__(self, **kwargs):
         ''' Initializes the client lookup tables
+
+        :param reuse: True to take the responses from the free lists
+        :param compact_bits: True to decode coils and discrete inputs
+                             into a Bitset (see ReadBitsResponseBase)
         '''
-        functions = set(f.function_code for f in self.__function_table)
-        self.__lookup = dict([(f.function_code, f) for f in self.__function_table])
-        self.__sub_lookup = dict((f, {}) for f in functions)
+        self.reuse = kwargs.get('reuse', False)
+        self.compact_bits = kwargs.get('compact_bits', False)
+        self.__lookup = [ExceptionResponse] * 256
+        self.__dispatch = [None] * 256
+        self.__sub_lookup = [None] * 256
+        for f in self.__function_table:
+            self.__lookup[f.function_code] = f
+            self.__dispatch[f.function_code] = f.acquire if self.reuse else f
+        for code in range(0x81, 256):
+            self.__dispatch[code] = partial(ExceptionResponse, code & 0x7f,
+                                            ecode.IllegalFunction)
         for f in self.__sub_function_table:
+            if self.__sub_lookup[f.function_code] is None:
+                self.__sub_lookup[f.function_code] = {}
             self.__sub_lookup[f.function_code][f.sub_function_code] = f
 
     def lookupPduClass(self, function_code):
@@ -211,7 +234,7 @@ class ClientDecoder(IModbusDecoder):
         :param function_code: The function code specified in a frame.
         :returns: The class of the PDU that has a matching `function_code`.
         '''
-        return self.__lookup.get(function_code, ExceptionResponse)
+        return self.__lookup[function_code]
 
     def decode(self, message):
         ''' Wrapper to decode a response packet
@@ -222,7 +245,7 @@ class ClientDecoder(IModbusDecoder):
         try:
             return self._helper(message)
         except ModbusException as er:
-            _logger.error("Unable to decode response %s" % er)
+            _logger.error("Unable to decode response %s", er)
         return None
 
     def _helper(self, data):
@@ -235,17 +258,18 @@ class ClientDecoder(IModbusDecoder):
         :returns: The decoded request or an exception response object
         '''
         function_code = byte2int(data[0])
-        _logger.debug("Factory Response[%d]" % function_code)
-        response = self.__lookup.get(function_code, lambda: None)()
-        if function_code > 0x80:
-            code = function_code & 0x7f  # strip error portion
-            response = ExceptionResponse(code, ecode.IllegalFunction)
-        if not response:
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug("Factory Response[%d]", function_code)
+        factory = self.__dispatch[function_code]
+        if factory is None:
             raise ModbusException("Unknown response %d" % function_code)
+        response = factory()
+        if self.compact_bits and function_code in (0x01, 0x02):
+            response.compact_bits = True
         response.decode(data[1:])
 
-        if hasattr(response, 'sub_function_code'):
-            lookup = self.__sub_lookup.get(response.function_code, {})
+        lookup = self.__sub_lookup[function_code]
+        if lookup is not None:
             subtype = lookup.get(response.sub_function_code, None)
             if subtype: response.__class__ = subtype
 
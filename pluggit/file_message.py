@@ -2,7 +2,8 @@
 File Record Read/Write Messages
 -------------------------------
 
-Currently none of these messages are implemented
+The server side of the file record messages is not implemented, see
+ModbusFileTransfer for reading and writing long record ranges.
 '''
 import struct
 from pluggit.pdu import ModbusRequest
@@ -155,7 +156,7 @@ class ReadFileRecordResponse(ModbusResponse):
         total  = sum(record.response_length + 1 for record in self.records)
         packet = struct.pack('B', total)
         for record in self.records:
-            packet += struct.pack('>BB', 0x06, record.record_length)
+            packet += struct.pack('>BB', record.response_length, 0x06)
             packet += record.record_data
         return packet
 
@@ -167,7 +168,8 @@ class ReadFileRecordResponse(ModbusResponse):
         count, self.records = 1, []
         byte_count = byte2int(data[0])
         while count < byte_count:
-            response_length, reference_type = struct.unpack('>BB', data[count:count+2])
+            response_length = byte2int(data[count])
+            reference_type  = byte2int(data[count + 1])
             count += response_length + 1 # the count is not included
             record = FileRecord(response_length=response_length,
                 record_data=data[count - response_length + 1:count])
@@ -389,7 +391,6 @@ class ReadFifoQueueRequest(ModbusRequest):
         '''
         ModbusRequest.__init__(self, **kwargs)
         self.address = address
-        self.values = []  # this should be added to the context
 
     def encode(self):
         ''' Encodes the request packet
@@ -406,17 +407,26 @@ class ReadFifoQueueRequest(ModbusRequest):
         self.address = struct.unpack('>H', data)[0]
 
     def execute(self, context):
-        ''' Run a read exeception status request against the store
+        ''' Run a read fifo queue request against the store
+
+        The queue is kept in the holding registers: the count register at
+        the fifo pointer address, followed by the queued registers.
 
         :param context: The datastore to request from
         :returns: The populated response
         '''
         if not (0x0000 <= self.address <= 0xffff):
             return self.doException(merror.IllegalValue)
-        if len(self.values) > 31:
+        if not context.validate(0x03, self.address, 1):
+            return self.doException(merror.IllegalAddress)
+        count = context.getValues(0x03, self.address, 1)[0]
+        if count > 31:
             return self.doException(merror.IllegalValue)
-        # TODO pull the values from some context
-        return ReadFifoQueueResponse(self.values)
+        if not count:
+            return ReadFifoQueueResponse([])
+        if not context.validate(0x03, self.address + 1, count):
+            return self.doException(merror.IllegalAddress)
+        return ReadFifoQueueResponse(context.getValues(0x03, self.address + 1, count))
 
 
 class ReadFifoQueueResponse(ModbusResponse):
@@ -440,7 +450,7 @@ class ReadFifoQueueResponse(ModbusResponse):
         '''
         hi_byte = byte2int(data[2])
         lo_byte = byte2int(data[3])
-        return (hi_byte << 16) + lo_byte + 6
+        return (hi_byte << 8) + lo_byte + 6
 
     def __init__(self, values=None, **kwargs):
         ''' Initializes a new instance
@@ -456,7 +466,7 @@ class ReadFifoQueueResponse(ModbusResponse):
         :returns: The byte encoded message
         '''
         length = len(self.values) * 2
-        packet = struct.pack('>HH', 2 + length, length)
+        packet = struct.pack('>HH', 2 + length, len(self.values))
         for value in self.values:
             packet += struct.pack('>H', value)
         return packet
@@ -466,11 +476,8 @@ class ReadFifoQueueResponse(ModbusResponse):
 
         :param data: The packet data to decode
         '''
-        self.values = []
         _, count = struct.unpack('>HH', data[0:4])
-        for index in range(0, count - 4):
-            idx = 4 + index * 2
-            self.values.append(struct.unpack('>H', data[idx:idx + 2])[0])
+        self.values = list(struct.unpack('>%dH' % count, data[4:4 + 2 * count]))
 
 #---------------------------------------------------------------------------#
 # Exported symbols
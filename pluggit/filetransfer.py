@@ -0,0 +1,167 @@
+'''
+Modbus File Transfer
+---------------------
+
+The file record functions (0x14 / 0x15) address the extended memory of a
+device as files of 10000 records of one register each. A single request
+can only carry a few hundred bytes, so reading a log or a configuration
+blob record by record is painfully slow. The file transfer splits any
+number of record ranges into as few requests as the pdu limits allow,
+pipelines those requests and reassembles the data::
+
+    transfer = ModbusFileTransfer(client)
+    log = transfer.read(4, 0, 2000)         # 2000 records of file 4
+    transfer.write(5, 100, b'\x00\x01' * 300)
+
+Each request is packed to the brim: a range is cut where the request is
+full and continued in the next one, a request holds as many
+sub-requests as fit.
+'''
+from pluggit.constants import Defaults
+from pluggit.exceptions import ModbusIOException, ParameterException
+from pluggit.file_message import FileRecord
+from pluggit.file_message import ReadFileRecordRequest, WriteFileRecordRequest
+from pluggit.pdu import ExceptionResponse
+
+#---------------------------------------------------------------------------#
+# Logging
+#---------------------------------------------------------------------------#
+import logging
+_logger = logging.getLogger(__name__)
+
+
+class ModbusFileTransfer(object):
+    '''
+    Reads and writes long record ranges with packed and pipelined file
+    record requests (see the module documentation).
+    '''
+
+    RecordsPerFile = 10000
+    ReadSpace  = 0xf5   # the largest byte count of a read response
+    WriteSpace = 0xfb   # the largest byte count of a write request
+
+    def __init__(self, client, **kwargs):
+        ''' Initializes a new file transfer
+
+        :param client: The client to transfer with
+        :param window: The requests kept in flight (default 8)
+        :param unit: The slave unit the transfers are targeting
+        '''
+        self.client = client
+        self.window = kwargs.get('window', Defaults.MaxInFlight)
+        self.unit = kwargs.get('unit', Defaults.UnitId)
+
+    def __pack(self, ranges, space, overhead, parts=None):
+        ''' Packs the record ranges into as few requests as possible
+
+        :param ranges: A list of (file, record, count) ranges
+        :param space: The byte count available per request
+        :param overhead: The bytes a sub-request costs besides its data
+        :param parts: The largest number of sub-requests per request
+        :returns: The list of requests, each a list of
+                  (range index, register offset, file, record, count)
+        '''
+        requests, current, used = [], [], 0
+        for index, (file_number, record_number, count) in enumerate(ranges):
+            if count < 0 or record_number < 0 or \
+                    record_number + count > self.RecordsPerFile:
+                raise ParameterException("Invalid record range %d:%d+%d"
+                    % (file_number, record_number, count))
+            offset = 0
+            while offset < count:
+                length = min(count - offset, (space - used - overhead) // 2)
+                if length < 1 or len(current) == parts:
+                    requests.append(current)
+                    current, used = [], 0
+                    continue
+                current.append((index, offset, file_number,
+                                record_number + offset, length))
+                used += overhead + 2 * length
+                offset += length
+        if current: requests.append(current)
+        return requests
+
+    def __execute(self, requests):
+        ''' Executes the requests and checks their responses
+
+        :param requests: The requests to execute
+        :returns: The list of responses
+        :raises ModbusIOException: If one of the requests failed
+        '''
+        if hasattr(self.client, 'execute_many'):
+            responses = self.client.execute_many(requests, self.window)
+        else: responses = [self.client.execute(request) for request in requests]
+        for request, response in zip(requests, responses):
+            if response is None or isinstance(response, ExceptionResponse):
+                raise ModbusIOException("File transfer failed: %s" % response)
+        return responses
+
+    def read_many(self, ranges):
+        ''' Reads several record ranges
+
+        :param ranges: A list of (file, record, count) ranges
+        :returns: A list with a bytearray of the data of each range
+        :raises ModbusIOException: If one of the requests failed
+        '''
+        results = [bytearray(2 * count) for (_, _, count) in ranges]
+        # every sub-request takes 7 bytes of the request as well
+        packed = self.__pack(ranges, self.ReadSpace, 2, self.ReadSpace // 7)
+        requests = [ReadFileRecordRequest([FileRecord(file_number=f,
+            record_number=r, record_length=n) for (_, _, f, r, n) in parts],
+            unit=self.unit) for parts in packed]
+
+        for parts, response in zip(packed, self.__execute(requests)):
+            if len(response.records) != len(parts):
+                raise ModbusIOException("Expected %d records, got %d"
+                    % (len(parts), len(response.records)))
+            for (index, offset, f, r, length), record in zip(parts, response.records):
+                if len(record.record_data) != 2 * length:
+                    raise ModbusIOException("Truncated record %d:%d" % (f, r))
+                results[index][2 * offset:2 * (offset + length)] = record.record_data
+        return results
+
+    def read(self, file_number, record_number, count):
+        ''' Reads a record range
+
+        :param file_number: The file to read from
+        :param record_number: The first record to read
+        :param count: The number of records (registers) to read
+        :returns: A bytearray of the data
+        :raises ModbusIOException: If one of the requests failed
+        '''
+        return self.read_many([(file_number, record_number, count)])[0]
+
+    def write_many(self, ranges):
+        ''' Writes several record ranges
+
+        :param ranges: A list of (file, record, data) ranges, data of odd
+                       length is padded with a zero byte
+        :raises ModbusIOException: If one of the requests failed
+        '''
+        data = []
+        for _, _, value in ranges:
+            if len(value) % 2: value = bytes(value) + b'\x00'
+            data.append(memoryview(value))
+        packed = self.__pack([(f, r, len(d) // 2) for (f, r, _), d
+                              in zip(ranges, data)], self.WriteSpace, 7)
+        requests = [WriteFileRecordRequest([FileRecord(file_number=f,
+            record_number=r, record_length=n, record_data=bytes(
+                data[index][2 * offset:2 * (offset + n)]))
+            for (index, offset, f, r, n) in parts], unit=self.unit)
+            for parts in packed]
+        self.__execute(requests)
+
+    def write(self, file_number, record_number, data):
+        ''' Writes a record range
+
+        :param file_number: The file to write to
+        :param record_number: The first record to write
+        :param data: The data to write
+        :raises ModbusIOException: If one of the requests failed
+        '''
+        self.write_many([(file_number, record_number, data)])
+
+#---------------------------------------------------------------------------#
+# Exported symbols
+#---------------------------------------------------------------------------#
+__all__ = ['ModbusFileTransfer']
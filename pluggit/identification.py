@@ -0,0 +1,239 @@
+'''
+Modbus Device Identification
+-----------------------------
+
+Probing a device for what it is and what it supports costs requests, and
+failed requests on top. The identifier reads the basic device
+identification objects (function code 0x2b / 0x0e) of a device once, and
+keeps them together with the capabilities learned while talking to the
+device in a store, which can be persisted to a json file::
+
+    identifier = ModbusDeviceIdentifier(ModbusIdentityStore('devices.json'))
+    record = identifier.identify(client, unit=1)
+    record['product']                 # 'AP310'
+
+    planner = ModbusReadPlanner()
+    identifier.apply(client, 1, planner)   # restore what was learned
+    planner.read(client, reads, unit=1)
+    identifier.learn(client, 1, planner)   # persist what was learned
+
+The records are keyed by the client endpoint and the unit id. A device
+that does not implement the identification is remembered as well, so it
+is not asked again either; one that did not answer at all is asked again
+once the retry time (an hour by default) has passed. The learned
+capabilities are::
+
+    readwrite  - if the unit supports read/write multiple registers
+    max_count  - the largest block the planner may read
+    forbidden  - the register ranges the unit refuses to read
+'''
+import os
+import json
+import time
+import threading
+import tempfile
+from pluggit.constants import Defaults, DeviceInformation, MoreData
+from pluggit.exceptions import ModbusException
+from pluggit.pdu import ExceptionResponse
+
+#---------------------------------------------------------------------------#
+# Logging
+#---------------------------------------------------------------------------#
+import logging
+_logger = logging.getLogger(__name__)
+
+
+#---------------------------------------------------------------------------#
+# Store
+#---------------------------------------------------------------------------#
+class ModbusIdentityStore(object):
+    '''
+    The records of the identified devices, kept in memory and written to
+    a json file (if a path is given) whenever a record changes.
+    '''
+
+    def __init__(self, path=None):
+        ''' Initializes a new store, loading the file if it exists
+
+        :param path: The json file to persist to (default memory only)
+        '''
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__records = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as handle:
+                    self.__records = json.load(handle)
+            except (IOError, ValueError) as ex:
+                _logger.warning("Ignoring identity store %s: %s", path, ex)
+
+    def get(self, key):
+        ''' Returns a copy of the record of a device
+
+        :param key: The key of the device
+        :returns: The record dictionary, or None if unknown
+        '''
+        with self.__lock:
+            record = self.__records.get(key)
+            return dict(record) if record is not None else None
+
+    def update(self, key, **values):
+        ''' Updates the record of a device, saving it if it changed
+
+        :param key: The key of the device
+        :param values: The record fields to set
+        '''
+        with self.__lock:
+            record = self.__records.setdefault(key, {})
+            changed = any(record.get(name) != value
+                          for name, value in values.items())
+            record.update(values)
+            if changed: self.__save()
+
+    def remove(self, key):
+        ''' Forgets a device, so it is identified again
+
+        :param key: The key of the device
+        '''
+        with self.__lock:
+            if self.__records.pop(key, None) is not None:
+                self.__save()
+
+    def __save(self):
+        ''' Writes the records to the file, atomically replacing it
+        '''
+        if not self.path: return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            handle, name = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(handle, 'w') as output:
+                json.dump(self.__records, output, indent=2, sort_keys=True)
+            os.replace(name, self.path)
+        except (IOError, OSError) as ex:
+            _logger.error("Unable to save identity store %s: %s", self.path, ex)
+
+    def __len__(self):
+        ''' Returns the number of known devices
+
+        :returns: The number of records
+        '''
+        return len(self.__records)
+
+
+#---------------------------------------------------------------------------#
+# Identifier
+#---------------------------------------------------------------------------#
+class ModbusDeviceIdentifier(object):
+    '''
+    Identifies devices once and remembers what was learned about them
+    (see the module documentation).
+    '''
+
+    __names = {0x00: 'vendor', 0x01: 'product', 0x02: 'revision'}
+
+    def __init__(self, store=None, **kwargs):
+        ''' Initializes a new identifier
+
+        :param store: The ModbusIdentityStore to use (default memory only)
+        :param retry: The seconds until a silent device is asked again
+        '''
+        self.store = store if store is not None else ModbusIdentityStore()
+        self.retry = kwargs.get('retry', Defaults.IdentifyRetry)
+
+    @staticmethod
+    def key(client, unit):
+        ''' Returns the store key of a device
+
+        :param client: The client connected to the device
+        :param unit: The unit id of the device
+        :returns: The key string
+        '''
+        return "%s:%d" % (client, unit)
+
+    def identify(self, client, unit=0, refresh=False):
+        ''' Returns the identification of a device, reading it if unknown
+
+        :param client: The client connected to the device
+        :param unit: The unit id of the device
+        :param refresh: True to read the identification again
+        :returns: The record of the device, 'identified' is False if the
+                  device does not implement the identification, and
+                  'answered' is False as well if it did not answer
+        '''
+        key = self.key(client, unit)
+        record = None if refresh else self.store.get(key)
+        if record is not None and 'identified' in record:
+            if record.get('answered', True) \
+                    or time.time() - record.get('time', 0) < self.retry:
+                return record
+
+        objects, object_id = {}, 0x00
+        while True:
+            try:
+                response = client.read_device_information(
+                    DeviceInformation.Basic, object_id, unit=unit)
+            except ModbusException as ex:
+                response = None
+                _logger.debug("%s did not answer: %s", key, ex)
+            if response is None:
+                self.store.update(key, identified=False, answered=False,
+                                  time=time.time())
+                return self.store.get(key)
+            if isinstance(response, ExceptionResponse):
+                _logger.debug("%s does not identify itself: %s", key, response)
+                self.store.update(key, identified=False, answered=True,
+                                  time=time.time())
+                return self.store.get(key)
+            objects.update(response.information)
+            if response.more_follows != MoreData.KeepReading \
+                    or response.next_object_id in objects:
+                break
+            object_id = response.next_object_id
+
+        values = dict((self.__names.get(oid, str(oid)),
+                       data.decode('latin-1').strip('\x00 '))
+                      for oid, data in objects.items())
+        _logger.info("Identified %s as %s", key, values)
+        self.store.update(key, identified=True, answered=True,
+                          time=time.time(), **values)
+        return self.store.get(key)
+
+    def apply(self, client, unit, planner=None):
+        ''' Restores the learned capabilities of a device
+
+        :param client: The client connected to the device
+        :param unit: The unit id of the device
+        :param planner: The ModbusReadPlanner reading from the unit
+        '''
+        record = self.store.get(self.key(client, unit)) or {}
+        if record.get('readwrite') is not None:
+            client.readwrite_support.setdefault(unit, record['readwrite'])
+        if planner is not None:
+            planner.max_count = record.get('max_count', planner.max_count)
+            for start, end in record.get('forbidden', []):
+                if (start, end) not in planner.forbidden:
+                    planner.forbid(start, end - start)
+
+    def learn(self, client, unit, planner=None):
+        ''' Records the capabilities learned about a device
+
+        The store is only written if something changed.
+
+        :param client: The client connected to the device
+        :param unit: The unit id of the device
+        :param planner: The ModbusReadPlanner reading from the unit
+        '''
+        values = {}
+        support = client.readwrite_support
+        if unit in support:
+            values['readwrite'] = support[unit]
+        if planner is not None:
+            values['max_count'] = planner.max_count
+            values['forbidden'] = [list(span) for span in planner.forbidden]
+        if values:
+            self.store.update(self.key(client, unit), **values)
+
+#---------------------------------------------------------------------------#
+# Exported symbols
+#---------------------------------------------------------------------------#
+__all__ = ['ModbusDeviceIdentifier', 'ModbusIdentityStore']
@@ -80,6 +80,13 @@ class IModbusFramer(object):
         raise NotImplementedException(
             "Method not implemented by derived class")
 
+    def resetFrame(self):
+        ''' Reset the entire message frame
+        This allows us to skip over errors that may be in the stream.
+        '''
+        raise NotImplementedException(
+            "Method not implemented by derived class")
+
     def addToFrame(self, message):
         ''' Add the next message to the frame buffer
 
@@ -110,6 +117,19 @@ class IModbusFramer(object):
         raise NotImplementedException(
             "Method not implemented by derived class")
 
+    def getFrameSize(self, data):
+        ''' Find out how long the first frame in received data is
+
+        This lets a transport stop reading as soon as a frame is
+        complete instead of waiting for its read timeout.
+
+        :param data: The data received so far
+        :returns: The size of the data up to the end of the first frame,
+                  or None if more data is needed to tell
+        '''
+        raise NotImplementedException(
+            "Method not implemented by derived class")
+
     def populateResult(self, result):
         ''' Populates the modbus result with current frame header
 
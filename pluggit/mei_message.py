@@ -72,6 +72,10 @@ class ReadDeviceInformationRequest(ModbusRequest):
 
         information = DeviceInformationFactory.get(_MCB,
             self.read_code, self.object_id)
+        if self.read_code != DeviceInformation.Specific:
+            # stream access, continue where the previous response stopped
+            information = dict((object_id, value) for object_id, value
+                in iteritems(information) if object_id >= self.object_id)
         return ReadDeviceInformationResponse(self.read_code, information)
 
     def __str__(self):
@@ -85,9 +89,14 @@ class ReadDeviceInformationRequest(ModbusRequest):
 
 class ReadDeviceInformationResponse(ModbusResponse):
     '''
+    The objects of a response must fit into a single pdu, so a response
+    carries as many of the requested objects as fit. If some are left,
+    `more_follows` is set and `next_object_id` tells the client where to
+    continue with the next request.
     '''
     function_code = 0x2b
     sub_function_code = 0x0e
+    _max_object_size = 253 - 7 # the pdu limit minus the response header
 
     @classmethod
     def calculateRtuFrameSize(cls, data):
@@ -113,13 +122,24 @@ class ReadDeviceInformationResponse(ModbusResponse):
         '''
         ModbusResponse.__init__(self, **kwargs)
         self.read_code = read_code or DeviceInformation.Basic
-        self.information = information or {}
-        self.number_of_objects = len(self.information)
         self.conformity = 0x83 # I support everything right now
-
-        # TODO calculate
-        self.next_object_id = 0x00 # self.information[-1](0)
+        self.next_object_id = 0x00
         self.more_follows = MoreData.Nothing
+        self.information = {}
+
+        space = self._max_object_size
+        for object_id in sorted(information or {}):
+            data = information[object_id]
+            if not isinstance(data, bytes):
+                data = str(data).encode('utf-8')
+            data = data[:self._max_object_size - 2]
+            if len(data) + 2 > space:
+                self.next_object_id = object_id
+                self.more_follows = MoreData.KeepReading
+                break
+            self.information[object_id] = data
+            space -= len(data) + 2
+        self.number_of_objects = len(self.information)
 
     def encode(self):
         ''' Encodes the response
@@ -0,0 +1,212 @@
+'''
+Modbus Transaction Metrics
+---------------------------
+
+A collector for latency and error statistics of the transactions
+performed by a client. Every client owns an instance which is shared
+by its transaction manager and its framer::
+
+    client = ModbusTcpClient('127.0.0.1')
+    client.metrics.addCallback(lambda event, fc, value: ...)
+    client.read_holding_registers(1, 10)
+    print(client.metrics.summary())
+
+The bus related counts are also added to the counters of the global
+ModbusControlBlock, so they can be read with the diagnostic functions.
+'''
+from bisect import bisect_left
+from pluggit.device import ModbusControlBlock
+from pluggit.compat import iteritems
+
+#---------------------------------------------------------------------------#
+# Logging
+#---------------------------------------------------------------------------#
+import logging
+_logger = logging.getLogger(__name__)
+
+
+class ModbusMetrics(object):
+    '''
+    Records per function code round trip time histograms and the
+    following counters::
+
+        requests, responses, exceptions, bytes_in, bytes_out, retries,
+        timeouts, connection_errors, checksum_errors, decode_errors
+
+    Exporters can register a callback which is called for every recorded
+    event with the arguments `(event, function_code, value)`, where event
+    is one of the counter names above or 'rtt'. The function code is None
+    for events that cannot be attributed to a single request.
+    '''
+
+    Buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    __names = [
+        'requests', 'responses', 'exceptions', 'bytes_in', 'bytes_out',
+        'retries', 'timeouts', 'connection_errors', 'checksum_errors',
+        'decode_errors',
+    ]
+
+    def __init__(self, control=None, **kwargs):
+        ''' Initializes a new metrics collector
+
+        :param control: The control block to mirror the bus counters to
+                        (defaults to the global ModbusControlBlock)
+        :param buckets: The upper bounds of the rtt histogram buckets
+        '''
+        self.buckets     = tuple(kwargs.get('buckets', self.Buckets))
+        self.__control   = control or ModbusControlBlock()
+        self.__callbacks = []
+        self.reset()
+
+    def reset(self):
+        ''' Clears all the recorded values
+        '''
+        self.__counters  = dict((name, 0) for name in self.__names)
+        self.__histogram = {}
+
+    #-----------------------------------------------------------------------#
+    # Exporters
+    #-----------------------------------------------------------------------#
+    def addCallback(self, callback):
+        ''' Registers an exporter callback
+
+        :param callback: The function called as callback(event, fc, value)
+        '''
+        if callback not in self.__callbacks:
+            self.__callbacks.append(callback)
+
+    def removeCallback(self, callback):
+        ''' Removes a previously registered exporter callback
+
+        :param callback: The callback to remove
+        '''
+        if callback in self.__callbacks:
+            self.__callbacks.remove(callback)
+
+    def __record(self, event, function_code=None, value=1):
+        ''' Increments a counter and notifies the exporters
+
+        :param event: The name of the counter to increment
+        :param function_code: The function code the event belongs to
+        :param value: The amount to increment by
+        '''
+        self.__counters[event] += value
+        for callback in self.__callbacks:
+            try:
+                callback(event, function_code, value)
+            except Exception as ex:
+                _logger.error("Metrics callback failed: %s", ex)
+
+    #-----------------------------------------------------------------------#
+    # Recording
+    #-----------------------------------------------------------------------#
+    def recordRequest(self, function_code, size):
+        ''' Records a request that was sent
+
+        :param function_code: The function code of the request
+        :param size: The number of bytes written
+        '''
+        self.__record('requests', function_code)
+        self.__record('bytes_out', function_code, size)
+
+    def recordBytesIn(self, size):
+        ''' Records data that was received
+
+        :param size: The number of bytes read
+        '''
+        self.__record('bytes_in', None, size)
+
+    def recordResponse(self, function_code, rtt, response):
+        ''' Records a completed transaction
+
+        :param function_code: The function code of the request
+        :param rtt: The round trip time in seconds
+        :param response: The decoded response
+        '''
+        entry = self.__histogram.get(function_code)
+        if entry is None:
+            entry = self.__histogram[function_code] = {
+                'count': 0, 'sum': 0.0, 'buckets': [0] * (len(self.buckets) + 1)}
+        entry['count'] += 1
+        entry['sum'] += rtt
+        entry['buckets'][bisect_left(self.buckets, rtt)] += 1
+        for callback in self.__callbacks:
+            try:
+                callback('rtt', function_code, rtt)
+            except Exception as ex:
+                _logger.error("Metrics callback failed: %s", ex)
+
+        self.__record('responses', function_code)
+        self.__control.Counter.increment('BusMessage')
+        if response.function_code & 0x80:
+            self.__record('exceptions', function_code)
+            self.__control.Counter.increment('BusExceptionError')
+
+    def recordRetry(self, function_code):
+        ''' Records that a request is about to be retried
+
+        :param function_code: The function code of the request
+        '''
+        self.__record('retries', function_code)
+
+    def recordTimeout(self, function_code):
+        ''' Records a request that did not receive a response in time
+
+        :param function_code: The function code of the request
+        '''
+        self.__record('timeouts', function_code)
+        self.__control.Counter.increment('SlaveNoResponse')
+
+    def recordConnectionError(self, function_code):
+        ''' Records a failed attempt due to a transport error
+
+        :param function_code: The function code of the request
+        '''
+        self.__record('connection_errors', function_code)
+
+    def recordChecksumError(self):
+        ''' Records a frame that failed its CRC/LRC check
+        '''
+        self.__record('checksum_errors')
+        self.__control.Counter.increment('BusCommunicationError')
+
+    def recordDecodeError(self, function_code):
+        ''' Records a frame that could not be decoded
+
+        :param function_code: The function code of the request
+        '''
+        self.__record('decode_errors', function_code)
+
+    #-----------------------------------------------------------------------#
+    # Reading
+    #-----------------------------------------------------------------------#
+    def __getitem__(self, name):
+        ''' Returns the current value of a counter
+
+        :param name: The counter to read
+        '''
+        return self.__counters[name]
+
+    def summary(self):
+        ''' Returns a snapshot of all the recorded values
+
+        The histogram buckets are returned as a list of (upper bound,
+        count) pairs, the last bound being None for the overflow bucket.
+
+        :returns: A dictionary with the 'counters' and the 'rtt' histograms
+        '''
+        bounds = list(self.buckets) + [None]
+        histogram = {}
+        for code, entry in iteritems(self.__histogram):
+            histogram[code] = {
+                'count': entry['count'],
+                'sum': entry['sum'],
+                'buckets': list(zip(bounds, entry['buckets'])),
+            }
+        return {'counters': dict(self.__counters), 'rtt': histogram}
+
+#---------------------------------------------------------------------------#
+# Exported symbols
+#---------------------------------------------------------------------------#
+__all__ = ['ModbusMetrics']
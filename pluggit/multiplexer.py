@@ -0,0 +1,220 @@
+'''
+Modbus Unit Multiplexer
+------------------------
+
+Gateways usually hide a whole fleet of serial devices behind one tcp
+endpoint, addressed by their unit id. Instead of opening a connection
+(and running a scheduler job) per device, the multiplexer shares the
+pooled connection of the gateway between any number of logical unit
+clients::
+
+    units = ModbusUnitMultiplexer(ModbusConnectionPool.default(), 'gateway')
+    meter = units.unit(3)
+    meter.read_holding_registers(0, 10)      # sent with unit id 3
+
+    # or queued and scheduled, driven by one job calling poll()
+    units.unit(4).submit(WriteSingleRegisterRequest(1, 5), callback)
+    units.unit(5).schedule(10, lambda unit: unit.read_coils(0, 8))
+    while running:
+        time.sleep(units.poll() or 1)
+
+The unit clients provide the complete ModbusClientMixin interface. A
+request leases the client of the gateway from the pool (see
+ModbusConnectionPool), a poll keeps one lease for all the requests it
+sends. The queued requests of the units are drained round robin so a busy
+unit cannot starve the others, and every unit has its own round trip
+times and circuit breaker (see ModbusTransactionManager.getPolicy), so a
+dead unit fails fast without cutting off the others.
+'''
+import time
+import threading
+from collections import deque
+from pluggit.common import ModbusClientMixin
+from pluggit.constants import Defaults
+
+#---------------------------------------------------------------------------#
+# Logging
+#---------------------------------------------------------------------------#
+import logging
+_logger = logging.getLogger(__name__)
+
+
+#---------------------------------------------------------------------------#
+# Unit Client
+#---------------------------------------------------------------------------#
+class ModbusUnitClient(ModbusClientMixin):
+    '''
+    A logical client for a single unit behind a shared connection. Every
+    request executed or submitted through it is addressed to its unit id.
+    '''
+
+    def __init__(self, multiplexer, unit_id):
+        ''' Initializes a new unit client
+
+        :param multiplexer: The multiplexer owning the shared client
+        :param unit_id: The unit id of the device
+        '''
+        self.multiplexer = multiplexer
+        self.unit_id = unit_id
+        self.queue = deque()
+        self.schedules = []
+        self.last_error = None
+        self.readwrite_support = {}
+
+    def execute(self, request):
+        ''' Executes a request on the shared client right away
+
+        :param request: The request to execute
+        :returns: The result of the request execution
+        '''
+        request.unit_id = self.unit_id
+        return self.multiplexer.execute(request)
+
+    def submit(self, request, callback=None):
+        ''' Queues a request until the next poll of the multiplexer
+
+        :param request: The request to queue
+        :param callback: Called with the response (None on failure)
+        '''
+        request.unit_id = self.unit_id
+        self.queue.append((request, callback))
+
+    def schedule(self, interval, job):
+        ''' Runs a polling job for this unit every `interval` seconds
+
+        :param interval: The time between two runs in seconds
+        :param job: Called with this unit client when it is due
+        '''
+        self.schedules.append([interval, job, 0.0])
+
+    def __str__(self):
+        ''' Returns a string representation of the instance
+
+        :returns: A string representation of the instance
+        '''
+        return "ModbusUnitClient(%s:%s, %d)" % (self.multiplexer.host,
+            self.multiplexer.port, self.unit_id)
+
+
+#---------------------------------------------------------------------------#
+# Multiplexer
+#---------------------------------------------------------------------------#
+class ModbusUnitMultiplexer(object):
+    '''
+    Shares the pooled client of a gateway between the unit clients of
+    several devices (see the module documentation).
+    '''
+
+    def __init__(self, pool, host='127.0.0.1', port=Defaults.Port, **kwargs):
+        ''' Initializes a new multiplexer
+
+        :param pool: The ModbusConnectionPool to lease the client from
+        :param host: The host of the gateway
+        :param port: The port of the gateway
+        :param kwargs: Passed to the pool with every lease
+        '''
+        self.pool = pool
+        self.host = host
+        self.port = port
+        self.__kwargs = kwargs
+        self.__lock = threading.RLock()
+        self.__units = {}
+        self.__client = None   # the client leased by a running poll
+
+    def unit(self, unit_id):
+        ''' Returns the client of a unit, creating it when needed
+
+        :param unit_id: The unit id of the device
+        :returns: The ModbusUnitClient of that unit
+        '''
+        with self.__lock:
+            if unit_id not in self.__units:
+                self.__units[unit_id] = ModbusUnitClient(self, unit_id)
+            return self.__units[unit_id]
+
+    def units(self):
+        ''' Returns the clients of all the known units
+
+        :returns: A list of ModbusUnitClient, sorted by unit id
+        '''
+        with self.__lock:
+            return [self.__units[key] for key in sorted(self.__units)]
+
+    def execute(self, request):
+        ''' Executes a request on the shared client
+
+        :param request: The addressed request to execute
+        :returns: The result of the request execution
+        '''
+        with self.__lock:
+            if self.__client is not None:
+                return self.__client.execute(request)
+            with self.pool.lease(self.host, self.port, **self.__kwargs) as client:
+                return client.execute(request)
+
+    def poll(self, now=None):
+        ''' Runs the due schedules and drains the request queues
+
+        A failing unit only fails its own job or request, the error is
+        logged and kept as the last_error of the unit, and the others are
+        still served.
+
+        :param now: The current time (defaults to time.time())
+        :returns: The seconds until the next schedule is due, or None
+        '''
+        now = time.time() if now is None else now
+        with self.__lock:
+            with self.pool.lease(self.host, self.port, **self.__kwargs) as client:
+                self.__client = client
+                try:
+                    self.__poll(now)
+                finally:
+                    self.__client = None
+
+        dues = [entry[2] for unit in self.units() for entry in unit.schedules]
+        return max(0.0, min(dues) - now) if dues else None
+
+    def __poll(self, now):
+        ''' Runs the due schedules and drains the request queues with the
+        leased client
+
+        :param now: The current time
+        '''
+        units = self.units()
+        for unit in units:
+            for entry in unit.schedules:
+                interval, job, due = entry
+                if due > now: continue
+                entry[2] = now + interval
+                self.__run(unit, "Polling", job, unit)
+
+        pending = [unit for unit in units if unit.queue]
+        while pending:
+            for unit in pending:
+                request, callback = unit.queue.popleft()
+                response = self.__run(unit, "Request to", self.execute, request)
+                if callback is not None:
+                    self.__run(unit, "Callback of", callback, response)
+            pending = [unit for unit in pending if unit.queue]
+
+    def __run(self, unit, action, function, argument):
+        ''' Calls a job, request or callback of a unit, recording the
+        failure on the unit instead of raising it
+
+        :param unit: The unit the call belongs to
+        :param action: The description of the call for the log
+        :param function: The function to call
+        :param argument: The argument to call it with
+        :returns: The result of the call, None if it failed
+        '''
+        try:
+            return function(argument)
+        except Exception as ex:
+            _logger.error("%s %s failed: %s", action, unit, ex)
+            unit.last_error = ex
+            return None
+
+#---------------------------------------------------------------------------#
+# Exported symbols
+#---------------------------------------------------------------------------#
+__all__ = ['ModbusUnitMultiplexer', 'ModbusUnitClient']
@@ -304,7 +304,7 @@ class GetCommEventLogResponse(ModbusResponse):
         packet  = struct.pack('>B', 6 + len(self.events))
         packet += struct.pack('>H', ready)
         packet += struct.pack('>HH', self.event_count, self.message_count)
-        packet += b''.join(struct.pack('>B', e) for e in self.events)
+        packet += bytes(bytearray(self.events))
         return packet
 
     def decode(self, data):
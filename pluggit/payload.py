@@ -5,7 +5,8 @@ Modbus Payload Builders
 A collection of utilities for building and decoding
 modbus messages payloads.
 '''
-from struct import pack, unpack
+import re
+from struct import pack, Struct, error as StructError
 from pluggit.interfaces import IPayloadBuilder
 from pluggit.constants import Endian
 from pluggit.utilities import pack_bitstring
@@ -25,6 +26,13 @@ class BinaryPayloadBuilder(IPayloadBuilder):
         builder.add_8bit_uint(1)
         builder.add_16bit_uint(2)
         payload = builder.build()
+
+    The fields are packed straight into a single growable buffer. The
+    result can be written as a list of register values, or passed
+    through untouched as a pre-encoded payload::
+
+        client.write_registers(address, builder.to_registers())
+        client.write_registers(address, builder.to_string(), skip_encode=True)
     '''
 
     def __init__(self, payload=None, endian=Endian.Little, **kwargs):
@@ -33,15 +41,20 @@ class BinaryPayloadBuilder(IPayloadBuilder):
         :param payload: Raw payload data to initialize with
         :param endian: The endianess of the payload
         '''
-        self._payload = payload or []
         self._endian  = endian
+        self._structs = _compiled(endian)
+        self.reset()
+        if payload:
+            if isinstance(payload, list):
+                payload = b''.join(payload)
+            self._append(payload)
 
     def to_string(self):
         ''' Return the payload buffer as a string
 
         :returns: The payload buffer as a string
         '''
-        return b''.join(self._payload)
+        return bytes(self._payload[:self._size])
 
     def __str__(self):
         ''' Return the payload buffer as a string
@@ -53,7 +66,42 @@ class BinaryPayloadBuilder(IPayloadBuilder):
     def reset(self):
         ''' Reset the payload buffer
         '''
-        self._payload = []
+        self._payload = bytearray(64)
+        self._size = 0
+
+    def _reserve(self, size):
+        ''' Makes room for the next field, growing the buffer if needed
+
+        The buffer always has an even capacity and is zero filled past
+        the packed fields, so it can be read as registers at any time.
+
+        :param size: The size of the next field
+        :returns: The offset to write the field at
+        '''
+        offset = self._size
+        self._size += size
+        capacity = len(self._payload)
+        if self._size > capacity:
+            needed = max(self._size + (self._size & 1), capacity * 2)
+            self._payload.extend(bytes(needed - capacity))
+        return offset
+
+    def _append(self, data):
+        ''' Copies raw bytes into the buffer
+
+        :param data: The bytes to add to the buffer
+        '''
+        offset = self._reserve(len(data))
+        self._payload[offset:self._size] = data
+
+    def _pack(self, code, value):
+        ''' Packs a single field into the buffer
+
+        :param code: The struct format character of the field
+        :param value: The value to add to the buffer
+        '''
+        handle = self._structs[code]
+        handle.pack_into(self._payload, self._reserve(handle.size), value)
 
     def build(self):
         ''' Return the payload buffer as a list
@@ -63,10 +111,16 @@ class BinaryPayloadBuilder(IPayloadBuilder):
 
         :returns: The payload buffer as a list
         '''
-        string = self.to_string()
-        length = len(string)
-        string = string + (b'\x00' * (length % 2))
-        return [string[i:i+2] for i in range(0, length, 2)]
+        payload = self._payload
+        return [bytes(payload[i:i + 2]) for i in range(0, self._size, 2)]
+
+    def to_registers(self):
+        ''' Return the payload buffer as a list of register values
+
+        :returns: The payload as 16 bit register values
+        '''
+        count = (self._size + 1) // 2
+        return list(_struct('>%dH' % count).unpack_from(self._payload))
 
     def add_bits(self, values):
         ''' Adds a collection of bits to be encoded
@@ -77,96 +131,84 @@ class BinaryPayloadBuilder(IPayloadBuilder):
 
         :param value: The value to add to the buffer
         '''
-        value = pack_bitstring(values)
-        self._payload.append(value)
+        self._append(pack_bitstring(values))
 
     def add_8bit_uint(self, value):
         ''' Adds a 8 bit unsigned int to the buffer
 
         :param value: The value to add to the buffer
         '''
-        fstring = self._endian + 'B'
-        self._payload.append(pack(fstring, value))
+        self._pack('B', value)
 
     def add_16bit_uint(self, value):
         ''' Adds a 16 bit unsigned int to the buffer
 
         :param value: The value to add to the buffer
         '''
-        fstring = self._endian + 'H'
-        self._payload.append(pack(fstring, value))
+        self._pack('H', value)
 
     def add_32bit_uint(self, value):
         ''' Adds a 32 bit unsigned int to the buffer
 
         :param value: The value to add to the buffer
         '''
-        fstring = self._endian + 'I'
-        self._payload.append(pack(fstring, value))
+        self._pack('I', value)
 
     def add_64bit_uint(self, value):
         ''' Adds a 64 bit unsigned int to the buffer
 
         :param value: The value to add to the buffer
         '''
-        fstring = self._endian + 'Q'
-        self._payload.append(pack(fstring, value))
+        self._pack('Q', value)
 
     def add_8bit_int(self, value):
         ''' Adds a 8 bit signed int to the buffer
 
         :param value: The value to add to the buffer
         '''
-        fstring = self._endian + 'b'
-        self._payload.append(pack(fstring, value))
+        self._pack('b', value)
 
     def add_16bit_int(self, value):
         ''' Adds a 16 bit signed int to the buffer
 
         :param value: The value to add to the buffer
         '''
-        fstring = self._endian + 'h'
-        self._payload.append(pack(fstring, value))
+        self._pack('h', value)
 
     def add_32bit_int(self, value):
         ''' Adds a 32 bit signed int to the buffer
 
         :param value: The value to add to the buffer
         '''
-        fstring = self._endian + 'i'
-        self._payload.append(pack(fstring, value))
+        self._pack('i', value)
 
     def add_64bit_int(self, value):
         ''' Adds a 64 bit signed int to the buffer
 
         :param value: The value to add to the buffer
         '''
-        fstring = self._endian + 'q'
-        self._payload.append(pack(fstring, value))
+        self._pack('q', value)
 
     def add_32bit_float(self, value):
         ''' Adds a 32 bit float to the buffer
 
         :param value: The value to add to the buffer
         '''
-        fstring = self._endian + 'f'
-        self._payload.append(pack(fstring, value))
+        self._pack('f', value)
 
     def add_64bit_float(self, value):
         ''' Adds a 64 bit float(double) to the buffer
 
         :param value: The value to add to the buffer
         '''
-        fstring = self._endian + 'd'
-        self._payload.append(pack(fstring, value))
+        self._pack('d', value)
 
     def add_string(self, value):
         ''' Adds a string to the buffer
 
         :param value: The value to add to the buffer
         '''
-        fstring = self._endian + str(len(value)) + 's'
-        self._payload.append(pack(fstring, value))
+        self._append(value)
 
 
 class BinaryPayloadDecoder(object):
@@ -179,20 +221,43 @@ class BinaryPayloadDecoder(object):
         decoder = BinaryPayloadDecoder(payload)
         first   = decoder.decode_8bit_uint()
         second  = decoder.decode_16bit_uint()
+
+    All the fields of a record can also be decoded in one call with
+    a struct layout (without the byte order character)::
+
+        voltage, current, power = decoder.decode_many('HHf')
+
+    Many devices (meters in particular) put the least significant
+    register of a 32 or 64 bit value first while still sending the
+    bytes of each register in big endian order. For those the word
+    order can be given separately from the byte order::
+
+        decoder = BinaryPayloadDecoder.fromRegisters(registers,
+            endian=Endian.Big, wordorder=Endian.Little)
+
+    The decoder unpacks straight out of the payload with precompiled
+    struct objects, only fields whose words have to be swapped are
+    copied into a small scratch buffer first.
     '''
 
-    def __init__(self, payload, endian=Endian.Little):
+    def __init__(self, payload, endian=Endian.Little, wordorder=None):
         ''' Initialize a new payload decoder
 
         :param payload: The payload to decode with
         :param endian: The endianess of the payload
+        :param wordorder: The order of the registers in values larger than
+                          one register (defaults to the endianess)
         '''
         self._payload = payload
         self._pointer = 0x00
         self._endian  = endian
+        self._swap    = wordorder is not None and wordorder != endian
+        self._view    = memoryview(payload)
+        self._scratch = bytearray(8)
+        self._structs = _compiled(endian)
 
     @classmethod
-    def fromRegisters(klass, registers, endian=Endian.Little):
+    def fromRegisters(klass, registers, endian=Endian.Little, wordorder=None):
         ''' Initialize a payload decoder with the result of
         reading a collection of registers from a modbus device.
 
@@ -202,11 +267,12 @@ class BinaryPayloadDecoder(object):
 
         :param registers: The register results to initialize with
         :param endian: The endianess of the payload
+        :param wordorder: The order of the registers in larger values
         :returns: An initialized PayloadDecoder
         '''
         if isinstance(registers, list): # repack into flat binary
-            payload = b''.join(pack(endian + 'H', x) for x in registers)
-            return klass(payload, endian)
+            payload = pack('%s%dH' % (endian, len(registers)), *registers)
+            return klass(payload, endian, wordorder)
         raise ParameterException('Invalid collection of registers supplied')
 
     @classmethod
@@ -230,93 +296,115 @@ class BinaryPayloadDecoder(object):
         '''
         self._pointer = 0x00
 
+    def _swapped(self, offset, size):
+        ''' Copies a field into the scratch buffer with its words reversed
+
+        :param offset: The offset of the field in the payload
+        :param size: The size of the field in bytes
+        :returns: The scratch buffer
+        '''
+        view, scratch, end = self._view, self._scratch, offset + size
+        for index in range(0, size, 2):
+            scratch[index:index + 2] = view[end - index - 2:end - index]
+        return scratch
+
+    def _unpack(self, code):
+        ''' Decodes the next single field from the buffer
+
+        :param code: The struct format character of the field
+        :returns: The decoded value
+        '''
+        handle = self._structs.get(code)
+        if handle is None:
+            handle = self._structs[code] = _struct(self._endian + code)
+        offset = self._pointer
+        self._pointer += handle.size
+        if self._swap and handle.size > 2:
+            return handle.unpack_from(self._swapped(offset, handle.size))[0]
+        return handle.unpack_from(self._payload, offset)[0]
+
+    def decode_many(self, layout):
+        ''' Decodes a sequence of fields from the buffer
+
+        :param layout: The struct layout of the fields, i.e. 'HHif'
+        :returns: A tuple of the decoded values
+        :raises ParameterException: If the layout is not a valid struct layout
+        '''
+        try:
+            if not self._swap:
+                handle = _struct(self._endian + layout)
+                values = handle.unpack_from(self._payload, self._pointer)
+                self._pointer += handle.size
+                return values
+            values = []
+            for count, code in _fields(layout):
+                if code in 'sp':
+                    handle = _struct('%s%d%s' % (self._endian, count, code))
+                    values.extend(handle.unpack_from(self._payload, self._pointer))
+                    self._pointer += handle.size
+                elif code == 'x':
+                    self._pointer += count
+                else: values.extend(self._unpack(code) for _ in range(count))
+            return tuple(values)
+        except StructError as ex:
+            raise ParameterException("Invalid layout %s: %s" % (layout, ex))
+
     def decode_8bit_uint(self):
         ''' Decodes a 8 bit unsigned int from the buffer
         '''
-        self._pointer += 1
-        fstring = self._endian + 'B'
-        handle = self._payload[self._pointer - 1:self._pointer]
-        return unpack(fstring, handle)[0]
+        return self._unpack('B')
 
     def decode_bits(self):
         ''' Decodes a byte worth of bits from the buffer
         '''
         self._pointer += 1
-        fstring = self._endian + 'B'
         handle = self._payload[self._pointer - 1:self._pointer]
         return unpack_bitstring(handle)
 
     def decode_16bit_uint(self):
         ''' Decodes a 16 bit unsigned int from the buffer
         '''
-        self._pointer += 2
-        fstring = self._endian + 'H'
-        handle = self._payload[self._pointer - 2:self._pointer]
-        return unpack(fstring, handle)[0]
+        return self._unpack('H')
 
     def decode_32bit_uint(self):
         ''' Decodes a 32 bit unsigned int from the buffer
         '''
-        self._pointer += 4
-        fstring = self._endian + 'I'
-        handle = self._payload[self._pointer - 4:self._pointer]
-        return unpack(fstring, handle)[0]
+        return self._unpack('I')
 
     def decode_64bit_uint(self):
         ''' Decodes a 64 bit unsigned int from the buffer
         '''
-        self._pointer += 8
-        fstring = self._endian + 'Q'
-        handle = self._payload[self._pointer - 8:self._pointer]
-        return unpack(fstring, handle)[0]
+        return self._unpack('Q')
 
     def decode_8bit_int(self):
         ''' Decodes a 8 bit signed int from the buffer
         '''
-        self._pointer += 1
-        fstring = self._endian + 'b'
-        handle = self._payload[self._pointer - 1:self._pointer]
-        return unpack(fstring, handle)[0]
+        return self._unpack('b')
 
     def decode_16bit_int(self):
         ''' Decodes a 16 bit signed int from the buffer
         '''
-        self._pointer += 2
-        fstring = self._endian + 'h'
-        handle = self._payload[self._pointer - 2:self._pointer]
-        return unpack(fstring, handle)[0]
+        return self._unpack('h')
 
     def decode_32bit_int(self):
         ''' Decodes a 32 bit signed int from the buffer
         '''
-        self._pointer += 4
-        fstring = self._endian + 'i'
-        handle = self._payload[self._pointer - 4:self._pointer]
-        return unpack(fstring, handle)[0]
+        return self._unpack('i')
 
     def decode_64bit_int(self):
         ''' Decodes a 64 bit signed int from the buffer
         '''
-        self._pointer += 8
-        fstring = self._endian + 'q'
-        handle = self._payload[self._pointer - 8:self._pointer]
-        return unpack(fstring, handle)[0]
+        return self._unpack('q')
 
     def decode_32bit_float(self):
         ''' Decodes a 32 bit float from the buffer
         '''
-        self._pointer += 4
-        fstring = self._endian + 'f'
-        handle = self._payload[self._pointer - 4:self._pointer]
-        return unpack(fstring, handle)[0]
+        return self._unpack('f')
 
     def decode_64bit_float(self):
         ''' Decodes a 64 bit float(double) from the buffer
         '''
-        self._pointer += 8
-        fstring = self._endian + 'd'
-        handle = self._payload[self._pointer - 8:self._pointer]
-        return unpack(fstring, handle)[0]
+        return self._unpack('d')
 
     def decode_string(self, size=1):
         ''' Decodes a string from the buffer
@@ -326,6 +414,55 @@ class BinaryPayloadDecoder(object):
         self._pointer += size
         return self._payload[self._pointer - size:self._pointer]
 
+#---------------------------------------------------------------------------#
+# Struct Cache
+#---------------------------------------------------------------------------#
+# Compiling a format string is far more expensive than using the resulting
+# Struct, so every format is only compiled once per process.
+#---------------------------------------------------------------------------#
+_struct_cache = {}
+_field_cache = {}
+
+
+def _struct(fstring):
+    ''' Returns the (cached) compiled struct for a format string
+
+    :param fstring: The struct format string
+    :returns: The compiled struct.Struct
+    '''
+    handle = _struct_cache.get(fstring)
+    if handle is None:
+        handle = _struct_cache[fstring] = Struct(fstring)
+    return handle
+
+
+def _compiled(endian):
+    ''' Returns the single field structs of a byte order
+
+    :param endian: The byte order of the fields
+    :returns: A dictionary of format character to struct.Struct
+    '''
+    key = ('fields', endian)
+    structs = _struct_cache.get(key)
+    if structs is None:
+        structs = _struct_cache[key] = dict(
+            (code, _struct(endian + code)) for code in 'bBhHiIqQfd')
+    return structs
+
+
+def _fields(layout):
+    ''' Splits a struct layout into its (count, code) fields
+
+    :param layout: The struct layout, i.e. '2H4sf'
+    :returns: A list of (count, format character) tuples
+    '''
+    fields = _field_cache.get(layout)
+    if fields is None:
+        fields = [(int(count or 1), code) for count, code
+                  in re.findall(r'(\d*)([a-zA-Z?])', layout)]
+        _field_cache[layout] = fields
+    return fields
+
 #---------------------------------------------------------------------------#
 # Exported Identifiers
 #---------------------------------------------------------------------------#
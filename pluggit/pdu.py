@@ -50,7 +50,13 @@ class ModbusPDU(object):
        to create a complicated message. By setting this to True, the
        request will pass the currently encoded message through instead
        of encoding it again.
+
+    The frequently used messages declare `__slots__`, so they carry no
+    per instance dictionary. Subclasses that do not declare them simply
+    get one, so they can still store arbitrary attributes.
     '''
+    __slots__ = ('transaction_id', 'protocol_id', 'unit_id',
+                 'skip_encode', 'check')
 
     def __init__(self, **kwargs):
         ''' Initializes the base data for a modbus request '''
@@ -92,6 +98,7 @@ class ModbusPDU(object):
 
 class ModbusRequest(ModbusPDU):
     ''' Base class for a modbus request PDU '''
+    __slots__ = ()
 
     def __init__(self, **kwargs):
         ''' Proxy to the lower level initializer '''
@@ -103,8 +110,8 @@ class ModbusRequest(ModbusPDU):
         :param exception: The exception to return
         :raises: An exception response
         '''
-        _logger.error("Exception Response F(%d) E(%d)" %
-                (self.function_code, exception))
+        _logger.error("Exception Response F(%d) E(%d)",
+                self.function_code, exception)
         return ExceptionResponse(self.function_code, exception)
 
 
@@ -120,7 +127,16 @@ class ModbusResponse(ModbusPDU):
 
        Indicates the size of the modbus rtu response used for
        calculating how much to read.
+
+    High rate pollers can recycle responses: a decoder created with
+    `reuse=True` takes its responses from a small per class free list
+    that is refilled by calling `release` once a response is consumed::
+
+        response = client.read_holding_registers(168, 10)
+        values = list(response.registers)
+        response.release()
     '''
+    __slots__ = ()
 
     should_respond = True
 
@@ -128,6 +144,38 @@ class ModbusResponse(ModbusPDU):
         ''' Proxy to the lower level initializer '''
         ModbusPDU.__init__(self, **kwargs)
 
+    @classmethod
+    def acquire(cls):
+        ''' Returns a recycled or a new instance of this response
+
+        :returns: A freshly initialized response
+        '''
+        free = _free_lists.get(cls)
+        if free:
+            try:
+                response = free.pop()
+                response.__init__()
+                return response
+            except IndexError: pass # raced with another thread
+        return cls()
+
+    def release(self):
+        ''' Returns this response to the free list of its class
+
+        The response must not be used anymore after it was released.
+        Releasing it again while it is still on the free list does
+        nothing, so it cannot be handed out twice.
+        '''
+        free = _free_lists.setdefault(self.__class__, [])
+        if len(free) < Defaults.FreeListSize \
+                and not any(other is self for other in free):
+            free.append(self)
+
+#---------------------------------------------------------------------------#
+# The released responses by class
+#---------------------------------------------------------------------------#
+_free_lists = {}
+
 
 #---------------------------------------------------------------------------#
 # Exception PDU's
@@ -0,0 +1,225 @@
+'''
+Modbus Read Planner
+--------------------
+
+Devices with scattered register maps are expensive to poll one value at a
+time, while reading everything in one huge block wastes bus time on the
+registers in between (and fails as soon as one of them does not exist).
+The planner takes the set of (address, count) reads a poller needs and
+plans the cheapest set of block requests under a simple cost model:
+
+* every request costs a round trip (`rtt`) plus its framing overhead
+* every register read costs its two bytes on the wire (`byte_time`)
+* a request never asks for more than `max_count` registers
+* a request never bridges a gap that overlaps a forbidden range
+
+The forbidden ranges are either configured or learned: when a block that
+bridges gaps fails with IllegalAddress, the planner stops bridging those
+gaps and plans the reads of that block again::
+
+    planner = ModbusReadPlanner()
+    values = planner.read(client, [(133, 2), (135, 2), (168, 1)], unit=22)
+    values[(168, 1)]  # [8]
+
+A planner holds what it learned about one device, so keep one per device
+(or unit) around between polls.
+'''
+from pluggit.constants import Defaults
+from pluggit.pdu import ExceptionResponse
+from pluggit.pdu import ModbusExceptions as merror
+
+#---------------------------------------------------------------------------#
+# Logging
+#---------------------------------------------------------------------------#
+import logging
+_logger = logging.getLogger(__name__)
+
+
+#---------------------------------------------------------------------------#
+# Planned Blocks
+#---------------------------------------------------------------------------#
+class ModbusReadBlock(object):
+    '''
+    A single planned read request covering one or more spans of needed
+    registers and the gaps between them.
+    '''
+
+    def __init__(self, spans):
+        ''' Initializes a new block
+
+        :param spans: The sorted (start, end) spans of needed registers
+        '''
+        self.spans = spans
+        self.address = spans[0][0]
+        self.count = spans[-1][1] - self.address
+
+    def gaps(self):
+        ''' Returns the unneeded registers the block reads as well
+
+        :returns: A list of (start, end) gaps
+        '''
+        return [(end, start) for (_, end), (start, _)
+                in zip(self.spans, self.spans[1:])]
+
+    def __str__(self):
+        ''' Returns a string representation of the instance
+
+        :returns: A string representation of the instance
+        '''
+        return "ModbusReadBlock(%d, %d)" % (self.address, self.count)
+
+
+#---------------------------------------------------------------------------#
+# Planner
+#---------------------------------------------------------------------------#
+class ModbusReadPlanner(object):
+    '''
+    Plans and performs the block reads for a set of scattered reads
+    of a single device (see the module documentation).
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initializes a new planner
+
+        :param max_count: The largest block to request (default 125)
+        :param rtt: The cost of a request in seconds
+        :param byte_time: The cost of a byte on the wire in seconds
+        :param overhead: The framing bytes of a request and its response
+        :param forbidden: The (address, count) ranges that must not be read
+        '''
+        self.max_count = kwargs.get('max_count', Defaults.MaxReadCount)
+        byte_time = kwargs.get('byte_time', Defaults.PlannerByteTime)
+        overhead = kwargs.get('overhead', 20)
+        self.request_cost = kwargs.get('rtt', Defaults.PlannerRtt) + overhead * byte_time
+        self.register_cost = 2 * byte_time
+        self.forbidden = []
+        for address, count in kwargs.get('forbidden', []):
+            self.forbid(address, count)
+
+    def forbid(self, address, count=1):
+        ''' Marks a range of registers the device refuses to read
+
+        :param address: The first forbidden register
+        :param count: The number of forbidden registers
+        '''
+        self.forbidden.append((address, address + count))
+        self.forbidden.sort()
+
+    def __isForbidden(self, start, end):
+        ''' Checks if a gap overlaps any of the forbidden ranges
+
+        :param start: The first register of the gap
+        :param end: The register after the gap
+        :returns: True if the gap must not be read
+        '''
+        for low, high in self.forbidden:
+            if low < end and start < high:
+                return True
+        return False
+
+    def __spans(self, reads):
+        ''' Merges the reads into sorted spans no larger than a block
+
+        :param reads: An iterable of (address, count) reads
+        :returns: A sorted list of (start, end) spans
+        '''
+        spans = []
+        for address, count in sorted(reads):
+            if spans and address <= spans[-1][1]:
+                spans[-1][1] = max(spans[-1][1], address + count)
+            else: spans.append([address, address + count])
+        result = []
+        for start, end in spans:
+            for low in range(start, end, self.max_count):
+                result.append((low, min(end, low + self.max_count)))
+        return result
+
+    def plan(self, reads):
+        ''' Plans the cheapest blocks that cover all the reads
+
+        :param reads: An iterable of (address, count) reads
+        :returns: A list of ModbusReadBlock
+        '''
+        spans = self.__spans(reads)
+        best, choice = [0.0], [0]
+        for last in range(1, len(spans) + 1):
+            end = spans[last - 1][1]
+            best.append(None)
+            choice.append(last)
+            for first in range(last, 0, -1):
+                start = spans[first - 1][0]
+                if end - start > self.max_count:
+                    break
+                if first < last and self.__isForbidden(
+                        spans[first - 1][1], spans[first][0]):
+                    break
+                cost = best[first - 1] + self.request_cost \
+                     + (end - start) * self.register_cost
+                if best[last] is None or cost < best[last]:
+                    best[last], choice[last] = cost, first
+
+        blocks, last = [], len(spans)
+        while last > 0:
+            first = choice[last]
+            blocks.append(ModbusReadBlock(spans[first - 1:last]))
+            last = first - 1
+        blocks.reverse()
+        return blocks
+
+    def learn(self, block, response):
+        ''' Learns from the response to a planned block
+
+        The planner cannot tell which of the bridged gaps holds the
+        missing register, so it stops bridging all of them.
+
+        :param block: The block that was requested
+        :param response: The response to the block request
+        :returns: True if the block has to be planned again
+        '''
+        if not isinstance(response, ExceptionResponse): return False
+        if response.exception_code != merror.IllegalAddress: return False
+        gaps = block.gaps()
+        for start, end in gaps:
+            _logger.debug("Not bridging registers %d-%d anymore", start, end - 1)
+            self.forbid(start, end - start)
+        return len(gaps) > 0
+
+    def read(self, client, reads, method='read_holding_registers', **kwargs):
+        ''' Performs all the reads with the planned block requests
+
+        :param client: The client to read with
+        :param reads: An iterable of (address, count) reads
+        :param method: The client method to read the blocks with
+        :param unit: The slave unit the reads are targeting
+        :returns: A dictionary of (address, count) read to its values,
+                  or to None if the read failed
+        '''
+        reads, values = set(reads), {}
+        pending = self.plan(reads)
+        while pending:
+            block = pending.pop(0)
+            response = getattr(client, method)(block.address, block.count, **kwargs)
+            if self.learn(block, response):
+                pending[:0] = self.plan((start, end - start)
+                                        for start, end in block.spans)
+                continue
+            if response is None or isinstance(response, ExceptionResponse):
+                continue
+            if hasattr(response, 'registers'):
+                result = response.registers
+            else: result = response.bits
+            for offset, value in enumerate(result[:block.count]):
+                values[block.address + offset] = value
+
+        results = {}
+        for address, count in reads:
+            registers = range(address, address + count)
+            if all(register in values for register in registers):
+                results[(address, count)] = [values[r] for r in registers]
+            else: results[(address, count)] = None
+        return results
+
+#---------------------------------------------------------------------------#
+# Exported symbols
+#---------------------------------------------------------------------------#
+__all__ = ['ModbusReadPlanner', 'ModbusReadBlock']
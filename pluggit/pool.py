@@ -0,0 +1,244 @@
+'''
+Modbus Connection Pool
+-----------------------
+
+Embedded gateways often accept only one to four concurrent tcp
+connections, so everything in a process talking to the same gateway
+should share its connections. The pool hands out leases on shared
+clients keyed by (host, port, framer)::
+
+    pool = ModbusConnectionPool.default()
+    with pool.lease('192.168.0.10') as client:
+        client.read_holding_registers(1, 10)
+
+A lease gives exclusive use of a client until it is released, further
+lease requests for the same endpoint wait (up to `timeout`) while all
+of its `max_connections` clients are in use. Before a client is handed
+out its connection is checked, a connection the remote end closed (or
+that has unexpected data pending) is dropped and transparently opened
+again by the next request. Clients that stay idle for `idle_timeout`
+seconds are closed and evicted by a timer, so an unused connection does
+not stay open until the next lease.
+'''
+import time
+import socket
+import select
+import threading
+from pluggit.constants import Defaults
+from pluggit.exceptions import ConnectionException
+from pluggit.transaction import ModbusSocketFramer
+from pluggit.sync import ModbusTcpClient
+
+#---------------------------------------------------------------------------#
+# Logging
+#---------------------------------------------------------------------------#
+import logging
+_logger = logging.getLogger(__name__)
+
+
+#---------------------------------------------------------------------------#
+# Leases
+#---------------------------------------------------------------------------#
+class ModbusConnectionLease(object):
+    '''
+    The exclusive use of a pooled client, which can be used as a context
+    manager that releases the lease on exit.
+    '''
+
+    def __init__(self, pool, key, entry):
+        ''' Initializes a new lease
+
+        :param pool: The pool the client belongs to
+        :param key: The (host, port, framer) endpoint of the client
+        :param entry: The pool entry of the client
+        '''
+        self.client = entry.client
+        self.__pool = pool
+        self.__key = key
+        self.__entry = entry
+
+    def release(self):
+        ''' Returns the client to the pool, it must not be used anymore
+        '''
+        if self.__entry is not None:
+            self.__pool._release(self.__key, self.__entry)
+            self.__entry = self.client = None
+
+    def __enter__(self):
+        ''' Implement the client with enter block
+
+        :returns: The leased client
+        '''
+        return self.client
+
+    def __exit__(self, klass, value, traceback):
+        ''' Implement the client with exit block '''
+        self.release()
+
+
+class _PoolEntry(object):
+    ''' A pooled client and its bookkeeping '''
+
+    def __init__(self, client):
+        ''' Initializes a new entry
+
+        :param client: The pooled client
+        '''
+        self.client = client
+        self.leased = False
+        self.last_used = time.time()
+
+
+#---------------------------------------------------------------------------#
+# Pool
+#---------------------------------------------------------------------------#
+class ModbusConnectionPool(object):
+    '''
+    A pool of shared clients keyed by (host, port, framer) (see the module
+    documentation).
+    '''
+
+    __default = None
+    __default_lock = threading.Lock()
+
+    def __init__(self, **kwargs):
+        ''' Initializes a new connection pool
+
+        :param max_connections: The clients allowed per endpoint (default 1)
+        :param idle_timeout: The seconds before an idle client is closed
+        :param factory: The client class to create (default ModbusTcpClient)
+        '''
+        self.max_connections = kwargs.get('max_connections', Defaults.PoolMaxConnections)
+        self.idle_timeout = kwargs.get('idle_timeout', Defaults.PoolIdleTimeout)
+        self.factory = kwargs.get('factory', ModbusTcpClient)
+        self.__endpoints = {}
+        self.__condition = threading.Condition()
+        self.__timer = None
+
+    @classmethod
+    def default(klass):
+        ''' Returns the process wide pool
+
+        :returns: The shared ModbusConnectionPool
+        '''
+        with klass.__default_lock:
+            if klass.__default is None:
+                klass.__default = klass()
+            return klass.__default
+
+    def lease(self, host='127.0.0.1', port=Defaults.Port,
+              framer=ModbusSocketFramer, timeout=None, **kwargs):
+        ''' Leases a client for an endpoint, waiting while all are in use
+
+        :param host: The host to connect to
+        :param port: The port to connect to
+        :param framer: The framer of the client
+        :param timeout: The seconds to wait for a client (default forever)
+        :param kwargs: Passed to the client when one has to be created
+        :returns: A ModbusConnectionLease
+        :raises ConnectionException: If no client became available in time
+        '''
+        key = (host, port, framer)
+        deadline = None if timeout is None else time.time() + timeout
+        with self.__condition:
+            self.__evict(time.time())
+            while True:
+                entries = self.__endpoints.setdefault(key, [])
+                entry = next((e for e in entries if not e.leased), None)
+                if entry is None and len(entries) < self.max_connections:
+                    entry = _PoolEntry(self.factory(host, port, framer=framer, **kwargs))
+                    entries.append(entry)
+                if entry is not None:
+                    entry.leased = True
+                    break
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise ConnectionException("No connection available[%s:%s]" % (host, port))
+                self.__condition.wait(remaining)
+
+        self.__check(entry.client)
+        return ModbusConnectionLease(self, key, entry)
+
+    def _release(self, key, entry):
+        ''' Returns a leased client to the pool
+
+        :param key: The endpoint of the client
+        :param entry: The pool entry of the client
+        '''
+        with self.__condition:
+            entry.leased = False
+            entry.last_used = time.time()
+            self.__evict(entry.last_used)
+            self.__schedule()
+            self.__condition.notify_all()
+
+    def __schedule(self):
+        ''' Starts the timer evicting the idle clients once they expire,
+        unless it is running already or no client is idle. The lock must
+        be held.
+        '''
+        if self.__timer is not None: return
+        idle = [entry.last_used for entries in self.__endpoints.values()
+                for entry in entries if not entry.leased]
+        if not idle: return
+        delay = max(0, min(idle) + self.idle_timeout - time.time())
+        self.__timer = threading.Timer(delay, self.__expire)
+        self.__timer.daemon = True
+        self.__timer.start()
+
+    def __expire(self):
+        ''' Evicts the expired clients when the timer fires
+        '''
+        with self.__condition:
+            self.__timer = None
+            self.__evict(time.time())
+            self.__schedule()
+
+    def __check(self, client):
+        ''' Drops the connection of a client if it is not usable anymore
+
+        An idle modbus connection never has anything to read, so a
+        readable socket was either closed by the remote end or carries
+        stale data. Either way the next request reconnects.
+
+        :param client: The client to check
+        '''
+        sock = getattr(client, 'socket', None)
+        if sock is None: return
+        try:
+            readable = select.select([sock], [], [], 0)[0]
+        except (socket.error, ValueError):
+            readable = True
+        if readable:
+            _logger.debug("Dropping stale connection of %s", client)
+            client.close()
+
+    def __evict(self, now):
+        ''' Closes the clients that stayed idle for too long
+
+        :param now: The current time
+        '''
+        for key, entries in list(self.__endpoints.items()):
+            for entry in list(entries):
+                if not entry.leased and now - entry.last_used >= self.idle_timeout:
+                    _logger.debug("Evicting idle connection of %s", entry.client)
+                    entry.client.close()
+                    entries.remove(entry)
+            if not entries: del self.__endpoints[key]
+
+    def evict(self):
+        ''' Closes the clients that stayed idle for too long
+        '''
+        with self.__condition:
+            self.__evict(time.time())
+
+    def close(self):
+        ''' Closes all the clients that are not leased right now
+        '''
+        with self.__condition:
+            self.__evict(float('inf'))
+
+#---------------------------------------------------------------------------#
+# Exported symbols
+#---------------------------------------------------------------------------#
+__all__ = ['ModbusConnectionPool', 'ModbusConnectionLease']
@@ -13,6 +13,7 @@ class ReadRegistersRequestBase(ModbusRequest):
     '''
     Base class for reading a modbus register
     '''
+    __slots__ = ('address', 'count')
     _rtu_frame_size = 8
 
     def __init__(self, address, count, **kwargs):
@@ -51,6 +52,7 @@ class ReadRegistersResponseBase(ModbusResponse):
     '''
     Base class for responsing to a modbus register read
     '''
+    __slots__ = ('registers',)
 
     _rtu_byte_count_pos = 2
 
@@ -106,6 +108,7 @@ class ReadHoldingRegistersRequest(ReadRegistersRequestBase):
     Registers are addressed starting at zero. Therefore registers numbered
     1-16 are addressed as 0-15.
     '''
+    __slots__ = ()
     function_code = 3
 
     def __init__(self, address=None, count=None, **kwargs):
@@ -138,6 +141,7 @@ class ReadHoldingRegistersResponse(ReadRegistersResponseBase):
     Registers are addressed starting at zero. Therefore registers numbered
     1-16 are addressed as 0-15.
     '''
+    __slots__ = ()
     function_code = 3
 
     def __init__(self, values=None, **kwargs):
@@ -156,6 +160,7 @@ class ReadInputRegistersRequest(ReadRegistersRequestBase):
     Registers are addressed starting at zero. Therefore input registers
     numbered 1-16 are addressed as 0-15.
     '''
+    __slots__ = ()
     function_code = 4
 
     def __init__(self, address=None, count=None, **kwargs):
@@ -188,6 +193,7 @@ class ReadInputRegistersResponse(ReadRegistersResponseBase):
     Registers are addressed starting at zero. Therefore input registers
     numbered 1-16 are addressed as 0-15.
     '''
+    __slots__ = ()
     function_code = 4
 
     def __init__(self, values=None, **kwargs):
@@ -212,6 +218,8 @@ class ReadWriteMultipleRegistersRequest(ModbusRequest):
     registers, and the data to be written. The byte count specifies the
     number of bytes to follow in the write data field."
     '''
+    __slots__ = ('read_address', 'read_count', 'write_address',
+                 'write_registers', 'write_count', 'write_byte_count')
     function_code = 23
     _rtu_byte_count_pos = 10
 
@@ -298,6 +306,7 @@ class ReadWriteMultipleRegistersResponse(ModbusResponse):
     were read. The byte count field specifies the quantity of bytes to
     follow in the read data field.
     '''
+    __slots__ = ('registers',)
     function_code = 23
     _rtu_byte_count_pos = 2
 
@@ -17,6 +17,7 @@ class WriteSingleRegisterRequest(ModbusRequest):
     be written. Registers are addressed starting at zero. Therefore register
     numbered 1 is addressed as 0.
     '''
+    __slots__ = ('address', 'value')
     function_code = 6
     _rtu_frame_size = 8
 
@@ -74,6 +75,7 @@ class WriteSingleRegisterResponse(ModbusResponse):
     The normal response is an echo of the request, returned after the
     register contents have been written.
     '''
+    __slots__ = ('address', 'value')
     function_code = 6
     _rtu_frame_size = 8
 
@@ -120,7 +122,12 @@ class WriteMultipleRegistersRequest(ModbusRequest):
 
     The requested written values are specified in the request data field.
     Data is packed as two bytes per register.
+
+    With `skip_encode` the values are already encoded, either as a list
+    of two byte strings (`BinaryPayloadBuilder.build`) or as one string
+    (`BinaryPayloadBuilder.to_string`) that is passed through as is.
     '''
+    __slots__ = ('address', 'values', 'count', 'byte_count')
     function_code = 16
     _rtu_byte_count_pos = 6
 
@@ -135,7 +142,9 @@ class WriteMultipleRegistersRequest(ModbusRequest):
         self.values = values or []
         if not hasattr(values, '__iter__'):
             values = [values]
-        self.count = len(self.values)
+        if self.skip_encode and isinstance(self.values, (bytes, bytearray)):
+            self.count = (len(self.values) + 1) // 2
+        else: self.count = len(self.values)
         self.byte_count = self.count * 2
 
     def encode(self):
@@ -145,6 +154,8 @@ class WriteMultipleRegistersRequest(ModbusRequest):
         '''
         packet = struct.pack('>HHB', self.address, self.count, self.byte_count)
         if self.skip_encode:
+            if isinstance(self.values, (bytes, bytearray)):
+                return packet + self.values.ljust(self.byte_count, b'\x00')
             return packet + b''.join(self.values)
         
         for value in self.values:
@@ -193,6 +204,7 @@ class WriteMultipleRegistersResponse(ModbusResponse):
     "The normal response returns the function code, starting address, and
     quantity of registers written.
     '''
+    __slots__ = ('address', 'count')
     function_code = 16
     _rtu_frame_size = 8
 
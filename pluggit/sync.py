@@ -1,5 +1,6 @@
 import socket
 import serial
+import time
 
 from pluggit.constants import Defaults
 from pluggit.factory import ClientDecoder
@@ -9,7 +10,9 @@ from pluggit.transaction import FifoTransactionManager
 from pluggit.transaction import DictTransactionManager
 from pluggit.transaction import ModbusSocketFramer, ModbusBinaryFramer
 from pluggit.transaction import ModbusAsciiFramer, ModbusRtuFramer
+from pluggit.transaction import ModbusRequestTemplate
 from pluggit.common import ModbusClientMixin
+from pluggit.metrics import ModbusMetrics
 
 #---------------------------------------------------------------------------#
 # Logging
@@ -33,11 +36,20 @@ class BaseModbusClient(ModbusClientMixin):
         ''' Initialize a client instance
 
         :param framer: The modbus framer implementation to use
+        :param policy: The retry policy to use (see ModbusTransactionPolicy)
+        :param metrics: The metrics collector to use (see ModbusMetrics)
+        :param trace: An optional packet trace (see ModbusPacketTrace)
         '''
+        self.trace = kwargs.get('trace', None)
+        self.metrics = kwargs.get('metrics', None) or ModbusMetrics()
+        kwargs['metrics'] = self.metrics
         self.framer = framer
+        self.framer.metrics = self.metrics
+        # the units known to support read/write multiple registers (FC23)
+        self.readwrite_support = {}
         if isinstance(self.framer, ModbusSocketFramer):
-            self.transaction = DictTransactionManager(self)
-        else: self.transaction = FifoTransactionManager(self)
+            self.transaction = DictTransactionManager(self, **kwargs)
+        else: self.transaction = FifoTransactionManager(self, **kwargs)
 
     #-----------------------------------------------------------------------#
     # Client interface
@@ -70,6 +82,13 @@ class BaseModbusClient(ModbusClientMixin):
         '''
         raise NotImplementedException("Method not implemented by derived class")
 
+    def _set_timeout(self, timeout):
+        ''' Sets the timeout for the next read on the underlying descriptor
+
+        :param timeout: The timeout in seconds
+        '''
+        pass
+
     #-----------------------------------------------------------------------#
     # Modbus client methods
     #-----------------------------------------------------------------------#
@@ -78,10 +97,43 @@ class BaseModbusClient(ModbusClientMixin):
         :param request: The request to process
         :returns: The result of the request execution
         '''
+        if not self.transaction.policy.isAvailable():
+            raise ConnectionException("Device unavailable[%s]" % (self.__str__()))
         if not self.connect():
+            self.transaction.policy.recordFailure()
             raise ConnectionException("Failed to connect[%s]" % (self.__str__()))
         return self.transaction.execute(request)
 
+    def execute_many(self, requests, window=None):
+        ''' Executes several requests with a number of them in flight
+
+        The requests are pipelined if the responses can be matched by their
+        transaction id (see DictTransactionManager.executeMany), otherwise
+        they are executed one after the other.
+
+        :param requests: The requests to process
+        :param window: The requests kept in flight (default 8)
+        :returns: The list of responses, None for the failed requests
+        '''
+        if not self.transaction.policy.isAvailable():
+            raise ConnectionException("Device unavailable[%s]" % (self.__str__()))
+        if not self.connect():
+            self.transaction.policy.recordFailure()
+            raise ConnectionException("Failed to connect[%s]" % (self.__str__()))
+        if not isinstance(self.transaction, DictTransactionManager):
+            return [self.transaction.execute(request) for request in requests]
+        return self.transaction.executeMany(requests, window)
+
+    def template(self, request):
+        ''' Precompiles a request that is sent repeatedly
+
+        The result can be passed to `execute` instead of the request.
+
+        :param request: The populated request to precompile
+        :returns: The precompiled ModbusRequestTemplate
+        '''
+        return ModbusRequestTemplate(request, self.framer)
+
     #-----------------------------------------------------------------------#
     # The magic methods
     #-----------------------------------------------------------------------#
@@ -113,19 +165,24 @@ class ModbusTcpClient(BaseModbusClient):
     ''' Implementation of a modbus tcp client
     '''
 
-    def __init__(self, host='127.0.0.1', port=Defaults.Port, framer=ModbusSocketFramer):
+    def __init__(self, host='127.0.0.1', port=Defaults.Port, framer=ModbusSocketFramer, **kwargs):
         ''' Initialize a client instance
 
         :param host: The host to connect to (default 127.0.0.1)
         :param port: The modbus port to connect to (default 502)
         :param framer: The modbus framer to use (default ModbusSocketFramer)
 
+        The remaining keyword arguments configure the retry policy
+        (see ModbusTransactionPolicy), `reuse=True` lets the decoder
+        recycle released responses (see ModbusResponse.release) and
+        `compact_bits=True` keeps read bits packed (see Bitset).
+
         .. note:: The host argument will accept ipv4 and ipv6 hosts
         '''
         self.host = host
         self.port = port
         self.socket = None
-        BaseModbusClient.__init__(self, framer(ClientDecoder()))
+        BaseModbusClient.__init__(self, framer(ClientDecoder(**kwargs)), **kwargs)
 
     def connect(self):
         ''' Connect to the modbus tcp server
@@ -136,8 +193,8 @@ class ModbusTcpClient(BaseModbusClient):
         try:
             self.socket = socket.create_connection((self.host, self.port), Defaults.Timeout)
         except socket.error as msg:
-            _logger.error('Connection to (%s, %s) failed: %s' % \
-                (self.host, self.port, msg))
+            _logger.error('Connection to (%s, %s) failed: %s',
+                self.host, self.port, msg)
             self.close()
         return self.socket != None
 
@@ -170,6 +227,14 @@ class ModbusTcpClient(BaseModbusClient):
             raise ConnectionException(self.__str__())
         return self.socket.recv(size)
 
+    def _set_timeout(self, timeout):
+        ''' Sets the timeout for the next read on the underlying socket
+
+        :param timeout: The timeout in seconds
+        '''
+        if self.socket:
+            self.socket.settimeout(timeout)
+
     def __str__(self):
         ''' Builds a string representation of the connection
 
@@ -183,19 +248,30 @@ class ModbusTcpClient(BaseModbusClient):
 #---------------------------------------------------------------------------#
 class ModbusUdpClient(BaseModbusClient):
     ''' Implementation of a modbus udp client
+
+    Datagrams may be lost, duplicated or arrive late, so every request is
+    executed with its own deadline and retransmitted when it expires (see
+    DictTransactionManager.executeMany), responses are matched by their
+    transaction id and only datagrams from the server are accepted.
     '''
 
-    def __init__(self, host='127.0.0.1', port=Defaults.Port, framer=ModbusSocketFramer):
+    def __init__(self, host='127.0.0.1', port=Defaults.Port, framer=ModbusSocketFramer, **kwargs):
         ''' Initialize a client instance
 
         :param host: The host to connect to (default 127.0.0.1)
         :param port: The modbus port to connect to (default 502)
         :param framer: The modbus framer to use (default ModbusSocketFramer)
+
+        The remaining keyword arguments configure the retry policy
+        (see ModbusTransactionPolicy), `reuse=True` lets the decoder
+        recycle released responses (see ModbusResponse.release) and
+        `compact_bits=True` keeps read bits packed (see Bitset).
         '''
         self.host = host
         self.port = port
         self.socket = None
-        BaseModbusClient.__init__(self, framer(ClientDecoder()))
+        self.address = None
+        BaseModbusClient.__init__(self, framer(ClientDecoder(**kwargs)), **kwargs)
 
     @classmethod
     def _get_address_family(cls, address):
@@ -219,17 +295,28 @@ class ModbusUdpClient(BaseModbusClient):
         if self.socket: return True
         try:
             family = ModbusUdpClient._get_address_family(self.host)
+            self.address = socket.getaddrinfo(self.host, self.port,
+                family, socket.SOCK_DGRAM)[0][4]
             self.socket = socket.socket(family, socket.SOCK_DGRAM)
         except socket.error as ex:
-            _logger.error('Unable to create udp socket %s' % ex)
+            _logger.error('Unable to create udp socket %s', ex)
             self.close()
         return self.socket != None
 
     def close(self):
         ''' Closes the underlying socket connection
         '''
+        if self.socket:
+            self.socket.close()
         self.socket = None
 
+    def execute(self, request=None):
+        '''
+        :param request: The request to process
+        :returns: The result of the request execution
+        '''
+        return self.execute_many([request])[0]
+
     def _send(self, request):
         ''' Sends data on the underlying socket
 
@@ -239,7 +326,7 @@ class ModbusUdpClient(BaseModbusClient):
         if not self.socket:
             raise ConnectionException(self.__str__())
         if request:
-            return self.socket.sendto(request, (self.host, self.port))
+            return self.socket.sendto(request, self.address)
         return 0
 
     def _recv(self, size):
@@ -250,7 +337,19 @@ class ModbusUdpClient(BaseModbusClient):
         '''
         if not self.socket:
             raise ConnectionException(self.__str__())
-        return self.socket.recvfrom(size)[0]
+        while True:
+            data, address = self.socket.recvfrom(size)
+            if address[:2] == self.address[:2]:
+                return data
+            _logger.debug("Ignoring datagram from %s", address)
+
+    def _set_timeout(self, timeout):
+        ''' Sets the timeout for the next read on the underlying socket
+
+        :param timeout: The timeout in seconds
+        '''
+        if self.socket:
+            self.socket.settimeout(timeout)
 
     def __str__(self):
         ''' Builds a string representation of the connection
@@ -283,10 +382,16 @@ class ModbusSerialClient(BaseModbusClient):
         :param parity: Which kind of parity to use
         :param baudrate: The baud rate to use for the serial device
         :param timeout: The timeout between serial requests (default 3s)
+
+        The remaining keyword arguments configure the retry policy
+        (see ModbusTransactionPolicy), `reuse=True` lets the decoder
+        recycle released responses (see ModbusResponse.release) and
+        `compact_bits=True` keeps read bits packed (see Bitset).
         '''
         self.method   = method
         self.socket   = None
-        BaseModbusClient.__init__(self, self.__implementation(method))
+        framer = self.__implementation(method, **kwargs)
+        BaseModbusClient.__init__(self, framer, **kwargs)
 
         self.port     = kwargs.get('port', 0)
         self.stopbits = kwargs.get('stopbits', Defaults.Stopbits)
@@ -294,19 +399,36 @@ class ModbusSerialClient(BaseModbusClient):
         self.parity   = kwargs.get('parity',   Defaults.Parity)
         self.baudrate = kwargs.get('baudrate', Defaults.Baudrate)
         self.timeout  = kwargs.get('timeout',  Defaults.Timeout)
+        self.last_frame_end = 0.0
+        self.__calculate_timing()
+
+    def __calculate_timing(self):
+        ''' Calculates the rtu inter frame (t3.5) silent interval from the
+        serial line settings.
+
+        A character is made of a start bit, the data bits, an optional
+        parity bit and the stop bits. Above 19200 baud the specification
+        fixes the interval at 1750us.
+        '''
+        bits = 1 + self.bytesize + self.stopbits
+        if self.parity != 'N': bits += 1
+        if self.baudrate > 19200:
+            self.silent_interval = 0.00175
+        else: self.silent_interval = 3.5 * bits / self.baudrate
 
     @staticmethod
-    def __implementation(method):
+    def __implementation(method, **kwargs):
         ''' Returns the requested framer
 
         :method: The serial framer to instantiate
+        :param reuse: True to recycle released responses
         :returns: The requested serial framer
         '''
         method = method.lower()
-        if   method == 'ascii':  return ModbusAsciiFramer(ClientDecoder())
-        elif method == 'rtu':    return ModbusRtuFramer(ClientDecoder())
-        elif method == 'binary': return ModbusBinaryFramer(ClientDecoder())
-        elif method == 'socket': return ModbusSocketFramer(ClientDecoder())
+        if   method == 'ascii':  return ModbusAsciiFramer(ClientDecoder(**kwargs))
+        elif method == 'rtu':    return ModbusRtuFramer(ClientDecoder(**kwargs))
+        elif method == 'binary': return ModbusBinaryFramer(ClientDecoder(**kwargs))
+        elif method == 'socket': return ModbusSocketFramer(ClientDecoder(**kwargs))
         raise ParameterException("Invalid framer method requested")
 
     def connect(self):
@@ -340,18 +462,54 @@ class ModbusSerialClient(BaseModbusClient):
         if not self.socket:
             raise ConnectionException(self.__str__())
         if request:
+            if self.method == 'rtu':
+                self._wait_for_silence()
             return self.socket.write(request)
         return 0
 
+    def _wait_for_silence(self):
+        ''' Blocks until the line has been idle for at least t3.5 since
+        the end of the last frame, so that our request is not merged with
+        the tail of a previous frame on a multi-drop bus.
+        '''
+        delay = self.last_frame_end + self.silent_interval - time.monotonic()
+        if delay > 0: time.sleep(delay)
+
     def _recv(self, size):
-        ''' Reads data from the underlying descriptor
+        ''' Reads a single frame from the line
 
-        :param size: The number of bytes to read
+        Whatever is waiting is read right away and the framer tells how
+        long the frame is, as soon as that is known the rest of it is read
+        in one go. So the read returns when the frame is complete, only a
+        missing or truncated frame waits for the timeout.
+
+        :param size: The maximum number of bytes to read
         :return: The bytes read
         '''
         if not self.socket:
             raise ConnectionException(self.__str__())
-        return self.socket.read(size)
+        result = b''
+        while len(result) < size:
+            expected = self.framer.getFrameSize(result)
+            if expected is None:
+                wanted = max(1, self.socket.in_waiting)
+            elif len(result) < expected:
+                wanted = expected - len(result)
+            else: break
+            chunk = self.socket.read(min(wanted, size - len(result)))
+            if not chunk: break
+            result += chunk
+        self.last_frame_end = time.monotonic()
+        return result
+
+    def _set_timeout(self, timeout):
+        ''' Sets the timeout for the next read on the serial line, the
+        configured timeout is left as it is for the next connect
+
+        :param timeout: The timeout in seconds
+        '''
+        if self.socket:
+            self.socket.timeout = timeout
 
     def __str__(self):
         ''' Builds a string representation of the connection
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+import threading
+import unittest
+from pluggit.device import ModbusCountersHandler
+
+
+class ModbusCountersHandlerTest(unittest.TestCase):
+    '''
+    This is the unittest for the counters sharded per thread
+    '''
+
+    def setUp(self):
+        ''' Initializes the test environment with fresh counters '''
+        self.counters = ModbusCountersHandler()
+
+    def tearDown(self):
+        ''' Cleans up the test environment '''
+        del self.counters
+
+    def increment(self, threads, count):
+        ''' Increments BusMessage count times in each of the threads '''
+        def work():
+            for _ in range(count):
+                self.counters.increment('BusMessage')
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        for worker in workers: worker.start()
+        for worker in workers: worker.join()
+
+    def testShards(self):
+        ''' Test that the increments of all threads add up '''
+        self.increment(8, 1000)
+        self.counters.increment('BusMessage', 5)
+        self.assertEqual(8005, self.counters.BusMessage)
+        # the shards of the ended threads are retired with their counts
+        self.increment(4, 10)
+        self.assertEqual(8045, self.counters.BusMessage)
+        self.assertEqual(0, self.counters.SlaveBusy)
+
+    def testSetAndReset(self):
+        ''' Test that setting and resetting a counter affects all shards '''
+        self.increment(2, 10)
+        self.counters.BusMessage = 3
+        self.assertEqual(3, self.counters.BusMessage)
+        self.increment(2, 10)
+        self.assertEqual(23, self.counters.BusMessage)
+        self.counters.reset()
+        self.assertEqual(0, self.counters.BusMessage)
+        self.increment(1, 1)
+        self.assertEqual(1, self.counters.BusMessage)
+
+    def testSummary(self):
+        ''' Test that the summary flags the non zero counters '''
+        self.assertEqual(0x00, self.counters.summary())
+        self.counters.update({'BusMessage': 2, 'SlaveNAK': 1})
+        self.assertEqual(0x21, self.counters.summary())
+        self.assertEqual(2, dict(self.counters)['BusMessage'])
+        self.assertEqual(9, len(list(self.counters)))
+
+#---------------------------------------------------------------------------#
+# Main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+import unittest
+from pluggit.filetransfer import ModbusFileTransfer
+from pluggit.file_message import FileRecord
+from pluggit.file_message import ReadFileRecordRequest, ReadFileRecordResponse
+from pluggit.file_message import WriteFileRecordRequest, WriteFileRecordResponse
+from pluggit.exceptions import ModbusIOException, ParameterException
+from pluggit.pdu import ExceptionResponse
+from pluggit.pdu import ModbusExceptions as merror
+
+
+class Device(object):
+    '''
+    A client serving the file records from memory, every request and
+    response goes through its encoding as it would on the wire
+    '''
+
+    def __init__(self):
+        ''' Initializes the device with empty files '''
+        self.files = {}
+        self.requests = []
+        self.fail = False
+
+    def execute_many(self, requests, window=None):
+        ''' Answers the requests as a device would '''
+        return [self.execute(request) for request in requests]
+
+    def execute(self, request):
+        ''' Answers a file record request '''
+        self.requests.append(request)
+        if self.fail:
+            return ExceptionResponse(request.function_code, merror.IllegalAddress)
+        packet = request.encode()
+        assert len(packet) + 1 <= 253, "request too large"
+        decoded = type(request)()
+        decoded.decode(packet)
+        records = []
+        for record in decoded.records:
+            data = self.files.setdefault(record.file_number, bytearray(20000))
+            start = 2 * record.record_number
+            end = start + 2 * record.record_length
+            if isinstance(request, WriteFileRecordRequest):
+                data[start:end] = record.record_data
+                records.append(record)
+            else: records.append(FileRecord(record_data=bytes(data[start:end])))
+        if isinstance(request, WriteFileRecordRequest):
+            return WriteFileRecordResponse(records)
+        packet = ReadFileRecordResponse(records).encode()
+        assert len(packet) + 1 <= 253, "response too large"
+        response = ReadFileRecordResponse()
+        response.decode(packet)
+        return response
+
+
+class ModbusFileTransferTest(unittest.TestCase):
+    '''
+    This is the unittest for the bulk file record transfer
+    '''
+
+    def setUp(self):
+        ''' Initializes the test environment with an empty device '''
+        self.device = Device()
+        self.transfer = ModbusFileTransfer(self.device, unit=3)
+
+    def tearDown(self):
+        ''' Cleans up the test environment '''
+        del self.transfer
+
+    def testRoundTrip(self):
+        ''' Test that long ranges are written and read back '''
+        data = bytes(bytearray(i % 251 for i in range(2000)))
+        self.transfer.write(4, 100, data)
+        self.assertEqual(data, bytes(self.transfer.read(4, 100, 1000)))
+        self.assertEqual(data[:2], bytes(self.device.files[4][200:202]))
+        self.assertTrue(all(r.unit_id == 3 for r in self.device.requests))
+
+    def testPacking(self):
+        ''' Test that the requests are packed to the brim '''
+        self.transfer.read(1, 0, 1000)
+        # 0xf5 bytes per response leave room for 121 registers
+        self.assertEqual(9, len(self.device.requests))
+        self.device.requests = []
+        self.transfer.read_many([(1, i, 1) for i in range(0, 100, 2)])
+        # every one register sub-request takes 7 request bytes
+        self.assertEqual(2, len(self.device.requests))
+        self.assertEqual(35, len(self.device.requests[0].records))
+
+    def testManyRanges(self):
+        ''' Test that several ranges are read into their own buffers '''
+        self.transfer.write_many([(1, 0, b'\x01\x02\x03'), (2, 9998, b'\x04\x05\x06\x07')])
+        self.assertEqual([b'\x01\x02\x03\x00', b'\x04\x05\x06\x07'],
+                         [bytes(d) for d in self.transfer.read_many([(1, 0, 2), (2, 9998, 2)])])
+
+    def testInvalidRange(self):
+        ''' Test that ranges outside of a file are rejected '''
+        self.assertRaises(ParameterException, self.transfer.read, 1, 9999, 2)
+        self.assertRaises(ParameterException, self.transfer.read, 1, -1, 2)
+        self.assertEqual([], self.device.requests)
+
+    def testFailure(self):
+        ''' Test that a failed request fails the transfer '''
+        self.device.fail = True
+        self.assertRaises(ModbusIOException, self.transfer.read, 1, 0, 10)
+        self.assertRaises(ModbusIOException, self.transfer.write, 1, 0, b'\x00\x01')
+
+#---------------------------------------------------------------------------#
+# Main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+import unittest
+from pluggit.exceptions import ConnectionException
+from pluggit.identification import ModbusDeviceIdentifier
+from pluggit.mei_message import ReadDeviceInformationResponse
+
+
+class MockClient(object):
+    ''' A client answering the identification with the given response '''
+
+    def __init__(self, response):
+        self.response = response
+        self.requests = 0
+
+    def read_device_information(self, read_code, object_id, **kwargs):
+        self.requests += 1
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+    def __str__(self):
+        return "mock"
+
+
+class ModbusDeviceIdentifierTest(unittest.TestCase):
+    '''
+    This is the unittest for the device identifier
+    '''
+
+    def testIdentify(self):
+        ''' Test that a device is only identified once '''
+        response = ReadDeviceInformationResponse(information={
+            0x00: b'Pluggit', 0x01: b'AP310', 0x02: b'1.0'})
+        client, identifier = MockClient(response), ModbusDeviceIdentifier()
+        record = identifier.identify(client)
+        self.assertEqual('AP310', record['product'])
+        self.assertTrue(identifier.identify(client)['identified'])
+        self.assertEqual(1, client.requests)
+
+    def testSilentDevice(self):
+        ''' Test that a silent device is only asked again after a while '''
+        client, identifier = MockClient(None), ModbusDeviceIdentifier()
+        record = identifier.identify(client)
+        self.assertFalse(record['identified'])
+        self.assertFalse(record['answered'])
+        identifier.identify(client)
+        self.assertEqual(1, client.requests)
+        identifier.retry = 0
+        identifier.identify(client)
+        self.assertEqual(2, client.requests)
+
+    def testUnreachableDevice(self):
+        ''' Test that a connection failure counts as no answer '''
+        client = MockClient(ConnectionException("mock"))
+        identifier = ModbusDeviceIdentifier()
+        self.assertFalse(identifier.identify(client)['answered'])
+        identifier.identify(client)
+        self.assertEqual(1, client.requests)
+
+#---------------------------------------------------------------------------#
+# Main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+import socket
+import struct
+import threading
+import unittest
+from pluggit.pool import ModbusConnectionPool
+from pluggit.multiplexer import ModbusUnitMultiplexer
+from pluggit.transaction import ModbusTransactionPolicy
+from pluggit.exceptions import ConnectionException
+
+
+class ModbusUnitMultiplexerTest(unittest.TestCase):
+    '''
+    This is the unittest for the unit multiplexer behind a gateway
+    '''
+
+    def setUp(self):
+        ''' Initializes the test environment with a gateway that serves
+        unit 1 and never answers for unit 2 '''
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        thread = threading.Thread(target=self.serve)
+        thread.daemon = True
+        thread.start()
+        self.pool = ModbusConnectionPool()
+        policy = ModbusTransactionPolicy(retries=1, timeout=0.1,
+            backoff=0.001, circuit_threshold=2, circuit_reset=60)
+        self.units = ModbusUnitMultiplexer(self.pool, '127.0.0.1',
+            self.server.getsockname()[1], policy=policy)
+
+    def tearDown(self):
+        ''' Cleans up the test environment '''
+        self.pool.close()
+        self.server.close()
+
+    def serve(self):
+        ''' Accepts the connections of the clients (a client reconnects
+        after a timeout) '''
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except socket.error:
+                return
+            thread = threading.Thread(target=self.answer, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def answer(self, connection):
+        ''' Answers the read holding registers requests to unit 1 '''
+        try:
+            while True:
+                data = connection.recv(1024)
+                if not data: return
+                tid, _, _, unit, _, address, count = struct.unpack('>HHHBBHH', data[:12])
+                if unit != 1: continue
+                body = struct.pack('>BB', 3, 2 * count) + struct.pack('>%dH' % count,
+                    *range(address, address + count))
+                connection.sendall(struct.pack('>HHHB', tid, 0, len(body) + 1, unit) + body)
+        except socket.error:
+            return
+        finally:
+            connection.close()
+
+    def testDeadUnit(self):
+        ''' Test that a dead unit opens its own circuit only '''
+        healthy, dead = self.units.unit(1), self.units.unit(2)
+        for _ in range(2):
+            self.assertEqual(None, dead.read_holding_registers(0, 1))
+            self.assertEqual([0, 1], healthy.read_holding_registers(0, 2).registers)
+        self.assertRaises(ConnectionException, dead.read_holding_registers, 0, 1)
+        self.assertEqual([5], healthy.read_holding_registers(5, 1).registers)
+
+    def testPollDeadUnit(self):
+        ''' Test that a poll serves the healthy unit next to a dead one '''
+        healthy, dead = self.units.unit(1), self.units.unit(2)
+        responses = {1: [], 2: []}
+        for unit in (dead, healthy):
+            unit.schedule(10, lambda unit: responses[unit.unit_id].append(
+                unit.read_holding_registers(3, 1)))
+        for now in (0, 10, 20):
+            self.units.poll(now)
+        self.assertEqual([None, None], responses[2])
+        self.assertEqual([[3]] * 3, [response.registers for response in responses[1]])
+        self.assertTrue(isinstance(dead.last_error, ConnectionException))
+        self.assertEqual(None, healthy.last_error)
+
+#---------------------------------------------------------------------------#
+# Main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+import unittest
+from struct import pack, unpack
+from pluggit.constants import Endian
+from pluggit.exceptions import ParameterException
+from pluggit.payload import BinaryPayloadDecoder
+
+
+class BinaryPayloadDecoderTest(unittest.TestCase):
+    '''
+    This is the unittest for the payload decoder layouts and word order
+    '''
+
+    def setUp(self):
+        ''' Initializes the test environment '''
+        self.payload = pack('>?xcxHI2sf', True, b'A', 7, 0x00010002, b'ab', 1.5)
+        self.registers = list(unpack('>8H', self.payload))
+        # the same values with the registers of the 32 bit fields swapped
+        self.swapped = list(self.registers)
+        self.swapped[3:5] = self.registers[4:2:-1]
+        self.swapped[6:8] = self.registers[7:5:-1]
+
+    def decoder(self, registers, wordorder=None):
+        ''' Returns a big endian decoder of the registers '''
+        return BinaryPayloadDecoder.fromRegisters(registers,
+            endian=Endian.Big, wordorder=wordorder)
+
+    def testDecodeMany(self):
+        ''' Test decoding a layout in one call '''
+        values = self.decoder(self.registers).decode_many('?xcxHI2sf')
+        self.assertEqual((True, b'A', 7, 0x00010002, b'ab', 1.5), values)
+
+    def testDecodeManySwapped(self):
+        ''' Test decoding a layout with the words swapped '''
+        values = self.decoder(self.swapped, Endian.Little).decode_many('?xcxHI2sf')
+        self.assertEqual((True, b'A', 7, 0x00010002, b'ab', 1.5), values)
+
+    def testDecodeSwappedFields(self):
+        ''' Test decoding single fields with the words swapped '''
+        decoder = self.decoder(self.swapped, Endian.Little)
+        self.assertEqual((True, b'A'), decoder.decode_many('?xc'))
+        decoder.decode_many('x')
+        self.assertEqual(7, decoder.decode_16bit_uint())
+        self.assertEqual(0x00010002, decoder.decode_32bit_uint())
+        self.assertEqual(b'ab', decoder.decode_string(2))
+        self.assertEqual(1.5, decoder.decode_32bit_float())
+
+    def testDecodeInvalidLayout(self):
+        ''' Test that an invalid layout is rejected '''
+        for wordorder in (None, Endian.Little):
+            decoder = self.decoder(self.registers, wordorder)
+            self.assertRaises(ParameterException, decoder.decode_many, 'Hy')
+
+#---------------------------------------------------------------------------#
+# Main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
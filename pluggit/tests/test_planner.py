@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+import unittest
+from pluggit.planner import ModbusReadPlanner
+from pluggit.pdu import ExceptionResponse
+from pluggit.pdu import ModbusExceptions as merror
+from pluggit.register_read_message import ReadHoldingRegistersResponse
+
+
+class Device(object):
+    '''
+    A device answering holding register reads with the register address,
+    and with IllegalAddress for blocks containing a missing register
+    '''
+
+    def __init__(self, missing=()):
+        ''' Initializes the device with the registers it does not have '''
+        self.missing = set(missing)
+        self.requests = []
+
+    def read_holding_registers(self, address, count=1, **kwargs):
+        ''' Records and answers a read request '''
+        self.requests.append((address, count))
+        if any(r in self.missing for r in range(address, address + count)):
+            return ExceptionResponse(0x03, merror.IllegalAddress)
+        return ReadHoldingRegistersResponse(list(range(address, address + count)))
+
+
+class ModbusReadPlannerTest(unittest.TestCase):
+    '''
+    This is the unittest for the block read planner
+    '''
+
+    def setUp(self):
+        ''' Initializes the test environment with a planner where a
+        request costs as much as 10 registers '''
+        self.planner = ModbusReadPlanner(rtt=10.0, overhead=0, byte_time=0.5, max_count=20)
+
+    def tearDown(self):
+        ''' Cleans up the test environment '''
+        del self.planner
+
+    def plan(self, reads):
+        ''' Returns the planned blocks as (address, count) pairs '''
+        return [(block.address, block.count) for block in self.planner.plan(reads)]
+
+    def testBridgeSmallGaps(self):
+        ''' Test that gaps cheaper than a request are read along '''
+        self.assertEqual([(0, 12)], self.plan([(0, 2), (5, 2), (10, 2)]))
+
+    def testSplitLargeGaps(self):
+        ''' Test that gaps dearer than a request are not read '''
+        self.assertEqual([(0, 2), (40, 2)], self.plan([(0, 2), (40, 2)]))
+
+    def testMaxCount(self):
+        ''' Test that no block is larger than max_count '''
+        blocks = self.plan([(0, 2), (9, 2), (18, 4)])
+        self.assertEqual(2, len(blocks))
+        self.assertTrue(all(count <= 20 for _, count in blocks))
+        self.assertEqual([(0, 45)], [(b.address, b.count) for b in
+                                     ModbusReadPlanner(max_count=125).plan([(0, 5), (40, 5)])])
+
+    def testForbiddenGap(self):
+        ''' Test that a forbidden range is never bridged '''
+        self.planner.forbid(4)
+        self.assertEqual([(0, 2), (5, 2)], self.plan([(0, 2), (5, 2)]))
+
+    def testLearnGaps(self):
+        ''' Test that a failing block is read again without its gaps '''
+        device = Device(missing=[3])
+        values = self.planner.read(device, [(0, 2), (5, 2)])
+        self.assertEqual({(0, 2): [0, 1], (5, 2): [5, 6]}, values)
+        self.assertEqual([(0, 7), (0, 2), (5, 2)], device.requests)
+
+        device.requests = []
+        self.planner.read(device, [(0, 2), (5, 2)])
+        self.assertEqual([(0, 2), (5, 2)], device.requests)
+
+    def testFailedRead(self):
+        ''' Test that the reads of a failing register are None '''
+        device = Device(missing=[5])
+        values = self.planner.read(device, [(0, 2), (5, 2)])
+        self.assertEqual({(0, 2): [0, 1], (5, 2): None}, values)
+
+#---------------------------------------------------------------------------#
+# Main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
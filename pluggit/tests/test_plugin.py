@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+import os
+import shutil
+import tempfile
+import unittest
+import pluggit
+from pluggit import Pluggit
+
+
+class PluggitRegisterMapTest(unittest.TestCase):
+    '''
+    This is the unittest for selecting the register map of a device
+    '''
+
+    def setUp(self):
+        ''' Initializes the test environment with two register maps '''
+        self.maps = Pluggit._registerMaps
+        self.ap310 = ({'prmRamIdxUnitMode': 168}, 22)
+        self.ap310x = ({'prmRamIdxUnitMode': 1168}, None)
+        Pluggit._registerMaps = {'AP310': self.ap310, 'AP310X': self.ap310x}
+
+    def tearDown(self):
+        ''' Cleans up the test environment '''
+        Pluggit._registerMaps = self.maps
+
+    def testSelectRegisterMap(self):
+        ''' Test that the product code picks its register map '''
+        self.assertIs(self.ap310, Pluggit._selectRegisterMap('Pluggit AP310'))
+        self.assertIs(self.ap310x, Pluggit._selectRegisterMap('Pluggit AP310X'))
+
+    def testSelectUnknownRegisterMap(self):
+        ''' Test that unknown devices have no register map '''
+        self.assertEqual(None, Pluggit._selectRegisterMap('AP190'))
+        self.assertEqual(None, Pluggit._selectRegisterMap(None))
+
+    def testIdentifiedUnit(self):
+        ''' Test that the identified device selects its map and its units '''
+        class Identifier(object):
+            def __init__(self): self.units = []
+            def identify(self, client, unit=0):
+                self.units.append(unit)
+                return {'identified': True, 'product': 'Pluggit AP310X'}
+            def apply(self, client, unit, planner=None):
+                self.units.append(unit)
+
+        plugin = Pluggit(object(), {'unit': 7})
+        plugin._Pluggit = None
+        plugin._identifier = Identifier()
+        plugin._identify()
+        self.assertEqual([7, 7], plugin._identifier.units)
+        self.assertEqual(self.ap310x[0], plugin._modbusRegisterDic)
+        self.assertEqual(7, plugin._temperatureUnit)
+
+
+class PluggitIdentityCacheTest(unittest.TestCase):
+    '''
+    This is the unittest for the location of the identity cache
+    '''
+
+    def setUp(self):
+        ''' Initializes the test environment with a smarthome.py tree '''
+        self.base = tempfile.mkdtemp()
+
+    def tearDown(self):
+        ''' Cleans up the test environment '''
+        shutil.rmtree(self.base)
+
+    def testCacheDirectory(self):
+        ''' Test that the cache is kept in the cache directory '''
+        class Core(object): base_dir = self.base
+        os.makedirs(os.path.join(self.base, 'var', 'cache'))
+        plugin = Pluggit(Core(), {})
+        self.assertEqual(os.path.join(self.base, 'var', 'cache', 'pluggit_identity.json'),
+                         plugin._identifier.store.path)
+
+    def testPluginDirectory(self):
+        ''' Test that the cache is kept next to the plugin without one '''
+        class Core(object): base_dir = self.base
+        plugin = Pluggit(Core(), {})
+        self.assertEqual(os.path.join(os.path.dirname(os.path.abspath(pluggit.__file__)),
+                         'pluggit_identity.json'), plugin._identifier.store.path)
+
+#---------------------------------------------------------------------------#
+# Main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+import time
+import socket
+import threading
+import unittest
+from pluggit.pool import ModbusConnectionPool
+from pluggit.exceptions import ConnectionException
+
+
+class Client(object):
+    '''
+    A client that only records whether it was closed
+    '''
+
+    def __init__(self, host, port, **kwargs):
+        ''' Initializes the client of an endpoint '''
+        self.host, self.port, self.kwargs = host, port, kwargs
+        self.socket = None
+        self.closed = 0
+
+    def close(self):
+        ''' Records the close of the client '''
+        self.closed += 1
+        self.socket = None
+
+
+class ModbusConnectionPoolTest(unittest.TestCase):
+    '''
+    This is the unittest for the connection pool leases and eviction
+    '''
+
+    def setUp(self):
+        ''' Initializes the test environment with a pool of one client
+        per endpoint '''
+        self.pool = ModbusConnectionPool(factory=Client, idle_timeout=60)
+
+    def tearDown(self):
+        ''' Cleans up the test environment '''
+        self.pool.close()
+
+    def testShareClient(self):
+        ''' Test that the leases of an endpoint share its client '''
+        with self.pool.lease('gateway', 502, retries=2) as client:
+            self.assertEqual(('gateway', 502, 2), (client.host, client.port,
+                                                   client.kwargs['retries']))
+        with self.pool.lease('gateway', 502) as other:
+            self.assertTrue(client is other)
+        with self.pool.lease('gateway', 503) as other:
+            self.assertFalse(client is other)
+        self.assertEqual(0, client.closed)
+
+    def testLeaseTimeout(self):
+        ''' Test that a lease waits for the client at most timeout '''
+        lease = self.pool.lease('gateway', 502)
+        start = time.time()
+        self.assertRaises(ConnectionException, self.pool.lease,
+                          'gateway', 502, timeout=0.05)
+        self.assertTrue(time.time() - start >= 0.05)
+        lease.release()
+        lease.release()
+        self.pool.lease('gateway', 502, timeout=0).release()
+
+    def testLeaseWaits(self):
+        ''' Test that a released client is handed to a waiting lease '''
+        lease = self.pool.lease('gateway', 502)
+        timer = threading.Timer(0.05, lease.release)
+        timer.start()
+        with self.pool.lease('gateway', 502, timeout=5) as client:
+            self.assertEqual(0, client.closed)
+        timer.join()
+
+    def testMaxConnections(self):
+        ''' Test that an endpoint gets up to max_connections clients '''
+        pool = ModbusConnectionPool(factory=Client, max_connections=2)
+        first, second = pool.lease('gateway'), pool.lease('gateway')
+        self.assertFalse(first.client is second.client)
+        self.assertRaises(ConnectionException, pool.lease, 'gateway', timeout=0)
+        first.release(); second.release()
+        pool.close()
+
+    def testEvict(self):
+        ''' Test that only the idle clients are evicted '''
+        pool = ModbusConnectionPool(factory=Client, idle_timeout=0)
+        with pool.lease('idle') as idle: pass
+        leased = pool.lease('leased')
+        pool.evict()
+        self.assertEqual(1, idle.closed)
+        self.assertEqual(0, leased.client.closed)
+        self.assertFalse(idle is pool.lease('idle').client)
+
+    def testEvictTimer(self):
+        ''' Test that an idle client is closed without a further lease '''
+        pool = ModbusConnectionPool(factory=Client, idle_timeout=0.05)
+        with pool.lease('gateway') as client: pass
+        deadline = time.time() + 5
+        while not client.closed and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(1, client.closed)
+
+    def testStaleConnection(self):
+        ''' Test that a connection the remote end closed is dropped '''
+        with self.pool.lease('gateway') as client:
+            local, remote = socket.socketpair()
+            client.socket = local
+        with self.pool.lease('gateway') as client:
+            self.assertEqual(0, client.closed)
+            remote.close()
+        with self.pool.lease('gateway') as client:
+            self.assertEqual(1, client.closed)
+        local.close()
+
+#---------------------------------------------------------------------------#
+# Main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
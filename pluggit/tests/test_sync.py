@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+import socket
+import struct
+import threading
+import unittest
+from pluggit.sync import ModbusUdpClient
+from pluggit.register_read_message import ReadHoldingRegistersRequest
+
+
+class ModbusUdpClientTest(unittest.TestCase):
+    '''
+    This is the unittest for the pipelined requests of the udp client
+    '''
+
+    def setUp(self):
+        ''' Initializes the test environment with a server that drops the
+        first datagram of every transaction and answers the others twice '''
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.received = []
+        thread = threading.Thread(target=self.serve)
+        thread.daemon = True
+        thread.start()
+        self.client = ModbusUdpClient('127.0.0.1', self.server.getsockname()[1],
+            retries=3, timeout=0.1, backoff=0.001)
+
+    def tearDown(self):
+        ''' Cleans up the test environment '''
+        self.client.close()
+        self.server.close()
+
+    def serve(self):
+        ''' Answers the read holding registers requests to unit 1 '''
+        while True:
+            try:
+                data, address = self.server.recvfrom(1024)
+            except socket.error:
+                return
+            tid, _, _, unit, _, start, count = struct.unpack('>HHHBBHH', data[:12])
+            self.received.append(tid)
+            if unit != 1 or self.received.count(tid) == 1: continue
+            body = struct.pack('>BB', 3, 2 * count) + struct.pack('>%dH' % count,
+                *range(start, start + count))
+            response = struct.pack('>HHHB', tid, 0, len(body) + 1, unit) + body
+            self.server.sendto(response, address)
+            self.server.sendto(response, address)
+
+    def testRetransmission(self):
+        ''' Test that an unanswered request is sent again with its
+        transaction id and the late duplicates are discarded '''
+        requests = [ReadHoldingRegistersRequest(10 * i, 2, unit=1) for i in range(4)]
+        responses = self.client.execute_many(requests, window=2)
+        self.assertEqual([[10 * i, 10 * i + 1] for i in range(4)],
+                         [response.registers for response in responses])
+        self.assertEqual([request.transaction_id for request in requests],
+                         [response.transaction_id for response in responses])
+        self.assertEqual(8, len(self.received))
+        self.assertEqual(sorted(set(self.received)), sorted(r.transaction_id for r in requests))
+
+    def testUnanswered(self):
+        ''' Test that a request is given up once its retries are used up '''
+        requests = [ReadHoldingRegistersRequest(0, 1, unit=2),
+                    ReadHoldingRegistersRequest(5, 1, unit=1)]
+        responses = self.client.execute_many(requests)
+        self.assertEqual(None, responses[0])
+        self.assertEqual([5], responses[1].registers)
+        self.assertEqual(3, self.received.count(requests[0].transaction_id))
+
+#---------------------------------------------------------------------------#
+# Main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+import unittest
+from pluggit.factory import ClientDecoder
+from pluggit.register_read_message import ReadHoldingRegistersResponse
+from pluggit.transaction import ModbusRtuFramer
+
+
+class ModbusRtuFramerTest(unittest.TestCase):
+    '''
+    This is the unittest for the rtu framer
+    '''
+
+    def setUp(self):
+        ''' Initializes the test environment '''
+        self.framer = ModbusRtuFramer(ClientDecoder())
+        response = ReadHoldingRegistersResponse([1, 2, 3])
+        response.unit_id = 0x05
+        self.frame = self.framer.buildPacket(response)
+
+    def tearDown(self):
+        ''' Cleans up the test environment '''
+        del self.framer
+
+    def decode(self, data):
+        ''' Returns the responses framed from the data '''
+        results = []
+        self.framer.processIncomingPacket(data, results.append)
+        return results
+
+    def testFrames(self):
+        ''' Test that back to back frames are all decoded '''
+        results = self.decode(self.frame * 2)
+        self.assertEqual(2, len(results))
+        self.assertEqual([1, 2, 3], results[1].registers)
+
+    def testJunkWithLongByteCount(self):
+        ''' Test that junk implying an oversized frame is skipped '''
+        results = self.decode(b'\x05\x03\xff' + self.frame * 2)
+        self.assertEqual(2, len(results))
+
+    def testJunkWithShortByteCount(self):
+        ''' Test that junk implying a longer frame does not stall '''
+        results = self.decode(b'\x05\x03\x10' + self.frame)
+        self.assertEqual(1, len(results))
+
+    def testIncompleteFrame(self):
+        ''' Test that a frame split over two reads is decoded once whole '''
+        self.assertEqual([], self.decode(self.frame[:6]))
+        self.assertEqual(1, len(self.decode(self.frame[6:])))
+
+    def testFrameSize(self):
+        ''' Test that the frame size is known from the header '''
+        self.assertEqual(len(self.frame), self.framer.getFrameSize(self.frame[:4]))
+        self.assertEqual(None, self.framer.getFrameSize(self.frame[:2]))
+
+#---------------------------------------------------------------------------#
+# Main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+import unittest
+from pluggit.utilities import Bitset, pack_bitstring, unpack_bitstring
+from pluggit.bit_read_message import ReadCoilsResponse
+
+
+class BitsetTest(unittest.TestCase):
+    '''
+    This is the unittest for the bit codec and the compact Bitset
+    '''
+
+    def setUp(self):
+        ''' Initializes the test environment with 12 packed bits '''
+        self.bits = [True, False, True, False, False, False, False, False,
+                     True, True, False, True]
+        self.packed = b'\x05\x0b'
+
+    def tearDown(self):
+        ''' Cleans up the test environment '''
+        del self.bits
+
+    def testBitCodec(self):
+        ''' Test that the bit codec packs least significant bit first '''
+        self.assertEqual(self.packed, pack_bitstring(self.bits))
+        self.assertEqual(self.bits + [False] * 4, unpack_bitstring(self.packed))
+        self.assertEqual(self.packed, pack_bitstring(Bitset(self.packed, 12)))
+
+    def testGetItem(self):
+        ''' Test that a bitset reads like the list of its bits '''
+        bits = Bitset(self.packed, 12)
+        self.assertEqual(12, len(bits))
+        self.assertEqual(self.bits, bits.tolist())
+        self.assertEqual(self.bits, list(bits))
+        self.assertEqual(self.bits[-1], bits[-1])
+        self.assertEqual(self.bits[-4], bits[-4])
+        self.assertRaises(IndexError, bits.__getitem__, 12)
+        self.assertRaises(IndexError, bits.__getitem__, -13)
+
+    def testSlice(self):
+        ''' Test that slicing a bitset gives a bitset of the slice '''
+        bits = Bitset(self.packed, 12)
+        for index in (slice(0, 3), slice(2, 11), slice(1, None, 3), slice(None, None, -1)):
+            self.assertTrue(isinstance(bits[index], Bitset))
+            self.assertEqual(self.bits[index], bits[index])
+
+    def testSetItem(self):
+        ''' Test that a bitset is set like the list of its bits '''
+        bits = Bitset(self.packed, 12)
+        for index, value in ((1, True), (0, False), (-1, False), (-12, True)):
+            bits[index] = value
+            self.bits[index] = value
+        self.assertEqual(self.bits, bits)
+        self.assertRaises(IndexError, bits.__setitem__, 12, True)
+        self.assertRaises(IndexError, bits.__setitem__, -13, True)
+        self.assertRaises(TypeError, bits.__setitem__, slice(0, 2), [True, True])
+
+    def testCompactResponse(self):
+        ''' Test that a compact coil response decodes into a bitset '''
+        response = ReadCoilsResponse(compact_bits=True)
+        response.decode(b'\x02' + self.packed)
+        self.assertTrue(isinstance(response.bits, Bitset))
+        self.assertEqual(self.bits, response.bits[:12])
+        response.setBit(1)
+        self.assertEqual(b'\x02\x07\x0b', response.encode())
+
+#---------------------------------------------------------------------------#
+# Main
+#---------------------------------------------------------------------------#
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+'''
+Modbus Packet Trace
+--------------------
+
+An optional ring buffer of the last packets a client sent and received.
+Recording a packet only stores a copy of the bytes, the hex formatting is
+done when the trace is dumped, so a trace can be left enabled in
+production and dumped when something goes wrong::
+
+    client = ModbusTcpClient('127.0.0.1', trace=ModbusPacketTrace())
+    client.read_holding_registers(1, 10)
+    print(client.trace.dump())
+'''
+import time
+from collections import deque
+from pluggit.constants import Defaults
+
+
+#---------------------------------------------------------------------------#
+# Formatting helpers
+#---------------------------------------------------------------------------#
+def hexdump(data):
+    ''' Formats a packet as a list of hex bytes (0x1 0x3 ...)
+
+    This should only be called after checking that the message is going
+    to be logged (`_logger.isEnabledFor(logging.DEBUG)`).
+
+    :param data: The packet to format
+    :returns: The formatted packet
+    '''
+    return ' '.join([hex(byte) for byte in bytearray(data)])
+
+
+#---------------------------------------------------------------------------#
+# Packet Trace
+#---------------------------------------------------------------------------#
+class ModbusPacketTrace(object):
+    '''
+    Keeps the last `size` packets together with their direction ('tx' or
+    'rx'), the time they were recorded and, if known, the function code
+    and transaction id they belong to.
+    '''
+
+    def __init__(self, size=Defaults.TraceSize):
+        ''' Initializes a new packet trace
+
+        :param size: The number of packets to keep
+        '''
+        self.__entries = deque(maxlen=size)
+
+    def record(self, direction, data, function_code=None, transaction_id=None):
+        ''' Adds a packet to the trace
+
+        :param direction: 'tx' for a sent packet, 'rx' for a received one
+        :param data: The raw packet
+        :param function_code: The function code of the transaction
+        :param transaction_id: The id of the transaction
+        '''
+        self.__entries.append((time.time(), direction, bytes(data),
+                               function_code, transaction_id))
+
+    def clear(self):
+        ''' Removes all the recorded packets
+        '''
+        self.__entries.clear()
+
+    def __len__(self):
+        ''' Returns the number of recorded packets
+
+        :returns: The number of recorded packets
+        '''
+        return len(self.__entries)
+
+    def entries(self):
+        ''' Returns the recorded packets, the oldest first
+
+        :returns: A list of dictionaries describing the packets
+        '''
+        return [{
+            'time': stamp, 'direction': direction, 'data': data,
+            'function_code': code, 'transaction_id': tid,
+        } for stamp, direction, data, code, tid in self.__entries]
+
+    def dump(self):
+        ''' Formats the recorded packets, one packet per line
+
+        :returns: The formatted trace
+        '''
+        lines = []
+        for stamp, direction, data, code, tid in self.__entries:
+            lines.append("%.6f %s fc=%s tid=%s %s" % (
+                stamp, direction, code, tid, hexdump(data)))
+        return '\n'.join(lines)
+
+#---------------------------------------------------------------------------#
+# Exported symbols
+#---------------------------------------------------------------------------#
+__all__ = ['ModbusPacketTrace', 'hexdump']
@@ -2,16 +2,25 @@
 Collection of transaction based abstractions
 '''
 import sys
+import time
+import random
 import struct
 import socket
-from binascii import b2a_hex, a2b_hex
+from collections import deque
+from binascii import a2b_hex
+from base64 import b16encode
 
 from pluggit.exceptions import ModbusIOException
+from pluggit.exceptions import NotImplementedException
+from pluggit.exceptions import ConnectionException
+from pluggit.pdu import ExceptionResponse
+from pluggit.metrics import ModbusMetrics
+from pluggit.trace import hexdump
 from pluggit.constants  import Defaults
 from pluggit.interfaces import IModbusFramer
 from pluggit.utilities  import checkCRC, computeCRC
-from pluggit.utilities  import checkLRC, computeLRC
-from pluggit.compat import iterkeys, imap, byte2int
+from pluggit.utilities  import computeLRC
+from pluggit.compat import iterkeys, itervalues, imap, byte2int
 
 #---------------------------------------------------------------------------#
 # Logging
@@ -20,6 +29,108 @@ import logging
 _logger = logging.getLogger(__name__)
 
 
+#---------------------------------------------------------------------------#
+# Transaction Policy
+#---------------------------------------------------------------------------#
+class ModbusTransactionPolicy(object):
+    ''' Decides how a client retries and times out its requests
+
+    Each client owns its own policy, so a slow or dead device does not
+    affect the timing of any other device. The transaction manager derives
+    a policy per unit from it, so the same holds for the units behind a
+    gateway::
+
+        - failed attempts are retried with an exponential backoff
+          with jitter between them
+        - once enough round trips have been observed, the timeout is
+          derived from their percentile instead of the fixed default
+        - after a number of consecutive failed requests the device is
+          considered offline and requests fail fast until the reset
+          period has passed (circuit breaker)
+    '''
+
+    def __init__(self, **kwargs):
+        ''' Initializes a new instance of the policy
+
+        :param retries: The number of attempts made for a request
+        :param timeout: The timeout used until enough samples exist
+        :param backoff: The delay before the first retry
+        :param backoff_max: The upper bound for the retry delay
+        :param min_timeout: The lower bound for a derived timeout
+        :param percentile: The round trip percentile to derive from
+        :param multiplier: The factor applied to the percentile
+        :param circuit_threshold: The failures until the circuit opens
+        :param circuit_reset: The time the circuit stays open
+        '''
+        self.retries     = kwargs.get('retries', Defaults.Retries)
+        self.timeout     = kwargs.get('timeout', Defaults.Timeout)
+        self.backoff     = kwargs.get('backoff', Defaults.Backoff)
+        self.backoff_max = kwargs.get('backoff_max', Defaults.BackoffMax)
+        self.min_timeout = kwargs.get('min_timeout', Defaults.MinTimeout)
+        self.percentile  = kwargs.get('percentile', 0.95)
+        self.multiplier  = kwargs.get('multiplier', 4)
+        self.circuit_threshold = kwargs.get('circuit_threshold', Defaults.CircuitThreshold)
+        self.circuit_reset = kwargs.get('circuit_reset', Defaults.CircuitReset)
+        self.__samples   = deque(maxlen=64)
+        self.__failures  = 0
+        self.__open_until = 0.0
+
+    def copy(self):
+        ''' Returns a new policy with the settings of this one, but none
+        of its round trip samples and failures
+
+        :returns: The new ModbusTransactionPolicy
+        '''
+        names = ('retries', 'timeout', 'backoff', 'backoff_max', 'min_timeout',
+                 'percentile', 'multiplier', 'circuit_threshold', 'circuit_reset')
+        return ModbusTransactionPolicy(**dict((name, getattr(self, name)) for name in names))
+
+    def getTimeout(self):
+        ''' Returns the timeout to use for the next attempt
+
+        :returns: The timeout in seconds
+        '''
+        if len(self.__samples) < 8:
+            return self.timeout
+        samples = sorted(self.__samples)
+        index = min(len(samples) - 1, int(len(samples) * self.percentile))
+        timeout = samples[index] * self.multiplier
+        return min(self.timeout, max(self.min_timeout, timeout))
+
+    def getBackoff(self, attempt):
+        ''' Returns the delay to wait before the given retry
+
+        :param attempt: The number of attempts made so far (1 based)
+        :returns: The delay in seconds
+        '''
+        delay = min(self.backoff_max, self.backoff * (2 ** (attempt - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def isAvailable(self):
+        ''' Check if a request should be attempted at all
+
+        :returns: False while the circuit is open, True otherwise
+        '''
+        return time.monotonic() >= self.__open_until
+
+    def recordSuccess(self, rtt):
+        ''' Records a successful transaction
+
+        :param rtt: The round trip time of the transaction
+        '''
+        self.__samples.append(rtt)
+        self.__failures = 0
+        self.__open_until = 0.0
+
+    def recordFailure(self):
+        ''' Records a transaction that failed all of its attempts
+        '''
+        self.__failures += 1
+        if self.__failures >= self.circuit_threshold:
+            self.__open_until = time.monotonic() + self.circuit_reset
+            _logger.warning("Circuit opened after %d failed requests", self.__failures)
+
+
 #---------------------------------------------------------------------------#
 # The Global Transaction Manager
 #---------------------------------------------------------------------------#
@@ -43,33 +154,113 @@ class ModbusTransactionManager(object):
         ''' Initializes an instance of the ModbusTransactionManager
 
         :param client: The client socket wrapper
+        :param policy: The retry policy to use (see ModbusTransactionPolicy)
+        :param metrics: The metrics collector to record to
+        :param trace: The packet trace to record to (see ModbusPacketTrace)
         '''
         self.tid = Defaults.TransactionId
         self.client = client
+        self.policy = kwargs.get('policy', None) or ModbusTransactionPolicy(**kwargs)
+        self.metrics = kwargs.get('metrics', None) or ModbusMetrics()
+        self.trace = kwargs.get('trace', None)
+        self.__policies = {}
+
+    def getPolicy(self, unit):
+        ''' Returns the policy of a unit
+
+        The client policy guards the connection, while the round trip
+        times and the circuit breaker of every unit behind it are kept
+        apart, so a dead unit does not cut off the other units of a
+        gateway.
+
+        :param unit: The unit id of the device
+        :returns: The ModbusTransactionPolicy of the unit
+        '''
+        policy = self.__policies.get(unit)
+        if policy is None:
+            policy = self.__policies.setdefault(unit, self.policy.copy())
+        return policy
 
     def execute(self, request):
         ''' Starts the producer to send the next request to
         consumer.write(Frame(request))
+
+        Socket errors, timeouts, frames that could not be decoded and
+        frames dropped on a CRC/LRC mismatch are retried according to
+        the policy of the unit.
+
+        :returns: The response or None if all attempts failed
+        :raises ConnectionException: If the device is considered offline
         '''
-        retries = Defaults.Retries
+        policy = self.getPolicy(request.unit_id)
+        if not policy.isAvailable():
+            raise ConnectionException("Device unavailable[%s, unit %d]" % (
+                self.client, request.unit_id))
         request.transaction_id = self.getNextTID()
-        _logger.debug("Running transaction %d" % request.transaction_id)
-
-        while retries > 0:
+        debug = _logger.isEnabledFor(logging.DEBUG)
+        if debug: _logger.debug("Running transaction %d", request.transaction_id)
+
+        attempt, function_code, disconnected = 0, request.function_code, False
+        while attempt < policy.retries:
+            if attempt > 0:
+                self.metrics.recordRetry(function_code)
+                time.sleep(policy.getBackoff(attempt))
+            attempt += 1
+            start = time.monotonic()
+            disconnected = False
             try:
                 self.client.connect()
-                self.client._send(self.client.framer.buildPacket(request))
+                self.client._set_timeout(policy.getTimeout())
+                if isinstance(request, ModbusRequestTemplate):
+                    packet = request.build()
+                else: packet = self.client.framer.buildPacket(request)
+                self.client._send(packet)
+                self.metrics.recordRequest(function_code, len(packet))
+                if self.trace is not None:
+                    self.trace.record('tx', packet, function_code,
+                                      request.transaction_id)
                 # I need to fix this to read the header and the result size,
                 # as this may not read the full result set, but right now
                 # it should be fine...
                 result = self.client._recv(1024)
+                self.metrics.recordBytesIn(len(result))
+                if self.trace is not None and result:
+                    self.trace.record('rx', result, function_code,
+                                      request.transaction_id)
                 self.client.framer.processIncomingPacket(result, self.addTransaction)
-                break;
-            except socket.error as msg:
+            except socket.timeout as msg:
+                self.client.close()
+                self.metrics.recordTimeout(function_code)
+                if debug: _logger.debug("Transaction failed. (%s) ", msg)
+                continue
+            except (socket.error, ConnectionException) as msg:
+                # a reconnect that failed is a failed attempt as well
                 self.client.close()
-                _logger.debug("Transaction failed. (%s) " % msg)
-                retries -= 1
-        return self.getTransaction(request.transaction_id)
+                self.metrics.recordConnectionError(function_code)
+                if debug: _logger.debug("Transaction failed. (%s) ", msg)
+                disconnected = True
+                continue
+            except ModbusIOException as msg:
+                self.client.framer.resetFrame()
+                self.metrics.recordDecodeError(function_code)
+                if debug: _logger.debug("Transaction failed. (%s) ", msg)
+                continue
+
+            response = self.getTransaction(request.transaction_id)
+            if response is not None:
+                rtt = time.monotonic() - start
+                policy.recordSuccess(rtt)
+                self.policy.recordSuccess(rtt)
+                self.metrics.recordResponse(function_code, rtt, response)
+                return response
+            if not result:
+                self.metrics.recordTimeout(function_code)
+            if debug: _logger.debug("Transaction failed. (no valid response)")
+
+        policy.recordFailure()
+        # a lost connection fails every unit, a silent unit only itself
+        if disconnected: self.policy.recordFailure()
+        return None
 
     def addTransaction(self, request, tid=None):
         ''' Adds a transaction to the handler
@@ -126,7 +317,7 @@ class DictTransactionManager(ModbusTransactionManager):
         :param client: The client socket wrapper
         '''
         self.transactions = {}
-        super(DictTransactionManager, self).__init__(client)
+        super(DictTransactionManager, self).__init__(client, **kwargs)
 
     def __iter__(self):
         ''' Iterater over the current managed transactions
@@ -135,6 +326,139 @@ class DictTransactionManager(ModbusTransactionManager):
         '''
         return iterkeys(self.transactions)
 
+    def executeMany(self, requests, window=None):
+        ''' Executes several requests with up to `window` of them in flight
+
+        This is meant for transports where the requests are matched to
+        their responses by transaction id only (udp, pipelined tcp)::
+
+            - every request gets its own deadline from the policy of its
+              unit, an expired request is sent again with the same
+              transaction id until the policy retries are used up, the
+              requests to a unit whose circuit is open fail right away
+            - a response to a request that was already answered (the
+              late duplicate of a retransmission) or that belongs to an
+              earlier call is discarded
+            - on a stream transport a closed connection is reopened and
+              the requests in flight are sent again, if it cannot be
+              reopened they all fail
+
+        :param requests: The requests (or templates) to execute
+        :param window: The requests kept in flight at once
+        :returns: The list of responses, None for the failed requests
+        :raises ConnectionException: If the device is considered offline
+        '''
+        if not self.policy.isAvailable():
+            raise ConnectionException("Device unavailable[%s]" % self.client)
+        window = window or Defaults.MaxInFlight
+        debug = _logger.isEnabledFor(logging.DEBUG)
+        pending = deque(enumerate(requests))
+        results = [None] * len(pending)
+        inflight = {}  # tid -> [index, function code, packet, attempts, deadline, start, policy]
+        self.transactions.clear()
+        self.client.connect()
+
+        while pending or inflight:
+            while pending and len(inflight) < window:
+                index, request = pending.popleft()
+                policy = self.getPolicy(request.unit_id)
+                if not policy.isAvailable(): continue
+                request.transaction_id = self.getNextTID()
+                if isinstance(request, ModbusRequestTemplate):
+                    packet = bytes(request.build())
+                else: packet = self.client.framer.buildPacket(request)
+                entry = [index, request.function_code, packet, 0, 0.0, 0.0, policy]
+                inflight[request.transaction_id] = entry
+                self.__transmit(request.transaction_id, entry)
+
+            now = time.monotonic()
+            for tid, entry in list(inflight.items()):
+                if entry[4] > now: continue
+                if entry[3] < entry[6].retries:
+                    self.metrics.recordRetry(entry[1])
+                    self.__transmit(tid, entry)
+                    continue
+                del inflight[tid]
+                self.metrics.recordTimeout(entry[1])
+                entry[6].recordFailure()
+                if debug: _logger.debug("Transaction %d failed. (no response)", tid)
+            if not inflight: continue
+
+            deadline = min(entry[4] for entry in itervalues(inflight))
+            try:
+                self.client._set_timeout(max(0.001, deadline - time.monotonic()))
+                result = self.client._recv(1024)
+                if not result and self.__isStream():
+                    raise ConnectionException("Connection closed[%s]" % self.client)
+                self.metrics.recordBytesIn(len(result))
+                if self.trace is not None and result:
+                    self.trace.record('rx', result)
+                self.client.framer.processIncomingPacket(result, self.addTransaction)
+            except socket.timeout:
+                continue
+            except (socket.error, ConnectionException) as msg:
+                self.client.close()
+                self.client.framer.resetFrame()
+                self.metrics.recordConnectionError(None)
+                if debug: _logger.debug("Receive failed. (%s) ", msg)
+                if not self.client.connect():
+                    for entry in itervalues(inflight):
+                        entry[6].recordFailure()
+                    self.policy.recordFailure()
+                    return results
+                # the responses of the lost connection never arrive, so
+                # the requests in flight are sent again right away
+                for entry in itervalues(inflight):
+                    entry[4] = 0.0
+                continue
+            except ModbusIOException as msg:
+                self.client.framer.resetFrame()
+                self.metrics.recordDecodeError(None)
+                if debug: _logger.debug("Decode failed. (%s) ", msg)
+                continue
+
+            now = time.monotonic()
+            for tid in list(self.transactions):
+                response = self.transactions.pop(tid)
+                entry = inflight.pop(tid, None)
+                if entry is None:
+                    if debug: _logger.debug("Discarding late response %d", tid)
+                    continue
+                rtt = now - entry[5]
+                entry[6].recordSuccess(rtt)
+                self.policy.recordSuccess(rtt)
+                self.metrics.recordResponse(entry[1], rtt, response)
+                results[entry[0]] = response
+        return results
+
+    def __isStream(self):
+        ''' Check if the client talks over a stream (tcp) socket, where
+        an empty read means that the peer closed the connection
+
+        :returns: True for a stream socket, False otherwise
+        '''
+        sock = getattr(self.client, 'socket', None)
+        return getattr(sock, 'type', None) == socket.SOCK_STREAM
+
+    def __transmit(self, tid, entry):
+        ''' Sends (or resends) an in flight request and sets its deadline
+
+        :param tid: The transaction id of the request
+        :param entry: The in flight bookkeeping of the request
+        '''
+        entry[3] += 1
+        entry[5] = time.monotonic()
+        entry[4] = entry[5] + entry[6].getTimeout()
+        try:
+            self.client._send(entry[2])
+        except (socket.error, ConnectionException) as msg:
+            self.metrics.recordConnectionError(entry[1])
+            _logger.debug("Transaction %d not sent. (%s) ", tid, msg)
+            return
+        self.metrics.recordRequest(entry[1], len(entry[2]))
+        if self.trace is not None:
+            self.trace.record('tx', entry[2], entry[1], tid)
+
     def addTransaction(self, request, tid=None):
         ''' Adds a transaction to the handler
 
@@ -145,7 +469,7 @@ class DictTransactionManager(ModbusTransactionManager):
         :param tid: The overloaded transaction id to use
         '''
         tid = tid if tid != None else request.transaction_id
-        _logger.debug("adding transaction %d" % tid)
+        _logger.debug("adding transaction %d", tid)
         self.transactions[tid] = request
 
     def getTransaction(self, tid):
@@ -155,7 +479,7 @@ class DictTransactionManager(ModbusTransactionManager):
 
         :param tid: The transaction to retrieve
         '''
-        _logger.debug("getting transaction %d" % tid)
+        _logger.debug("getting transaction %d", tid)
         return self.transactions.pop(tid, None)
 
     def delTransaction(self, tid):
@@ -163,7 +487,7 @@ class DictTransactionManager(ModbusTransactionManager):
 
         :param tid: The transaction to remove
         '''
-        _logger.debug("deleting transaction %d" % tid)
+        _logger.debug("deleting transaction %d", tid)
         self.transactions.pop(tid, None)
 
 
@@ -177,7 +501,7 @@ class FifoTransactionManager(ModbusTransactionManager):
 
         :param client: The client socket wrapper
         '''
-        super(FifoTransactionManager, self).__init__(client)
+        super(FifoTransactionManager, self).__init__(client, **kwargs)
         self.transactions = []
 
     def __iter__(self):
@@ -197,7 +521,7 @@ class FifoTransactionManager(ModbusTransactionManager):
         :param tid: The overloaded transaction id to use
         '''
         tid = tid if tid != None else request.transaction_id
-        _logger.debug("adding transaction %d" % tid)
+        _logger.debug("adding transaction %d", tid)
         self.transactions.append(request)
 
     def getTransaction(self, tid):
@@ -207,7 +531,7 @@ class FifoTransactionManager(ModbusTransactionManager):
 
         :param tid: The transaction to retrieve
         '''
-        _logger.debug("getting transaction %s" % str(tid))
+        _logger.debug("getting transaction %s", tid)
         return self.transactions.pop(0) if self.transactions else None
 
     def delTransaction(self, tid):
@@ -215,10 +539,78 @@ class FifoTransactionManager(ModbusTransactionManager):
 
         :param tid: The transaction to remove
         '''
-        _logger.debug("deleting transaction %d" % tid)
+        _logger.debug("deleting transaction %d", tid)
         if self.transactions: self.transactions.pop(0)
 
 
+#---------------------------------------------------------------------------#
+# Precompiled Requests
+#---------------------------------------------------------------------------#
+class ModbusRequestTemplate(object):
+    ''' A request that is encoded once and sent many times
+
+    Polling loops usually send the very same request over and over again,
+    only the transaction id changes. A template encodes the request with
+    the framer of the client once into a preallocated buffer, and on each
+    send only patches the transaction id (socket framer) into it::
+
+        template = client.template(ReadHoldingRegistersRequest(168, 1))
+        while polling:
+            response = client.execute(template)
+
+    Changing the `unit_id` of the template patches the unit byte and, for
+    the rtu framer, recomputes only the CRC. The other serial framers
+    simply re-encode the request in that case.
+
+    .. note:: The returned buffer is reused, so it must be written out
+       before the template is built again.
+    '''
+
+    def __init__(self, request, framer):
+        ''' Initializes a new template
+
+        :param request: The populated request to precompile
+        :param framer: The framer of the client the template is sent with
+        '''
+        self.request = request
+        self.function_code = request.function_code
+        self.transaction_id = request.transaction_id
+        self.unit_id = request.unit_id
+        self.__framer = framer
+        self.__packet = bytearray(framer.buildPacket(request))
+        self.__unit_id = request.unit_id
+
+    def __updateUnit(self):
+        ''' Patches a changed unit id into the precompiled packet
+        '''
+        self.request.unit_id = self.__unit_id = self.unit_id
+        if isinstance(self.__framer, ModbusSocketFramer):
+            self.__packet[6] = self.unit_id
+        elif isinstance(self.__framer, ModbusRtuFramer):
+            self.__packet[0] = self.unit_id
+            crc = computeCRC(bytes(self.__packet[:-2]))
+            struct.pack_into('>H', self.__packet, len(self.__packet) - 2, crc)
+        else: self.__packet = bytearray(self.__framer.buildPacket(self.request))
+
+    def build(self):
+        ''' Returns the ready to send packet for the current transaction
+
+        :returns: The precompiled packet buffer
+        '''
+        if self.unit_id != self.__unit_id:
+            self.__updateUnit()
+        if isinstance(self.__framer, ModbusSocketFramer):
+            struct.pack_into('>H', self.__packet, 0, self.transaction_id)
+        return self.__packet
+
+    def __str__(self):
+        ''' Returns a string representation of the instance
+
+        :returns: A string representation of the instance
+        '''
+        return "ModbusRequestTemplate(%s)" % self.request
+
+
 #---------------------------------------------------------------------------#
 # Modbus TCP Message
 #---------------------------------------------------------------------------#
@@ -245,11 +637,13 @@ class ModbusSocketFramer(IModbusFramer):
         ''' Initializes a new instance of the framer
 
         :param decoder: The decoder factory implementation to use
+        :param metrics: The metrics collector to record errors to
         '''
         self.__buffer = b''
         self.__header = {'tid':0, 'pid':0, 'len':0, 'uid':0}
         self.__hsize  = 0x07
         self.decoder  = decoder
+        self.metrics  = kwargs.get('metrics', None)
 
     #-----------------------------------------------------------------------#
     # Private Helper Functions
@@ -282,6 +676,13 @@ class ModbusSocketFramer(IModbusFramer):
         self.__buffer = self.__buffer[length:]
         self.__header = {'tid':0, 'pid':0, 'len':0, 'uid':0}
 
+    def resetFrame(self):
+        ''' Reset the entire message frame.
+        This allows us to skip over a frame that could not be decoded.
+        '''
+        self.__buffer = b''
+        self.__header = {'tid':0, 'pid':0, 'len':0, 'uid':0}
+
     def isFrameReady(self):
         ''' Check if we should continue decode logic
         This is meant to be used in a while loop in the decoding phase to let
@@ -306,6 +707,15 @@ class ModbusSocketFramer(IModbusFramer):
         length = self.__hsize + self.__header['len'] - 1
         return self.__buffer[self.__hsize:length]
 
+    def getFrameSize(self, data):
+        ''' Find out how long the first frame in received data is
+
+        :param data: The data received so far
+        :returns: The size of the first frame, or None if more is needed
+        '''
+        if len(data) < 6: return None
+        return 6 + struct.unpack('>H', data[4:6])[0]
+
     def populateResult(self, result):
         '''
         Populates the modbus result with the transport specific header
@@ -335,7 +745,8 @@ class ModbusSocketFramer(IModbusFramer):
         :param data: The new packet data
         :param callback: The function to send results to
         '''
-        _logger.debug(' '.join([hex(byte2int(x)) for x in data]))
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug("Received %s", hexdump(data))
         self.addToFrame(data)
         while self.isFrameReady():
             if self.checkFrame():
@@ -373,36 +784,25 @@ class ModbusRtuFramer(IModbusFramer):
           3.5 chars     1b         1b               Nb      2b      3.5 chars
 
     Wait refers to the amount of time required to transmist at least x many
-    characters.  In this case it is 3.5 characters.  Also, if we recieve a
-    wait of 1.5 characters at any point, we must trigger an error message.
-    Also, it appears as though this message is little endian. The logic is
-    simplified as the following::
-
-        block-on-read:
-            read until 3.5 delay
-            check for errors
-            decode
-
-    The following table is a listing of the baud wait times for the specified
-    baud rates::
-
-        ------------------------------------------------------------------
-         Baud  1.5c (18 bits)   3.5c (38 bits)
-        ------------------------------------------------------------------
-         1200   13333.3 us       31666.7 us
-         4800    3333.3 us        7916.7 us
-         9600    1666.7 us        3958.3 us
-        19200     833.3 us        1979.2 us
-        38400     416.7 us         989.6 us
-        ------------------------------------------------------------------
-        1 Byte = start + 8 bits + parity + stop = 11 bits
-        (1/Baud)(bits) = delay seconds
+    characters, 3.5 characters between two frames. The CRC is sent little
+    endian.
+
+    Frames are not delimited by timing on receive: measuring character
+    gaps from user space is unreliable, so that was dropped. Instead the
+    framer tells the serial client from the header how long a frame is
+    (see `getFrameSize`) and the client reads exactly that much. The only
+    timing left is on send, where the serial client waits until the line
+    has been silent for t3.5 (computed from the line settings, fixed at
+    1750us above 19200 baud) since the last frame. If a frame fails its
+    CRC check, the framer slides over the buffer looking for the next
+    valid frame instead of dropping everything it has received.
     '''
 
     def __init__(self, decoder, **kwargs):
         ''' Initializes a new instance of the framer
 
         :param decoder: The decoder factory implementation to use
+        :param metrics: The metrics collector to record errors to
         '''
         self.__buffer = b''
         self.__header = {}
@@ -410,6 +810,7 @@ class ModbusRtuFramer(IModbusFramer):
         self.__end    = b'\x0d\x0a'
         self.__min_frame_size = 4
         self.decoder  = decoder
+        self.metrics  = kwargs.get('metrics', None)
 
     #-----------------------------------------------------------------------#
     # Private Helper Functions
@@ -421,14 +822,74 @@ class ModbusRtuFramer(IModbusFramer):
         '''
         try:
             self.populateHeader()
-            frame_size = self.__header['len']
-            data = self.__buffer[:frame_size - 2]
-            crc = self.__buffer[frame_size - 2:frame_size]
-            crc_val = (byte2int(crc[0]) << 8) + byte2int(crc[1])
-            return checkCRC(data, crc_val)
+            return self.__probeFrame(0) is True
         except (IndexError, KeyError):
             return False
 
+    def isFrameIncomplete(self):
+        ''' Check if the current frame could still become valid
+
+        A frame that is not complete yet is given up on if a complete
+        frame already follows it in the buffer, it was junk then.
+
+        :returns: True if more data is needed to check the frame
+        '''
+        if self.__probeFrame(0) is not None:
+            return False
+        return not any(self.__probeFrame(offset) is True
+                       for offset in range(1, len(self.__buffer)))
+
+    def __probeFrame(self, offset):
+        ''' Checks if a frame starts at the given buffer offset
+
+        :param offset: The offset into the buffer to check
+        :returns: True if a valid frame starts at offset, None if a
+                  plausible frame starts there but is not complete yet,
+                  and False otherwise
+        '''
+        buffer = self.__buffer[offset:]
+        if len(buffer) < self.__min_frame_size:
+            return None
+        func_code = byte2int(buffer[1])
+        pdu_class = self.decoder.lookupPduClass(func_code)
+        if pdu_class is ExceptionResponse and not func_code & 0x80:
+            return False
+        try:
+            size = pdu_class.calculateRtuFrameSize(buffer)
+        except (IndexError, struct.error):
+            return None
+        if not self.__min_frame_size <= size <= 256:
+            return False
+        if len(buffer) < size:
+            return None
+        crc = (byte2int(buffer[size - 2]) << 8) + byte2int(buffer[size - 1])
+        return checkCRC(buffer[:size - 2], crc)
+
+    def resyncFrame(self):
+        ''' Resynchronize the buffer after a bad frame
+
+        Instead of throwing away the whole buffer, we slide a window
+        over it looking for the next offset at which a frame with a
+        valid CRC starts, and drop everything before it. If there is
+        none, we keep the first plausible frame that is still being
+        received.
+        '''
+        pending = None
+        for offset in range(1, len(self.__buffer)):
+            state = self.__probeFrame(offset)
+            if state is True:
+                break
+            if state is None and pending is None:
+                pending = offset
+        else: offset = pending
+
+        if offset is None:
+            self.resetFrame()
+            return
+        _logger.debug("Resynchronized rtu frame, dropped %d bytes", offset)
+        self.__buffer = self.__buffer[offset:]
+        self.__header = {}
+
     def advanceFrame(self):
         ''' Skip over the current framed message
         This allows us to skip over the current message after we have processed
@@ -440,11 +901,8 @@ class ModbusRtuFramer(IModbusFramer):
 
     def resetFrame(self):
         ''' Reset the entire message frame.
-        This allows us to skip ovver errors that may be in the stream.
-        It is hard to know if we are simply out of sync or if there is
-        an error in the stream as we have no way to check the start or
-        end of the message (python just doesn't have the resolution to
-        check for millisecond delays).
+        This is the last resort of `resyncFrame` when no plausible
+        frame start can be found anywhere in the buffer.
         '''
         self.__buffer = b''
         self.__header = {}
@@ -495,6 +953,28 @@ class ModbusRtuFramer(IModbusFramer):
         if end > 0: return buffer
         return ''
 
+    def getFrameSize(self, data):
+        ''' Find out how long the first frame in received data is
+
+        Data that cannot start a frame is complete as it is, the framer
+        resynchronizes on it.
+
+        :param data: The data received so far
+        :returns: The size of the first frame, or None if more is needed
+        '''
+        if len(data) < self.__min_frame_size: return None
+        func_code = byte2int(data[1])
+        pdu_class = self.decoder.lookupPduClass(func_code)
+        if pdu_class is ExceptionResponse and not func_code & 0x80:
+            return len(data)
+        try:
+            size = pdu_class.calculateRtuFrameSize(data)
+        except (IndexError, struct.error):
+            return None
+        if not self.__min_frame_size <= size <= 256:
+            return len(data)
+        return size
+
     def populateResult(self, result):
         ''' Populates the modbus result header
 
@@ -532,7 +1012,11 @@ class ModbusRtuFramer(IModbusFramer):
                 self.populateResult(result)
                 self.advanceFrame()
                 callback(result)  # defer or push to a thread?
-            else: self.resetFrame() # clear possible errors
+            elif self.isFrameIncomplete(): break
+            else:
+                if self.metrics is not None:
+                    self.metrics.recordChecksumError()
+                self.resyncFrame() # skip over possible errors
 
     def buildPacket(self, message):
         ''' Creates a ready to send modbus packet
@@ -570,13 +1054,16 @@ class ModbusAsciiFramer(IModbusFramer):
         ''' Initializes a new instance of the framer
 
         :param decoder: The decoder implementation to use
+        :param metrics: The metrics collector to record errors to
         '''
         self.__buffer = b''
         self.__header = {'lrc':'0000', 'len':0, 'uid':0x00}
         self.__hsize  = 0x02
+        self.__frame  = b''
         self.__start  = b':'
         self.__end    = b"\r\n"
         self.decoder  = decoder
+        self.metrics  = kwargs.get('metrics', None)
 
     #-----------------------------------------------------------------------#
     # Private Helper Functions
@@ -584,22 +1071,41 @@ class ModbusAsciiFramer(IModbusFramer):
     def checkFrame(self):
         ''' Check and decode the next frame
 
+        The frame is hex decoded only once here, getFrame hands out the
+        cached binary frame. Frames that fail to decode or to check are
+        dropped, so they cannot block the frames behind them.
+
         :returns: True if we successful, False otherwise
         '''
-        start = self.__buffer.find(self.__start)
-        if start == -1: return False
-        if start > 0 :  # go ahead and skip old bad data
-            self.__buffer = self.__buffer[start:]
-            start = 0
-
-        end = self.__buffer.find(self.__end)
-        if (end != -1):
-            self.__header['len'] = end
-            self.__header['uid'] = int(self.__buffer[1:3], 16)
-            self.__header['lrc'] = int(self.__buffer[end - 2:end], 16)
-            data = a2b_hex(self.__buffer[start + 1:end - 2])
-            return checkLRC(data, self.__header['lrc'])
-        return False
+        while True:
+            start = self.__buffer.find(self.__start)
+            if start == -1:  # nothing here can become a frame
+                self.__buffer = b''
+                return False
+            end = self.__buffer.find(self.__end, start)
+            if end == -1:
+                if start > 0: self.__buffer = self.__buffer[start:]
+                return False
+            # a later start restarts the frame, skip the old bad data
+            start = self.__buffer.rfind(self.__start, start, end)
+            if start > 0:
+                self.__buffer = self.__buffer[start:]
+                end -= start
+
+            try:
+                frame = a2b_hex(self.__buffer[1:end])
+            except (TypeError, ValueError):
+                frame = b''
+            # the lrc makes the sum over the whole frame zero
+            if len(frame) > 2 and sum(frame) & 0xff == 0:
+                self.__frame = frame
+                self.__header['len'] = end
+                self.__header['uid'] = frame[0]
+                self.__header['lrc'] = frame[-1]
+                return True
+            if self.metrics is not None:
+                self.metrics.recordChecksumError()
+            self.__buffer = self.__buffer[end + 2:]
 
     def advanceFrame(self):
         ''' Skip over the current framed message
@@ -609,6 +1115,15 @@ class ModbusAsciiFramer(IModbusFramer):
         '''
         self.__buffer = self.__buffer[self.__header['len'] + 2:]
         self.__header = {'lrc':'0000', 'len':0, 'uid':0x00}
+        self.__frame  = b''
+
+    def resetFrame(self):
+        ''' Reset the entire message frame.
+        This allows us to skip over a frame that could not be decoded.
+        '''
+        self.__buffer = b''
+        self.__header = {'lrc':'0000', 'len':0, 'uid':0x00}
+        self.__frame  = b''
 
     def isFrameReady(self):
         ''' Check if we should continue decode logic
@@ -633,11 +1148,19 @@ class ModbusAsciiFramer(IModbusFramer):
 
         :returns: The frame data or ''
         '''
-        start  = self.__hsize + 1
-        end    = self.__header['len'] - 2
-        data   = self.__buffer[start:end]
-        if end > 0: return a2b_hex(data)
-        return b''
+        return self.__frame[1:-1]
+
+    def getFrameSize(self, data):
+        ''' Find out how long the first frame in received data is
+
+        :param data: The data received so far
+        :returns: The size of the first frame, or None if more is needed
+        '''
+        start = data.find(self.__start)
+        if start == -1: return None
+        end = data.find(self.__end, start)
+        if end == -1: return None
+        return end + len(self.__end)
 
     def populateResult(self, result):
         ''' Populates the modbus result header
@@ -685,18 +1208,10 @@ class ModbusAsciiFramer(IModbusFramer):
         :param message: The request/response to send
         :return: The encoded packet
         '''
-        encoded  = message.encode()
-        data     = struct.pack('>BB', message.unit_id, message.function_code)
-        checksum = computeLRC(encoded + data)
-
-        packet = bytearray()
-        params = (message.unit_id, message.function_code)
-        packet.extend(self.__start)
-        packet.extend(('%02x%02x' % params).encode())
-        packet.extend(b2a_hex(encoded))
-        packet.extend(('%02x' % checksum).encode())
-        packet.extend(self.__end)
-        return bytes(packet).upper()
+        frame = struct.pack('>BB', message.unit_id, message.function_code) \
+              + message.encode()
+        checksum = b'%02X' % computeLRC(frame)
+        return b''.join((self.__start, b16encode(frame), checksum, self.__end))
 
 
 #---------------------------------------------------------------------------#
@@ -722,7 +1237,8 @@ class ModbusBinaryFramer(IModbusFramer):
     the { or } characters.  If we encounter these characters, we
     simply duplicate them.  Hopefully we will not encounter those
     characters that often and will save a little bit of bandwitch
-    without a real-time system.
+    without a real-time system. So the end of a frame is the last brace
+    of an odd run of } characters, the pairs before it are escapes.
 
     Protocol defined by jamod.sourceforge.net.
     '''
@@ -731,36 +1247,90 @@ class ModbusBinaryFramer(IModbusFramer):
         ''' Initializes a new instance of the framer
 
         :param decoder: The decoder implementation to use
+        :param metrics: The metrics collector to record errors to
         '''
         self.__buffer = b''
         self.__header = {'crc':0x0000, 'len':0, 'uid':0x00}
         self.__hsize  = 0x02
+        self.__scan   = 1
+        self.__frame  = b''
         self.__start  = b'\x7b'  # {
         self.__end    = b'\x7d'  # }
-        self.__repeat = [b'}'[0], b'{'[0]] # python3 hack
         self.decoder  = decoder
+        self.metrics  = kwargs.get('metrics', None)
 
     #-----------------------------------------------------------------------#
     # Private Helper Functions
     #-----------------------------------------------------------------------#
+    def __findEnd(self, buffer, pos):
+        ''' Scan a buffer for the end of the frame it starts with
+
+        :param buffer: The buffer starting with a frame start
+        :param pos: The offset to resume the scan at
+        :returns: The (end, final, pos) of the frame, end is -1 if it was
+                  not found, final is False while the run of } the end was
+                  found in may still grow, and pos is where to resume
+        '''
+        while True:
+            pos = buffer.find(self.__end, pos)
+            if pos == -1:
+                return -1, False, len(buffer)
+            run = pos + 1
+            while buffer[run:run + 1] == self.__end:
+                run += 1
+            if (run - pos) % 2:
+                return run - 1, run < len(buffer), pos
+            if run == len(buffer):
+                return -1, False, pos
+            pos = run
+
+    def __decodeFrame(self, frame):
+        ''' Unescape a frame and check its crc
+
+        :param frame: The escaped frame without the start and end
+        :returns: The unescaped frame, or None if it is not valid
+        '''
+        if self.__start in frame or self.__end in frame:
+            frame = frame.replace(b'{{', b'{').replace(b'}}', b'}')
+        if len(frame) < 4: return None
+        crc = struct.unpack('>H', frame[-2:])[0]
+        if checkCRC(frame[:-2], crc): return frame
+        return None
+
     def checkFrame(self):
         ''' Check and decode the next frame
 
+        The frame is unescaped only once here, getFrame hands out the
+        cached frame. Frames that fail the crc check are dropped. The
+        scan for the end resumes where the previous one stopped, so a
+        frame that arrives in pieces is only scanned once.
+
         :returns: True if we are successful, False otherwise
         '''
-        start = self.__buffer.find(self.__start)
-        if start == -1: return False
-        if start > 0 :  # go ahead and skip old bad data
-            self.__buffer = self.__buffer[start:]
-
-        end = self.__buffer.find(self.__end)
-        if (end != -1):
-            self.__header['len'] = end
-            self.__header['uid'] = struct.unpack('>B', self.__buffer[1:2])
-            self.__header['crc'] = struct.unpack('>H', self.__buffer[end - 2:end])[0]
-            data = self.__buffer[start + 1:end - 2]
-            return checkCRC(data, self.__header['crc'])
-        return False
+        while True:
+            if not self.__buffer.startswith(self.__start):
+                start = self.__buffer.find(self.__start)
+                if start == -1:  # nothing here can become a frame
+                    self.__buffer = b''
+                    return False
+                self.__buffer = self.__buffer[start:]
+                self.__scan = 1
+
+            end, final, self.__scan = self.__findEnd(self.__buffer, self.__scan)
+            if end == -1: return False
+            frame = self.__decodeFrame(self.__buffer[1:end])
+            if frame is not None:
+                self.__frame = frame
+                self.__header['len'] = end
+                self.__header['uid'] = byte2int(frame[0])
+                self.__header['crc'] = struct.unpack('>H', frame[-2:])[0]
+                return True
+            # a run of } at the end of the buffer may still be an escape
+            if not final: return False
+            if self.metrics is not None:
+                self.metrics.recordChecksumError()
+            self.__buffer = self.__buffer[end + 1:]
+            self.__scan = 1
 
     def advanceFrame(self):
         ''' Skip over the current framed message
@@ -768,8 +1338,19 @@ class ModbusBinaryFramer(IModbusFramer):
         it or determined that it contains an error. It also has to reset the
         current frame header handle
         '''
-        self.__buffer = self.__buffer[self.__header['len'] + 2:]
+        self.__buffer = self.__buffer[self.__header['len'] + 1:]
         self.__header = {'crc':0x0000, 'len':0, 'uid':0x00}
+        self.__frame  = b''
+        self.__scan   = 1
+
+    def resetFrame(self):
+        ''' Reset the entire message frame.
+        This allows us to skip over a frame that could not be decoded.
+        '''
+        self.__buffer = b''
+        self.__header = {'crc':0x0000, 'len':0, 'uid':0x00}
+        self.__frame  = b''
+        self.__scan   = 1
 
     def isFrameReady(self):
         ''' Check if we should continue decode logic
@@ -794,11 +1375,21 @@ class ModbusBinaryFramer(IModbusFramer):
 
         :returns: The frame data or ''
         '''
-        start  = self.__hsize + 1
-        end    = self.__header['len'] - 2
-        buffer = self.__buffer[start:end]
-        if end > 0: return buffer
-        return b''
+        return self.__frame[1:-2]
+
+    def getFrameSize(self, data):
+        ''' Find out how long the first frame in received data is
+
+        :param data: The data received so far
+        :returns: The size of the first frame, or None if more is needed
+        '''
+        start = data.find(self.__start)
+        if start == -1: return None
+        end, final, _ = self.__findEnd(data, start + 1)
+        if end == -1: return None
+        if final or self.__decodeFrame(data[start + 1:end]) is not None:
+            return end + 1
+        return None
 
     def populateResult(self, result):
         ''' Populates the modbus result header
@@ -845,13 +1436,10 @@ class ModbusBinaryFramer(IModbusFramer):
         :param message: The request/response to send
         :returns: The encoded packet
         '''
-        data = self._preflight(message.encode())
-        packet = struct.pack('>BB',
-            message.unit_id,
-            message.function_code) + data
-        packet += struct.pack(">H", computeCRC(packet))
-        packet  = self.__start + packet + self.__end
-        return packet
+        frame  = struct.pack('>BB', message.unit_id, message.function_code)
+        frame += message.encode()
+        frame += struct.pack('>H', computeCRC(frame))
+        return self.__start + self._preflight(frame) + self.__end
 
     def _preflight(self, data):
         ''' Preflight buffer test
@@ -862,17 +1450,15 @@ class ModbusBinaryFramer(IModbusFramer):
         :param data: The message to escape
         :returns: the escaped packet
         '''
-        array = bytearray()
-        for d in data:
-            if d in self.__repeat:
-                array.append(d)
-            array.append(d)
-        return bytes(array)
+        if self.__start in data or self.__end in data:
+            return data.replace(b'{', b'{{').replace(b'}', b'}}')
+        return data
 
 #---------------------------------------------------------------------------#
 # Exported symbols
 #---------------------------------------------------------------------------#
 __all__ = [
+    "ModbusTransactionPolicy", "ModbusRequestTemplate",
     "FifoTransactionManager",
     "DictTransactionManager",
     "ModbusSocketFramer", "ModbusRtuFramer",
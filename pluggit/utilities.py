@@ -5,7 +5,8 @@ Modbus Utilities
 A collection of utilities for packing data, unpacking
 data computing checksums, and decode checksums.
 '''
-from pluggit.compat import int2byte, byte2int
+from itertools import chain
+from pluggit.compat import byte2int
 
 
 #---------------------------------------------------------------------------#
@@ -48,6 +49,16 @@ def dict_property(store, index):
 #---------------------------------------------------------------------------#
 # Bit packing functions
 #---------------------------------------------------------------------------#
+# Coils are packed least significant bit first, so byte `b` expands to the
+# bits `__byte_to_bits[b]`. Packing turns the bits into a string of binary
+# digits (the last bit first) that `int` parses in one go. Both directions
+# avoid a python loop per bit.
+#---------------------------------------------------------------------------#
+__byte_to_bits = [tuple(bool((byte >> bit) & 1) for bit in range(8))
+                  for byte in range(256)]
+__flags_to_digits = bytes.maketrans(b'\x00\x01', b'01')
+
+
 def pack_bitstring(bits):
     ''' Creates a string out of an array of bits
 
@@ -58,19 +69,12 @@ def pack_bitstring(bits):
         bits   = [False, True, False, True]
         result = pack_bitstring(bits)
     '''
-    ret = b''
-    i = packed = 0
-    for bit in bits:
-        if bit: packed += 128
-        i += 1
-        if i == 8:
-            ret += int2byte(packed)
-            i = packed = 0
-        else: packed >>= 1
-    if i > 0 and i < 8:
-        packed >>= (7 - i)
-        ret += int2byte(packed)
-    return ret
+    if isinstance(bits, Bitset):
+        return bits.encode()
+    flags = bytes(map(bool, bits))
+    if not flags: return b''
+    value = int(flags.translate(__flags_to_digits)[::-1], 2)
+    return value.to_bytes((len(flags) + 7) // 8, 'little')
 
 
 def unpack_bitstring(string):
@@ -83,14 +87,118 @@ def unpack_bitstring(string):
         bytes  = 'bytes to decode'
         result = unpack_bitstring(bytes)
     '''
-    byte_count = len(string)
-    bits = []
-    for byte in range(byte_count):
-        value = byte2int(string[byte])
-        for _ in range(8):
-            bits.append((value & 1) == 1)
-            value >>= 1
-    return bits
+    return list(chain.from_iterable(
+        map(__byte_to_bits.__getitem__, bytearray(string))))
+
+
+class Bitset(object):
+    '''
+    A compact alternative to the bit lists returned by `unpack_bitstring`.
+    The packed bits are kept as a single integer, so large coil reads are
+    not expanded into thousands of booleans unless they are iterated::
+
+        bits = Bitset(b'\x05\x01')
+        bits.getBit(2)  # True
+        bits[:3]        # Bitset(3) of True, False, True
+        len(bits)       # 16
+    '''
+    __slots__ = ('value', 'size')
+
+    def __init__(self, data=b'', size=None):
+        ''' Initializes a new bitset
+
+        :param data: The packed bits, least significant bit first
+        :param size: The number of bits (defaults to all the bits in data)
+        '''
+        self.value = int.from_bytes(bytes(data), 'little')
+        self.size = len(data) * 8 if size is None else size
+
+    def getBit(self, address):
+        ''' Returns the value of a single bit
+
+        :param address: The bit to query
+        :returns: The value of the requested bit
+        '''
+        if not 0 <= address < self.size:
+            raise IndexError("bit %d out of range" % address)
+        return (self.value >> address) & 1 == 1
+
+    def setBit(self, address, value=True):
+        ''' Sets the value of a single bit
+
+        :param address: The bit to set
+        :param value: The value to set the bit to
+        '''
+        if not 0 <= address < self.size:
+            raise IndexError("bit %d out of range" % address)
+        if value: self.value |= (1 << address)
+        else: self.value &= ~(1 << address)
+
+    def encode(self):
+        ''' Packs the bits again, least significant bit first
+
+        :returns: The packed bits
+        '''
+        return self.value.to_bytes((self.size + 7) // 8, 'little')
+
+    def tolist(self):
+        ''' Expands the bits to a list of booleans
+
+        :returns: The list of bits
+        '''
+        return unpack_bitstring(self.encode())[:self.size]
+
+    def __getitem__(self, index):
+        ''' Returns a bit, or a slice of the bits as a new bitset
+
+        :param index: The bit (negative counts from the end) or a slice
+        :returns: The value of the bit, or the Bitset of the slice
+        '''
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.size)
+            result = Bitset(size=len(range(start, stop, step)))
+            if step == 1:
+                result.value = (self.value >> start) & ((1 << result.size) - 1)
+            else:
+                for bit, address in enumerate(range(start, stop, step)):
+                    if (self.value >> address) & 1: result.value |= 1 << bit
+            return result
+        if index < 0: index += self.size
+        return self.getBit(index)
+
+    def __setitem__(self, index, value):
+        ''' Sets a bit like a list item
+
+        :param index: The bit to set (negative counts from the end)
+        :param value: The value to set the bit to
+        :raises TypeError: If index is a slice, the size is fixed
+        '''
+        if isinstance(index, slice):
+            raise TypeError("Bitset does not support slice assignment")
+        if index < 0: index += self.size
+        self.setBit(index, value)
+
+    def __len__(self):
+        ''' Returns the number of bits in the set '''
+        return self.size
+
+    def __iter__(self):
+        ''' Iterates over the bits as booleans '''
+        return iter(self.tolist())
+
+    def __eq__(self, other):
+        ''' Compares against another bitset or a list of bits '''
+        if isinstance(other, Bitset):
+            return (self.size, self.value) == (other.size, other.value)
+        return self.tolist() == list(other)
+
+    def __ne__(self, other):
+        ''' Compares against another bitset or a list of bits '''
+        return not self.__eq__(other)
+
+    def __str__(self):
+        ''' Returns a string representation of the instance '''
+        return "Bitset(%d)" % self.size
 
 
 #---------------------------------------------------------------------------#
@@ -154,9 +262,7 @@ def computeLRC(data):
     :returns: The calculated LRC
 
     '''
-    lrc = sum(byte2int(a) for a in data) & 0xff
-    lrc = (lrc ^ 0xff) + 1
-    return lrc & 0xff
+    return -sum(data) & 0xff
 
 
 def checkLRC(data, check):
@@ -166,7 +272,7 @@ def checkLRC(data, check):
     :param check: The LRC to validate
     :returns: True if matched, False otherwise
     '''
-    return computeLRC(data) == check
+    return (sum(data) + check) & 0xff == 0
 
 
 def rtuFrameSize(data, byte_count_pos):
@@ -195,6 +301,6 @@ def rtuFrameSize(data, byte_count_pos):
 # Exported symbols
 #---------------------------------------------------------------------------#
 __all__ = [
-    'pack_bitstring', 'unpack_bitstring', 'default',
+    'pack_bitstring', 'unpack_bitstring', 'Bitset', 'default',
     'computeCRC', 'checkCRC', 'computeLRC', 'checkLRC', 'rtuFrameSize'
 ]